@@ -23,13 +23,13 @@ from main import (
     OpenAIProvider,
     SearXNGProvider,
     WebScraper,
-    Chunker,
     OpenAIEmbedder,
     CosineRetriever,
-    JinaAIReranker,
     LukaContextBuilder,
     LLMQueryEnhancer,
-    QualityImprover
+    build_chunker,
+    build_quality_improver,
+    build_reranker
 )
 
 import openai
@@ -119,7 +119,7 @@ class PipelineEvaluator:
             instance_url=config["search_provider"]["instance_url"]
         )
         
-        quality_improver = QualityImprover(verbose=config["quality_improver"]["verbose"])
+        quality_improver = build_quality_improver(config)
         
         web_scraper = WebScraper(
             strategies=config["web_scraper"]["strategies"],
@@ -131,11 +131,7 @@ class PipelineEvaluator:
             enable_quality_model=config["quality_improver"]["enable_quality_model"],
         )
 
-        chunker = Chunker(
-            verbose=config["chunker"]["verbose"],
-            chunk_size=config["chunker"]["chunk_size"],
-            chunk_overlap=config["chunker"]["chunk_overlap"]
-        )
+        chunker = build_chunker(config, api_config["embedding_model"])
 
         embedder = OpenAIEmbedder(
             openai_client=embedding_client,
@@ -151,12 +147,7 @@ class PipelineEvaluator:
             top_k=config["retriever"]["top_k"]
         )
         
-        reranker = JinaAIReranker(
-            verbose=config["reranker"]["verbose"],
-            top_k=config["reranker"]["top_k"],
-            batch_size=config["reranker"]["batch_size"],
-            max_length=config["reranker"]["max_length"]
-        )
+        reranker = build_reranker(config)
         
         context_builder = LukaContextBuilder(verbose=config["context_builder"]["verbose"])
         
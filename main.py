@@ -2,26 +2,39 @@
 import json
 import os
 os.environ["TOKENIZERS_PARALLELISM"] = "false"
-#set environ
-# os.environ["VERBOSE"] = "True"
-verbose = os.environ["VERBOSE"] == "True"
 
 import yaml
-from typing import Dict, List, Any, Optional
+from typing import Dict, List, Any, Optional, Union, Tuple, AsyncGenerator
 import asyncio
+import contextlib
+import time
+from concurrent.futures import Executor
 import openai
 
-from rag_search.scraping.quality_scorer import QualityImprover
-from rag_search.utils.pipeline_logger import PipelineLogger
+from rag_search.scraping.quality_scorer import QualityImprover, RemoteQualityImprover
+from rag_search.utils.pipeline_logger import INFO, PipelineLogger, logging_to
+from rag_search.utils.session import PipelineSession
+from rag_search.utils.admission import AdmissionController, Priority
+from rag_search.utils.async_utils import create_executor, map_as_completed, run_in_executor
+from rag_search.utils.metrics import PipelineMetrics
+from rag_search.utils.tokens import TokenCounter, get_token_counter
+from rag_search.utils.tracing import Tracer, span
+from rag_search.utils.logging import DEBUG, configure_levels, is_enabled, is_verbose, log_debug, log_info
 from rag_search.processing.llm_query_enhancer import LLMQueryEnhancer
+from rag_search.processing.query_router import QueryRouter
 from rag_search.processing.retriever import CosineRetriever, Retriever
-from rag_search.processing.reranker import JinaAIReranker, Reranker
+from rag_search.processing.ann_retriever import ANNRetriever
+from rag_search.processing.bm25_retriever import BM25Retriever, HybridRetriever
+from rag_search.processing.dedup import NearDuplicateFilter
+from rag_search.processing.reranker import CascadeReranker, JinaAIReranker, RemoteReranker, Reranker
+from rag_search.reranker.cross_encoder import CrossEncoderReranker
 
-from transformers import AutoTokenizer
-import tiktoken
 
 
 # Default configuration as a fallback
+# Default of the components' verbose flags, follows the default console log level
+verbose = is_verbose()
+
 CONFIG = {
     "api": {
         "openai": {
@@ -41,10 +54,21 @@ CONFIG = {
     "pipeline": {
         "max_sources": 10,     # Maximum number of sources to process in the pipeline
         "debug": False,        # Enable/disable debug mode for detailed logging
-        "log_dir": "logs"      # Directory where pipeline logs are stored
+        "log_dir": "logs",     # Directory where pipeline logs are stored
+        "log_level": "info",   # Minimum level of pipeline log entries ("debug", "info", "warning", "error")
+        "log_sample_rate": 1.0,  # Fraction of requests whose logs are kept (errors are always kept)
+        "log_max_entries": 1000,  # Size of the in-memory log ring buffer per session
+        "snippet_fast_path": False,          # Try answering from search snippets before scraping
+        "snippet_confidence_threshold": 0.8,  # Minimum top reranker score to skip scraping
+        "cpu_executor": "thread",  # Where chunking and deduplication run: "thread", "process" (all cores) or "none" (event loop)
+        "cpu_workers": None        # Executor workers (None for the executor's default)
     },
     "query_enhancer": {
         "max_queries": 3,      # Maximum number of enhanced queries to generate
+        "cache_size": 1024,    # Maximum number of enhanced queries kept in the cache
+        "cache_ttl": 3600,     # Seconds an enhanced query stays cached
+        "use_router": False,   # Use the rule-based enhancer for simple queries, LLM only for complex ones
+        "max_simple_words": 12,  # Queries longer than this always go to the LLM enhancer
         "verbose": verbose        # Enable detailed logging for query enhancement process
     },
     "search_provider": {
@@ -64,7 +88,12 @@ CONFIG = {
     "chunker": {
         "verbose": verbose,          # Enable detailed logging for text chunking
         "chunk_size": 1000,       # Size of each text chunk in characters
-        "chunk_overlap": 100      # Number of overlapping characters between chunks
+        "chunk_overlap": 100,     # Number of overlapping characters between chunks
+        "type": "recursive",      # "recursive" (characters) or "markdown" (markdown structure, sized in embedding tokens)
+        "chunk_size_tokens": 256, # markdown: maximum tokens per chunk
+        "chunk_overlap_tokens": 32,  # markdown: maximum tokens repeated from the previous chunk
+        "dedup_threshold": 0.85,  # Shingle similarity above which chunks are collapsed before embedding (None disables)
+        "dedup_num_perm": 64      # MinHash permutations per chunk signature
     },
     "embedder": {
         "verbose": verbose,          # Enable detailed logging for embedding generation
@@ -73,19 +102,66 @@ CONFIG = {
     },
     "retriever": {
         "verbose": verbose,          # Enable detailed logging for retrieval operations
-        "top_k": 50               # Number of top candidates to retrieve for reranking
+        "top_k": 50,              # Number of top candidates to retrieve for reranking
+        "type": "cosine",         # "cosine" (exact, per request), "ann" (IVF index over a rolling corpus), "bm25" (no embedding) or "hybrid"
+        "max_chunks": 200000,     # ann/bm25: corpus size above which the oldest pages are evicted
+        "nprobe": 16,             # ann: IVF lists scanned per query (recall vs latency)
+        "index_path": None,       # ann: directory the corpus is loaded from and saved to on shutdown
+        "search_corpus": False,   # ann: retrieve from the whole corpus, including chunks scraped for other sessions
+        "bm25_k1": 1.5,           # bm25: term frequency saturation
+        "bm25_b": 0.75,           # bm25: document length normalization
+        "hybrid_dense": "cosine", # hybrid: dense half, "cosine" or "ann"
+        "hybrid_candidates": 100, # hybrid: candidates taken from each retriever before fusion
+        "rrf_k": 60,              # hybrid: reciprocal rank fusion offset
+        "dense_weight": 1.0,      # hybrid: weight of the dense ranking
+        "sparse_weight": 1.0      # hybrid: weight of the BM25 ranking
     },
     "reranker": {
         "verbose": verbose,          # Enable detailed logging for reranking process
         "top_k": 10,             # Number of top results to keep after reranking
         "batch_size": 16,         # Number of candidates to rerank in a single batch
-        "max_length": 1024        # Maximum text length for reranking
+        "max_length": 1024,       # Maximum text length for reranking
+        "score_cache_size": 100000,  # Query-chunk scores kept, reused by follow-ups and repeated queries
+        "score_cache_ttl": None,     # Seconds a cached score stays valid (None for no expiry)
+        "max_batch_tokens": 16384,   # Padded tokens per scoring batch when bucketing by length
+        "bucket_by_length": True,    # Batch pairs of similar length by token budget instead of batch_size
+        "backend": "torch",          # "torch", "torch_int8" (dynamic int8, CPU) or "onnx" (ONNX Runtime, CPU)
+        "onnx_file": "onnx/model.onnx",  # ONNX export in the model repository for the onnx backend
+        "cascade": {
+            "enabled": False,            # Score all candidates with a small cross-encoder, only the best with Jina
+            "first_stage_model": "cross-encoder/ms-marco-MiniLM-L-6-v2",
+            "first_stage_batch_size": 32,    # Pairs per first-stage batch
+            "first_stage_top_n": 20,         # Candidates passed on to the Jina reranker
+            "audit_rate": 0.01               # Fraction of requests also reranked in full to measure first-stage recall (exported in /metrics)
+        }
     },
     "context_builder": {
-        "verbose": verbose           # Enable detailed logging for context building
+        "verbose": verbose,          # Enable detailed logging for context building
+        "max_context_tokens": 100000,    # Token budget of the chunks in the prompt (below the 131072 window)
+        "min_chunk_tokens": 50,          # Smallest leftover budget filled with a trimmed chunk
+        "duplicate_threshold": 0.8       # Chunks repeating this fraction of selected text are dropped
     },
     "llm_provider": {
         "verbose": verbose           # Enable detailed logging for LLM operations
+    },
+    "tracing": {
+        "enabled": False,            # Record nested timing spans of every request
+        "format": "jsonl",           # "jsonl" (one span per line) or "otlp" (OTLP/JSON, one trace per line)
+        "path": "logs/traces.jsonl"  # File the finished traces are appended to
+    },
+    "scoring_service": {
+        "enabled": False,            # Use the shared reranker/quality model process (python -m rag_search.reranker.server)
+        "url": "unix:///tmp/rag_search_scoring.sock",  # Unix socket or http://host:port of the service
+        "timeout": 30,               # Seconds a worker waits for scores
+        "max_batch_pairs": 256,      # Service: pairs after which a micro-batch is scored immediately
+        "max_wait_ms": 5,            # Service: milliseconds a micro-batch waits for other workers' pairs
+        "serve_quality": True        # Service: also serve the quality model
+    },
+    "admission": {
+        "enabled": False,            # Cap concurrent stage executions (useful when serving many requests)
+        "max_concurrent_scraping": 8,    # Requests scraping pages at the same time
+        "max_concurrent_reranking": 2,   # Requests using the cross-encoder at the same time
+        "max_concurrent_llm": 16         # Requests generating an answer at the same time
     }
 }
 
@@ -135,13 +211,13 @@ def get_api_config(config: Dict[str, Any], use_openai: bool = False) -> Dict[str
 from rag_search.llm.openai_provider import OpenAIProvider
 from rag_search.search.base import SearchProvider
 from rag_search.scraping.crawl4ai_scraper import WebScraper
-from rag_search.processing.chunker import Chunker
+from rag_search.processing.chunker import Chunker, MarkdownChunker
 from rag_search.processing.embedder import Embedder, OpenAIEmbedder, SentenceTransformerEmbedder
 from rag_search.context.builder import ContextBuilder, LukaContextBuilder
+from rag_search.context.packer import ContextPacker
 from rag_search.llm.provider import LLMProvider
 from rag_search.search.searxng import SearXNGProvider
 from rag_search.context.builder import SimpleContextBuilder
-from rag_search.utils.logging import log_info
 
 import litellm
 
@@ -158,71 +234,175 @@ class RAGSearchPipeline:
         reranker: Reranker,
         context_builder: ContextBuilder,
         llm_provider: LLMProvider,
-        query_enhancer: Optional[LLMQueryEnhancer] = None,
+        query_enhancer: Optional[Union[LLMQueryEnhancer, QueryRouter]] = None,
         max_sources: int = 3,
         debug: bool = False,
-        log_dir: str = "logs"
+        log_dir: str = "logs",
+        snippet_fast_path: bool = False,
+        snippet_confidence_threshold: float = 0.8,
+        admission: Optional[AdmissionController] = None,
+        metrics: Optional[PipelineMetrics] = None,
+        tracer: Optional[Tracer] = None,
+        token_counter: Optional[TokenCounter] = None,
+        context_packer: Optional[ContextPacker] = None,
+        deduplicator: Optional[NearDuplicateFilter] = None,
+        cpu_executor: Optional[Executor] = None
     ):
-        # Initialize logger first
-        self.logger = PipelineLogger(log_dir=log_dir)
-        
-        # Initialize tokenizers
-        self.nemotron_tokenizer = AutoTokenizer.from_pretrained("nvidia/Llama-3.1-Nemotron-70B-Instruct-HF")
-        self.tiktoken_encoder = tiktoken.get_encoding("cl100k_base")
+        # Default session for single-conversation use (CLI, eval); servers pass their own
+        self.log_dir = log_dir
+        self.session = self.new_session()
         
-        # Pass logger to components that support it
-        embedder.pipeline_logger = self.logger
-        retriever.pipeline_logger = self.logger
-        reranker.pipeline_logger = self.logger
+        # Token accounting for the LLM's context window, the tokenizer follows the LLM model
+        self.token_counter = token_counter or get_token_counter(getattr(llm_provider, "model", "gpt-4"))
         
         self.search_provider = search_provider
         self.web_scraper = web_scraper
         self.chunker = chunker
+        # Collapses near-duplicate chunks before embedding, disabled if None
+        self.deduplicator = deduplicator
+        # Chunking and deduplication run here, on the event loop's thread if None
+        self.cpu_executor = cpu_executor
         self.embedder = embedder
         self.retriever = retriever
+        # BM25 retriever of requests with retrieval_mode "bm25", which skip embedding
+        if isinstance(retriever, BM25Retriever):
+            self.sparse_retriever = retriever
+        else:
+            self.sparse_retriever = getattr(retriever, "sparse", None) or BM25Retriever(top_k=getattr(retriever, "top_k", 50))
         self.reranker = reranker
         self.context_builder = context_builder
+        self.context_packer = context_packer or ContextPacker()
         self.llm_provider = llm_provider
         self.query_enhancer = query_enhancer
         self.max_sources = max_sources
         self.debug = debug
+        self.snippet_fast_path = snippet_fast_path
+        self.snippet_confidence_threshold = snippet_confidence_threshold
+        self.admission = admission
+        # Stage latencies and counters, exported by the API server's /metrics endpoint
+        self.metrics = metrics or PipelineMetrics()
+        web_scraper.metrics = self.metrics
+        reranker.metrics = self.metrics
+        # Spans of every request, disabled unless the tracer has an exporter
+        self.tracer = tracer or Tracer()
+    
+    @contextlib.contextmanager
+    def _stage(self, name: str, session: PipelineSession, **attributes: Any):
+        """Time a pipeline stage both as a trace span and in the stage latency histogram.
         
-        # Initialize conversation history and content storage
-        self.conversation_history = []
-        self.embedded_chunks = None
-        self.current_context = None
+        Shared components called in the stage log to the session's logger.
+        """
+        with span(name, **attributes), self.metrics.stage(name), logging_to(session.logger):
+            yield
     
-    async def search(self, query: str) -> Dict[str, Any]:
+    def _admit(self, stage: str, session: PipelineSession):
+        """Slot of an admission-controlled stage for the session's current request."""
+        if self.admission is None:
+            return contextlib.nullcontext()
+        return self.admission.slot(stage, priority=session.priority, deadline=session.deadline)
+    
+    def _retriever_for(self, session: PipelineSession) -> Retriever:
+        """Retriever of the session's current request."""
+        if session.retrieval_mode == "bm25":
+            return self.sparse_retriever
+        return self.retriever
+    
+    async def _embed_for(
+        self,
+        retriever: Retriever,
+        chunks: List[Dict[str, Any]],
+        session: PipelineSession
+    ) -> List[Dict[str, Any]]:
+        """Embed the chunks that lack an embedding, unless the retriever works without them."""
+        if not retriever.requires_embeddings:
+            return chunks
+        missing = [index for index, chunk in enumerate(chunks) if 'embedding' not in chunk]
+        if not missing:
+            return chunks
+        with self._stage("embed", session, num_chunks=len(missing)):
+            # Off the event loop, embedding is a blocking API round-trip or model inference
+            embedded = await asyncio.to_thread(self.embedder.embed_chunks, [chunks[index] for index in missing])
+        chunks = list(chunks)
+        for index, chunk in zip(missing, embedded):
+            chunks[index] = chunk
+        return chunks
+    
+    def new_session(self, session_id: Optional[str] = None) -> PipelineSession:
+        """Create a fresh session holding the state of one conversation."""
+        return PipelineSession(session_id=session_id, log_dir=self.log_dir)
+    
+    # The default session's state is exposed as attributes for single-conversation callers
+    @property
+    def logger(self) -> PipelineLogger:
+        return self.session.logger
+    
+    @property
+    def conversation_history(self) -> List[Dict[str, Any]]:
+        return self.session.conversation_history
+    
+    @conversation_history.setter
+    def conversation_history(self, value: List[Dict[str, Any]]):
+        self.session.conversation_history = value
+    
+    @property
+    def embedded_chunks(self) -> Optional[List[Dict[str, Any]]]:
+        return self.session.embedded_chunks
+    
+    @embedded_chunks.setter
+    def embedded_chunks(self, value: Optional[List[Dict[str, Any]]]):
+        self.session.embedded_chunks = value
+    
+    @property
+    def current_context(self) -> Optional[Dict[str, Any]]:
+        return self.session.current_context
+    
+    @current_context.setter
+    def current_context(self, value: Optional[Dict[str, Any]]):
+        self.session.current_context = value
+    
+    async def search(self, query: str, session: Optional[PipelineSession] = None) -> Dict[str, Any]:
         """Perform search and return raw results."""
+        session = session or self.session
         try:
             # Enhance query if a query enhancer is available
             if self.query_enhancer:
-                enhanced_queries = await self.query_enhancer.enhance(query)
+                with self._stage("enhance", session):
+                    enhanced_queries = await self.query_enhancer.enhance(query)
+                route = getattr(enhanced_queries, 'route', 'llm')
+                if route.startswith("llm"):
+                    self.metrics.cache_lookup("query_enhancer", getattr(enhanced_queries, 'cached', False))
+                if getattr(enhanced_queries, 'fallback', False):
+                    self.metrics.degraded_responses.inc(reason="enhancement_failed")
+                
                 # Use all enhanced queries to search
                 all_results = []
-                for search_query in enhanced_queries.enhanced_queries:
-                    results = await self.search_provider.search(search_query, num_results=self.max_sources)
-                    all_results.append(results)
+                with self._stage("search", session):
+                    for search_query in enhanced_queries.enhanced_queries:
+                        with span("search.query", query=search_query):
+                            results = await self.search_provider.search(search_query, num_results=self.max_sources)
+                        all_results.append(results)
                 
                 # Merge results from all queries
                 merged_results = self._merge_search_results(all_results)
                 
-                self.logger.log("query_enhancement", {
+                session.logger.log("query_enhancement", {
                     "original_query": query,
                     "enhanced_queries": enhanced_queries.enhanced_queries,
+                    "route": route,
                     "num_results": len(merged_results.get('organic', []))
                 })
                 
                 return merged_results
             else:
-                results = await self.search_provider.search(query, num_results=self.max_sources)
-                self.logger.log("search", {
+                with self._stage("search", session):
+                    results = await self.search_provider.search(query, num_results=self.max_sources)
+                session.logger.log("search", {
                     "query": query,
                     "num_results": len(results.get('organic', []))
                 })
                 return results
         except Exception as e:
-            self.logger.log_error("search", e, {"query": query})
+            session.logger.log_error("search", e, {"query": query})
             raise
     
     def _merge_search_results(self, results_list: List[Dict[str, Any]]) -> Dict[str, Any]:
@@ -241,356 +421,717 @@ class RAGSearchPipeline:
         
         return merged
     
-    async def process_content(self, scraped_content: Dict[str, Dict[str, Any]], query: str) -> List[Dict[str, Any]]:
-        """Process scraped content for relevance."""
+    def _snippets_to_chunks(self, search_results: Dict[str, Any]) -> List[Dict[str, Any]]:
+        """Turn organic search result snippets into chunks shaped like scraped ones."""
+        chunks = []
+        for result in search_results.get('organic', [])[:self.max_sources]:
+            snippet = (result.get('snippet') or '').strip()
+            url = result.get('link')
+            if not snippet or not url:
+                continue
+            title = (result.get('title') or '').strip()
+            chunks.append({
+                'content': f"{title}\n{snippet}" if title else snippet,
+                'url': url,
+                'strategy': 'snippet',
+                'chunk_index': 0,
+                'total_chunks': 1
+            })
+        return chunks
+
+    async def process_snippets(self, search_results: Dict[str, Any], query: str, session: Optional[PipelineSession] = None) -> Optional[List[Dict[str, Any]]]:
+        """
+        Embed and rerank search snippets without scraping any pages.
+        
+        Args:
+            search_results: Search results containing organic snippets
+            query: The user's query
+            
+        Returns:
+            Reranked snippet chunks if the top reranker score reaches
+            snippet_confidence_threshold, otherwise None so the caller falls
+            back to full scraping
+        """
+        session = session or self.session
         try:
-            all_chunks = []
-            debug_save = {}
+            snippet_chunks = self._snippets_to_chunks(search_results)
+            if not snippet_chunks:
+                session.logger.log("snippet_fast_path", {"num_snippets": 0, "hit": False})
+                return None
             
-            self.logger.log("content_processing_start", {
+            retriever = self._retriever_for(session)
+            embedded_snippets = await self._embed_for(retriever, snippet_chunks, session)
+            with self._stage("retrieve", session):
+                candidates = retriever.retrieve(embedded_snippets, query)
+            candidates_for_reranking = [self._rerank_candidate(chunk) for chunk in candidates]
+            async with self._admit("reranking", session):
+                with self._stage("rerank", session):
+                    reranked_snippets = await asyncio.to_thread(self.reranker.rerank, candidates_for_reranking, query)
+            
+            top_score = reranked_snippets[0]['similarity'] if reranked_snippets else None
+            hit = top_score is not None and top_score >= self.snippet_confidence_threshold
+            session.logger.log("snippet_fast_path", {
+                "num_snippets": len(snippet_chunks),
+                "top_score": top_score,
+                "threshold": self.snippet_confidence_threshold,
+                "hit": hit
+            })
+            
+            self.metrics.cache_lookup("snippet_fast_path", hit)
+            if not hit:
+                return None
+            
+            # Keep the snippet embeddings so follow-up queries can retrieve against them
+            session.embedded_chunks = embedded_snippets
+            return reranked_snippets
+        except Exception as e:
+            # Snippets are only a shortcut, full scraping still follows
+            session.logger.log_error("process_snippets", e, {"query": query})
+            return None
+    
+    async def _chunk_scraped_content(self, scraped_content: Dict[str, Dict[str, Any]], session: PipelineSession) -> List[Dict[str, Any]]:
+        """
+        Split the successful extractions of scraped pages into chunks.
+        
+        Documents are split in the CPU executor, each one as soon as a worker is free,
+        so large pages neither block the event loop nor wait for each other.
+        
+        Args:
+            scraped_content: Extraction results per URL and strategy, as returned by scrape_many
+            
+        Returns:
+            Chunks with source url, strategy, position, (start, end) offsets into the
+            extracted text and their token count if the chunker measures tokens;
+            near-duplicates are collapsed into one chunk listing all their urls in
+            'source_urls'
+        """
+        # Successful extractions with content of every URL and strategy
+        documents = []
+        for url, strategies in scraped_content.items():
+            if not isinstance(strategies, dict):
+                continue
+            for strategy_name, extraction_result in strategies.items():
+                if (hasattr(extraction_result, 'success') and 
+                    extraction_result.success and 
+                    hasattr(extraction_result, 'content') and 
+                    extraction_result.content):
+                    documents.append((url, strategy_name, extraction_result.content))
+            
+            session.logger.log("url_processing", {
+                "url": url,
+                "num_strategies": len(strategies),
+                "successful_strategies": [
+                    strategy for strategy, result in strategies.items()
+                    if getattr(result, 'success', False)
+                ]
+            })
+        
+        chunks_per_document: List[List[Dict[str, Any]]] = [[] for _ in documents]
+        with self._stage("chunk", session, num_documents=len(documents)):
+            # Spans are offsets into the document, chunks are built as each document is split.
+            # 'content' is still materialized: dedup, the embedder's request body and BM25 read
+            # every chunk's text right away, and a chunk holding its page instead would keep
+            # whole pages alive in session state and the retrieval corpus.
+            texts = [text for _, _, text in documents]
+            async for index, spans in map_as_completed(self.cpu_executor, self.chunker.split_spans, texts):
+                url, strategy_name, text = documents[index]
+                for i, (start, end, token_count) in enumerate(spans):
+                    chunk = {
+                        'content': text[start:end],
+                        'url': url,
+                        'strategy': strategy_name,
+                        'chunk_index': i,
+                        'total_chunks': len(spans),
+                        'start': start,
+                        'end': end
+                    }
+                    if token_count is not None:
+                        # Sizes in the embedding model's tokens, reused instead of re-tokenizing
+                        chunk['token_count'] = token_count
+                        chunk['tokenizer'] = self.chunker.token_counter.name
+                    chunks_per_document[index].append(chunk)
+        # Document order, independent of which worker finished first
+        all_chunks = [chunk for chunks in chunks_per_document for chunk in chunks]
+        
+        if self.deduplicator is not None and all_chunks:
+            with self._stage("dedup", session, num_chunks=len(all_chunks)):
+                unique_chunks = await run_in_executor(self.cpu_executor, self.deduplicator.deduplicate, all_chunks)
+            session.logger.log("deduplication", {
+                "num_chunks": len(all_chunks),
+                "num_unique_chunks": len(unique_chunks)
+            })
+            all_chunks = unique_chunks
+        return all_chunks
+    
+    @staticmethod
+    def _rerank_candidate(chunk: Dict[str, Any]) -> Dict[str, Any]:
+        """Content and metadata of a retrieved chunk passed to the reranker, without its embedding."""
+        candidate = {
+            'content': chunk['content'],
+            'url': chunk['url'],
+            'strategy': chunk['strategy'],
+            'chunk_index': chunk['chunk_index'],
+            'total_chunks': chunk['total_chunks'],
+            'source_urls': chunk.get('source_urls', [chunk['url']])
+        }
+        # Offsets and token counts of chunks from split_spans travel on to the context packer
+        for key in ('start', 'end', 'token_count', 'tokenizer'):
+            if key in chunk:
+                candidate[key] = chunk[key]
+        return candidate
+    
+    def _chunk_refs(self, chunks: List[Dict[str, Any]], session: PipelineSession) -> List[Dict[str, Any]]:
+        """Compact description of chunks for the logs, their contents are stored once by reference."""
+        return [
+            {
+                "url": chunk.get('url'),
+                "strategy": chunk.get('strategy'),
+                "chunk_index": chunk.get('chunk_index'),
+                "similarity": chunk.get('similarity'),
+                "content_ref": session.logger.ref(chunk.get('content', ''))
+            }
+            for chunk in chunks
+        ]
+    
+    async def process_content(self, scraped_content: Dict[str, Dict[str, Any]], query: str, session: Optional[PipelineSession] = None) -> List[Dict[str, Any]]:
+        """Process scraped content for relevance."""
+        session = session or self.session
+        try:
+            session.logger.log("content_processing_start", {
                 "num_urls": len(scraped_content),
                 "query": query
             })
             
-            # Process each URL and its extraction results
-            for url, strategies in scraped_content.items():
-                if not isinstance(strategies, dict):
-                    continue
+            all_chunks = await self._chunk_scraped_content(scraped_content, session)
 
-                # Create URL section in debug_save
-                if url not in debug_save:
-                    debug_save[url] = {}
-                
-                # Extract content from all available strategies
-                for strategy_name, extraction_result in strategies.items():
-                    # Save all extraction results to debug_save
-                    if hasattr(extraction_result, 'content'):
-                        debug_save[url][strategy_name] = {
-                            'content': extraction_result.content if extraction_result.content else "No content",
-                            'success': getattr(extraction_result, 'success', False)
-                        }
-                    else:
-                        debug_save[url][strategy_name] = {
-                            'content': "No content attribute",
-                            'success': getattr(extraction_result, 'success', False)
-                        }
-                    
-                    # Only process successful extractions with content for RAG
-                    if (hasattr(extraction_result, 'success') and 
-                        extraction_result.success and 
-                        hasattr(extraction_result, 'content') and 
-                        extraction_result.content):
-
-                        # Simply split the text content
-                        text_chunks = self.chunker.split_text(extraction_result.content)
-                        
-                        # Create chunk objects with source metadata
-                        for i, chunk_text in enumerate(text_chunks):
-                            chunk = {
-                                'content': chunk_text,
-                                'url': url,
-                                'strategy': strategy_name,
-                                'chunk_index': i,
-                                'total_chunks': len(text_chunks)
-                            }
-                            all_chunks.append(chunk)
-
-                self.logger.log("url_processing", {
-                    "url": url,
-                    "num_strategies": len(strategies),
-                    "successful_strategies": [
-                        strategy for strategy, result in strategies.items()
-                        if getattr(result, 'success', False)
-                    ]
-                })
-
-            # # Save to nice markdown file
-            # with open("debug_save.md", "w") as f:
-            #     for url, strategies in debug_save.items():
-            #         f.write(f"# URL: {url}\n\n")
-            #         for strategy_name, result in strategies.items():
-            #             f.write(f"## Strategy: {strategy_name} (Success: {result['success']})\n\n")
-            #             f.write(result['content'])
-            #             f.write("\n\n---\n\n")
-
-            # Embed chunks and store for later use
-            self.embedded_chunks = self.embedder.embed_chunks(all_chunks)
-            self.logger.log("embedding", {
+            # Embed chunks (unless retrieving with BM25 only) and store for later use
+            retriever = self._retriever_for(session)
+            session.embedded_chunks = await self._embed_for(retriever, all_chunks, session)
+            session.logger.log("embedding", {
                 "num_chunks": len(all_chunks),
-                "embedding_dim": len(self.embedded_chunks[0]['embedding']) if self.embedded_chunks else 0
+                "embedding_dim": len(session.embedded_chunks[0].get('embedding', ())) if session.embedded_chunks else 0
             })
             
-            # Get initial candidates using cosine similarity retrieval
-            initial_candidates = self.retriever.retrieve(self.embedded_chunks, query)
+            # Get initial candidates using first-stage retrieval
+            with self._stage("retrieve", session):
+                initial_candidates = retriever.retrieve(session.embedded_chunks, query)
 
-            for candidate in initial_candidates:
-                self.logger.log("initial_retrieval", {
+            if session.logger.is_enabled_for(INFO):
+                session.logger.log("initial_retrieval", {
                     "num_candidates": len(initial_candidates),
                     "top_candidate_score": initial_candidates[0]['similarity'] if initial_candidates else None,
-                    "candidate": {
-                        "content": json.dumps(candidate['content']),
-                        "url": candidate['url'],
-                        "strategy": candidate['strategy'],
-                        "chunk_index": candidate['chunk_index'],
-                        "total_chunks": candidate['total_chunks']
-                    }
+                    "candidates": self._chunk_refs(initial_candidates, session)
                 })
             
             # Extract just the content and metadata for reranking
-            candidates_for_reranking = []
-            for chunk in initial_candidates:
-                candidate = {
-                    'content': chunk['content'],
-                    'url': chunk['url'],
-                    'strategy': chunk['strategy'],
-                    'chunk_index': chunk['chunk_index'],
-                    'total_chunks': chunk['total_chunks']
-                }
-                candidates_for_reranking.append(candidate)
+            candidates_for_reranking = [self._rerank_candidate(chunk) for chunk in initial_candidates]
             
             # Rerank the candidates using the cross-encoder
-            reranked_chunks = self.reranker.rerank(candidates_for_reranking, query)
-            for chunk in reranked_chunks:
-                self.logger.log("reranking", {
+            async with self._admit("reranking", session):
+                with self._stage("rerank", session):
+                    # Off the event loop, scoring is model inference or a scoring service round-trip
+                    reranked_chunks, rerank_stats = await asyncio.to_thread(self.reranker.rerank_with_stats, candidates_for_reranking, query)
+            if session.logger.is_enabled_for(INFO):
+                session.logger.log("reranking", {
                     "num_chunks_after_rerank": len(reranked_chunks),
-                    "top_chunk_score": chunk['similarity'] if reranked_chunks else None,
-                    "reranked_chunk": chunk
+                    "top_chunk_score": reranked_chunks[0]['similarity'] if reranked_chunks else None,
+                    "reranked_chunks": self._chunk_refs(reranked_chunks, session),
+                    **rerank_stats
                 })
             
             return reranked_chunks
         except Exception as e:
-            self.logger.log_error("process_content", e)
+            session.logger.log_error("process_content", e)
             raise
     
     def _balance_chunks_by_tokens(
         self,
         chunks: List[Dict[str, Any]],
-        max_total_tokens: int = 100000,  # Safe default below 131072
-        model: str = "gpt-4"
+        max_total_tokens: Optional[int] = None,
+        model: Optional[str] = None,
+        session: Optional[PipelineSession] = None
     ) -> List[Dict[str, Any]]:
         """
-        Balance chunks by tokens to fit within context window.
+        Fit chunks into the context window, keeping the most relevant text per token.
         
         Args:
-            chunks: List of content chunks
-            max_total_tokens: Maximum total tokens allowed
-            model: Model name for tokenization
+            chunks: List of content chunks with reranker similarity scores
+            max_total_tokens: Maximum total tokens allowed, the packer's budget if not given
+            model: Model name for tokenization, the LLM's model if not given
+            session: Session whose logger records failures
             
         Returns:
-            List of balanced chunks
+            List of packed chunks
         """
+        session = session or self.session
         try:
-            # Select appropriate tokenizer based on model
-            if "nemotron" in model.lower():
-                encode_func = lambda x: self.nemotron_tokenizer.encode(x, add_special_tokens=False)
-                decode_func = lambda x: self.nemotron_tokenizer.decode(x)
-            else:
-                # Default to tiktoken for OpenAI models
-                encode_func = lambda x: self.tiktoken_encoder.encode(x)
-                decode_func = lambda x: self.tiktoken_encoder.decode(x)
-            
-            # Calculate tokens for each chunk
-            chunk_tokens = []
-            for chunk in chunks:
-                content = chunk.get('content', '')
-                tokens = len(encode_func(content))
-                chunk_tokens.append(tokens)
-                
-            total_tokens = sum(chunk_tokens)
-            
-            if total_tokens <= max_total_tokens:
-                return chunks
-            
-            log_info(f"context window is too large, balancing chunks", "RAGSearchPipeline")
-                
-            # Calculate target tokens per chunk
-            num_chunks = len(chunks)
-            target_tokens_per_chunk = max_total_tokens // num_chunks
-            log_info(f"target tokens per chunk: {target_tokens_per_chunk} on {num_chunks} chunks", "RAGSearchPipeline")
-            
-            # Balance chunks
-            balanced_chunks = []
-            for chunk, tokens in zip(chunks, chunk_tokens):
-                content = chunk.get('content', '')
-                if tokens > target_tokens_per_chunk:
-                    # Truncate content to target length
-                    encoded = encode_func(content)
-                    truncated = decode_func(encoded[:target_tokens_per_chunk])
-                    new_chunk = dict(chunk)
-                    new_chunk['content'] = truncated
-                    balanced_chunks.append(new_chunk)
-                else:
-                    balanced_chunks.append(chunk)
-                    
-            return balanced_chunks
-            
+            token_counter = get_token_counter(model) if model else self.token_counter
+            return self.context_packer.pack(chunks, token_counter, max_total_tokens)
         except Exception as e:
-            self.logger.log_error("chunk_balancing", e)
+            session.logger.log_error("chunk_balancing", e)
             # If tokenization fails, return original chunks
             return chunks
             
-    def build_context(self, processed_content: List[Dict[str, Any]], search_results: Dict[str, Any], query: str) -> Dict[str, Any]:
-        """Build context from processed content and search results."""
+    def build_context(self, processed_content: List[Dict[str, Any]], search_results: Dict[str, Any], query: str, session: Optional[PipelineSession] = None) -> Dict[str, Any]:
+        """Build context from processed content and search results.
+        
+        The packed chunks the context is built from are stored in the session's
+        context_chunks, citations must be numbered over them.
+        """
+        session = session or self.session
         try:
-            # Balance chunks by tokens before building context
-            balanced_content = self._balance_chunks_by_tokens(processed_content)
+            if not processed_content:
+                self.metrics.degraded_responses.inc(reason="no_content")
             
-            context = self.context_builder.build(balanced_content, search_results, query=query)
+            with self._stage("context", session):
+                # Balance chunks by tokens before building context
+                balanced_content = self._balance_chunks_by_tokens(processed_content, session=session)
+                
+                context = self.context_builder.build(balanced_content, search_results, query=query)
+                session.context_chunks = balanced_content
 
-            self.logger.log("context_building", {
-                "num_chunks": len(balanced_content),
-                "context": json.dumps(context, ensure_ascii=False).encode('utf-8').decode('unicode-escape')
-            })
+            if session.logger.is_enabled_for(INFO):
+                context_text = context["context"] if isinstance(context, dict) else context
+                session.logger.log("context_building", {
+                    "num_candidates": len(processed_content),
+                    "num_chunks": len(balanced_content),
+                    "context_tokens": sum(chunk.get("token_count", 0) for chunk in balanced_content),
+                    "context_length": len(context_text),
+                    "context_ref": session.logger.ref(context_text)
+                })
             
             return context
         except Exception as e:
-            self.logger.log_error("build_context", e)
+            session.logger.log_error("build_context", e)
             raise
     
-    async def generate_response(self, context: str, query: str, is_followup: bool = False) -> str:
+    def _build_messages(self, context: Dict[str, Any], session: PipelineSession) -> List[Dict[str, Any]]:
+        """Build the LLM messages from the context and the conversation history."""
+        messages = []
+        
+        # Add system message first
+        if isinstance(context, dict):
+            # New format from LukaContextBuilder
+            messages.append({"role": "system", "content": context["system"]})
+        else:
+            raise ValueError("Invalid context format")
+        
+        # Add conversation history
+        for msg in session.conversation_history:
+            messages.append({"role": msg["role"], "content": msg["content"]})
+        
+        # Add current context and query
+        messages.append({"role": "user", "content": context["context"]})
+        return messages
+    
+    def _record_response(self, query: str, response: str, is_followup: bool, session: PipelineSession):
+        """Append a finished exchange to the conversation history and log it."""
+        session.conversation_history.append({"role": "user", "content": query})
+        session.conversation_history.append({"role": "assistant", "content": response})
+        
+        session.logger.log("response_generation", {
+            "query": query,
+            "response_length": len(response),
+            "response": response,
+            "conversation_length": len(session.conversation_history),
+            "is_followup": is_followup
+        })
+    
+    async def generate_response(self, context: str, query: str, is_followup: bool = False, session: Optional[PipelineSession] = None) -> str:
         """Generate response using LLM with context."""
+        session = session or self.session
         try:
-            # Build messages including conversation history
-            messages = []
-            
-            # Add system message first
-            if isinstance(context, dict):
-                # New format from LukaContextBuilder
-                messages.append({"role": "system", "content": context["system"]})
-            else:
-                raise ValueError("Invalid context format")
-                exit()
-            
-            # Add conversation history
-            for msg in self.conversation_history:
-                messages.append({"role": msg["role"], "content": msg["content"]})
-            
-            # Add current context and query
-            if isinstance(context, dict):
-                messages.append({"role": "user", "content": context["context"]})
-            else:
-                # Legacy format or simple string context
-                combined_message = f"{context}\n\nQuestion: {query}"
-                messages.append({"role": "user", "content": combined_message})
-            
-            response = await self.llm_provider.generate(messages)
-            
-            # Update conversation history
-            self.conversation_history.append({"role": "user", "content": query})
-            self.conversation_history.append({"role": "assistant", "content": response})
-            
-            self.logger.log("response_generation", {
-                "query": query,
-                "response_length": len(response),
-                "response": response,
-                "conversation_length": len(self.conversation_history),
-                "is_followup": is_followup
-            })
+            messages = self._build_messages(context, session)
+            async with self._admit("llm", session):
+                with span("llm", stream=False), self.metrics.llm_duration.time():
+                    response = await self.llm_provider.generate(messages)
+            self._record_response(query, response, is_followup, session)
             return response
         except Exception as e:
-            self.logger.log_error("generate_response", e, {
+            session.logger.log_error("generate_response", e, {
                 "query": query,
                 "context_length": len(context) if isinstance(context, str) else len(context["context"])
             })
             raise
     
-    def clear_conversation(self):
+    async def generate_response_stream(self, context: Dict[str, Any], query: str, is_followup: bool = False, session: Optional[PipelineSession] = None) -> AsyncGenerator[str, None]:
+        """
+        Stream the LLM response token by token.
+        
+        The exchange is added to the conversation history once the stream completes.
+        Providers without generate_stream fall back to a single chunk.
+        """
+        session = session or self.session
+        try:
+            messages = self._build_messages(context, session)
+            chunks = []
+            # The slot is held until the whole answer has been streamed
+            async with self._admit("llm", session):
+                with span("llm", stream=True) as llm_span:
+                    start = time.perf_counter()
+                    if hasattr(self.llm_provider, "generate_stream"):
+                        async for chunk in self.llm_provider.generate_stream(messages):
+                            if not chunks:
+                                time_to_first_token = time.perf_counter() - start
+                                self.metrics.llm_time_to_first_token.observe(time_to_first_token)
+                                llm_span.set_attribute("time_to_first_token_ms", time_to_first_token * 1000)
+                            chunks.append(chunk)
+                            yield chunk
+                    else:
+                        chunk = await self.llm_provider.generate(messages)
+                        self.metrics.llm_time_to_first_token.observe(time.perf_counter() - start)
+                        chunks.append(chunk)
+                        yield chunk
+                    self.metrics.llm_duration.observe(time.perf_counter() - start)
+                    llm_span.set_attribute("num_chunks", len(chunks))
+            self._record_response(query, "".join(chunks), is_followup, session)
+        except Exception as e:
+            session.logger.log_error("generate_response_stream", e, {
+                "query": query,
+                "context_length": len(context["context"]) if isinstance(context, dict) else len(context)
+            })
+            raise
+    
+    def clear_conversation(self, session: Optional[PipelineSession] = None):
         """Clear the conversation history and cached content."""
-        self.conversation_history = []
-        self.embedded_chunks = None
-        self.current_context = None
-        self.logger.log("conversation_cleared", {
+        session = session or self.session
+        session.clear()
+        session.logger.log("conversation_cleared", {
             "message": "Conversation history and cached content have been cleared"
         })
     
-    async def run(self, query: str) -> str:
-        """Execute the complete pipeline."""
-        try:
-            self.logger.log("pipeline_start", {"query": query})
+    def get_citations(self, context_chunks: List[Dict[str, Any]], search_results: Dict[str, Any]) -> List[Dict[str, Any]]:
+        """
+        List the sources of a built context, numbered like the context builder's source ids.
+        
+        Args:
+            context_chunks: Chunks the context was built from, in context order
+            search_results: Search results used to look up page titles
+            
+        Returns:
+            List of citations with id, url, title and relevance
+        """
+        titles = {
+            result.get('link'): result.get('title', '')
+            for result in (search_results or {}).get('organic', [])
+        }
+        citations = []
+        for i, chunk in enumerate(context_chunks, 1):
+            if 'content' not in chunk or 'url' not in chunk:
+                continue
+            citations.append({
+                "id": i,
+                "url": chunk['url'],
+                "mirrors": [url for url in chunk.get('source_urls', []) if url != chunk['url']],
+                "title": titles.get(chunk['url'], ''),
+                "relevance": chunk.get('similarity')
+            })
+        return citations
+    
+    async def prepare_context(self, query: str, is_followup: bool, session: Optional[PipelineSession] = None) -> Tuple[List[Dict[str, Any]], Dict[str, Any]]:
+        """
+        Run every stage up to and including context building.
+        
+        Args:
+            query: The user's query
+            is_followup: Whether to reuse the stored embedded chunks instead of searching
             
-            # Check if this is a follow-up query
-            is_followup = len(self.conversation_history) > 0
+        Returns:
+            Tuple of (chunks the context was built from after packing, search results);
+            the context itself is stored in the session's current_context
+        """
+        session = session or self.session
+        if not is_followup:
+            # Only perform search and scraping for the first query
+            search_results = await self.search(query, session=session)
             
-            if not is_followup:
-                # Only perform search and scraping for the first query
-                search_results = await self.search(query)
-                    
+            # Answer straight from the search snippets when the reranker is confident enough
+            processed_content = None
+            if self.snippet_fast_path:
+                processed_content = await self.process_snippets(search_results, query, session=session)
+            
+            if processed_content is None:
                 # Extract URLs from search results
                 urls = self._extract_urls(search_results)
                 urls = urls[:self.max_sources]
                 
-                self.logger.log("url_extraction", {
+                session.logger.log("url_extraction", {
                     "num_urls": len(urls),
                     "urls": urls
                 })
                 
                 # Scrape content from URLs
-                scraped_content = await self.web_scraper.scrape_many(urls)
-                self.logger.log("scraping", {
+                async with self._admit("scraping", session):
+                    with self._stage("scrape", session, num_urls=len(urls)):
+                        scraped_content = await self.web_scraper.scrape_many(urls)
+                session.logger.log("scraping", {
                     "num_urls_scraped": len(scraped_content)
                 })
 
                 # Process content - this will store embedded chunks
-                processed_content = await self.process_content(scraped_content, query)
+                processed_content = await self.process_content(scraped_content, query, session=session)
+            
+            # Build context
+            session.current_context = self.build_context(processed_content, search_results, query, session=session)
+            return session.context_chunks, search_results
+        
+        # For follow-up queries, use stored embedded chunks
+        if not session.embedded_chunks:
+            raise ValueError("No embedded chunks available for follow-up query")
+        
+        # Chunks of a BM25-only first request are embedded once a follow-up needs them
+        retriever = self._retriever_for(session)
+        session.embedded_chunks = await self._embed_for(retriever, session.embedded_chunks, session)
+        
+        # Get initial candidates using first-stage retrieval
+        with self._stage("retrieve", session):
+            initial_candidates = retriever.retrieve(session.embedded_chunks, query)
+        session.logger.log("followup_retrieval", {
+            "num_candidates": len(initial_candidates),
+            "top_candidate_score": initial_candidates[0]['similarity'] if initial_candidates else None
+        })
+        
+        # Extract just the content and metadata for reranking
+        candidates_for_reranking = [self._rerank_candidate(chunk) for chunk in initial_candidates]
+        
+        # Rerank the retrieved candidates
+        async with self._admit("reranking", session):
+            with self._stage("rerank", session):
+                reranked_chunks, rerank_stats = await asyncio.to_thread(self.reranker.rerank_with_stats, candidates_for_reranking, query)
+        session.logger.log("followup_reranking", {
+            "num_reranked": len(reranked_chunks),
+            "top_reranked_score": reranked_chunks[0]['similarity'] if reranked_chunks else None,
+            **rerank_stats
+        })
+        
+        # Build new context from reranked chunks
+        session.current_context = self.build_context(reranked_chunks, {}, query, session=session)
+        return session.context_chunks, {}
+    
+    async def run(self, query: str, session: Optional[PipelineSession] = None) -> str:
+        """Execute the complete pipeline.
+        
+        Args:
+            query: The user's query
+            session: Conversation state to use, defaults to the pipeline's own session
+        """
+        session = session or self.session
+        with self.tracer.start_trace("pipeline.run", query=query, session_id=session.session_id):
+            try:
+                session.logger.log("pipeline_start", {"query": query})
                 
-                # Build context
-                self.current_context = self.build_context(processed_content, search_results, query)
+                # Check if this is a follow-up query
+                is_followup = session.is_followup
                 
-            else:
-                # For follow-up queries, use stored embedded chunks
-                if not self.embedded_chunks:
-                    raise ValueError("No embedded chunks available for follow-up query")
+                await self.prepare_context(query, is_followup, session=session)
                 
-                # Get initial candidates using cosine similarity retrieval
-                initial_candidates = self.retriever.retrieve(self.embedded_chunks, query)
-                self.logger.log("followup_retrieval", {
-                    "num_candidates": len(initial_candidates),
-                    "top_candidate_score": initial_candidates[0]['similarity'] if initial_candidates else None
+                # Generate response
+                response = await self.generate_response(session.current_context, query, is_followup, session=session)
+                
+                session.logger.log("pipeline_complete", {
+                    "query": query,
+                    "response": response,
+                    "is_followup": is_followup,
                 })
                 
-                # Extract just the content and metadata for reranking
-                candidates_for_reranking = []
-                for chunk in initial_candidates:
-                    candidate = {
-                        'content': chunk['content'],
-                        'url': chunk['url'],
-                        'strategy': chunk['strategy'],
-                        'chunk_index': chunk['chunk_index'],
-                        'total_chunks': chunk['total_chunks']
-                    }
-                    candidates_for_reranking.append(candidate)
+                # Save logs before clearing
+                session.logger.save_logs()
+                # Clear logs after request is complete
+                session.logger.clear_logs()
+                    
+                return response
+            except Exception as e:
+                # Log error and save logs before clearing
+                session.logger.log_error("pipeline_run", e, {"query": query})
+                session.logger.save_logs()
+                session.logger.clear_logs()
+                raise
+    
+    async def run_stream(self, query: str, session: Optional[PipelineSession] = None) -> AsyncGenerator[Dict[str, Any], None]:
+        """
+        Execute the complete pipeline, streaming events as they become available.
+        
+        Yields:
+            {"type": "citations", "data": [...]} as soon as the context is built,
+            then {"type": "token", "data": str} for every generated chunk
+        """
+        session = session or self.session
+        with self.tracer.start_trace("pipeline.run_stream", query=query, session_id=session.session_id):
+            try:
+                session.logger.log("pipeline_start", {"query": query, "stream": True})
                 
-                # Rerank the retrieved candidates
-                reranked_chunks = self.reranker.rerank(candidates_for_reranking, query)
-                self.logger.log("followup_reranking", {
-                    "num_reranked": len(reranked_chunks),
-                    "top_reranked_score": reranked_chunks[0]['similarity'] if reranked_chunks else None
-                })
+                is_followup = session.is_followup
+                context_chunks, search_results = await self.prepare_context(query, is_followup, session=session)
+                
+                yield {"type": "citations", "data": self.get_citations(context_chunks, search_results)}
+                
+                chunks = []
+                async for chunk in self.generate_response_stream(session.current_context, query, is_followup, session=session):
+                    chunks.append(chunk)
+                    yield {"type": "token", "data": chunk}
                 
-                # Build new context from reranked chunks
-                self.current_context = self.build_context(reranked_chunks, {}, query)
+                session.logger.log("pipeline_complete", {
+                    "query": query,
+                    "response": "".join(chunks),
+                    "is_followup": is_followup,
+                })
+                session.logger.save_logs()
+                session.logger.clear_logs()
+            except Exception as e:
+                session.logger.log_error("pipeline_run", e, {"query": query})
+                session.logger.save_logs()
+                session.logger.clear_logs()
+                raise
+    
+    async def run_batch(
+        self,
+        queries: List[str],
+        priority: Priority = Priority.BATCH,
+        max_concurrent_answers: int = 8
+    ) -> AsyncGenerator[Dict[str, Any], None]:
+        """
+        Answer many independent queries, sharing work across the batch.
+        
+        Every distinct URL is scraped and chunked once for the whole batch, all
+        chunks are embedded together and the candidates of all queries are
+        reranked in one pass. Answers are generated concurrently and yielded as
+        soon as each one is done.
+        
+        Args:
+            queries: Questions to answer, each in a fresh conversation
+            priority: Admission priority of the batch
+            max_concurrent_answers: Maximum number of answers generated at the same time
             
-            # Generate response
-            response = await self.generate_response(self.current_context, query, is_followup)
+        Yields:
+            {"index", "query", "answer", "citations"} per query in completion order,
+            or {"index", "query", "error"} if the query failed
+        """
+        with self.tracer.start_trace("pipeline.run_batch", num_queries=len(queries)):
+            batch_session = self.new_session()
+            batch_session.priority = priority
+            sessions = []
+            for query in queries:
+                session = self.new_session()
+                session.priority = priority
+                session.logger.log("pipeline_start", {"query": query, "batch": True})
+                sessions.append(session)
             
-            self.logger.log("pipeline_complete", {
-                "query": query,
-                "response": response,
-                "is_followup": is_followup,
-            })
+            def failure(index: int, error: Exception) -> Dict[str, Any]:
+                sessions[index].logger.log_error("pipeline_run", error, {"query": queries[index]})
+                sessions[index].logger.save_logs()
+                sessions[index].logger.clear_logs()
+                return {"index": index, "query": queries[index], "error": str(error)}
+            
+            # Search all queries concurrently
+            search_results = await asyncio.gather(
+                *(self.search(query, session=session) for query, session in zip(queries, sessions)),
+                return_exceptions=True
+            )
+            active = []
+            urls_per_query = {}
+            for index, results in enumerate(search_results):
+                if isinstance(results, Exception):
+                    yield failure(index, results)
+                    continue
+                urls = self._extract_urls(results)[:self.max_sources]
+                sessions[index].logger.log("url_extraction", {
+                    "num_urls": len(urls),
+                    "urls": urls
+                })
+                urls_per_query[index] = urls
+                active.append(index)
             
-            # Save logs before clearing
-            self.logger.save_logs()
-            # Clear logs after request is complete
-            self.logger.clear_logs()
+            try:
+                # Scrape and chunk every distinct URL only once
+                requested_urls = [url for index in active for url in urls_per_query[index]]
+                unique_urls = list(dict.fromkeys(requested_urls))
+                async with self._admit("scraping", batch_session):
+                    with self._stage("scrape", batch_session, num_urls=len(unique_urls)):
+                        scraped_content = await self.web_scraper.scrape_many(unique_urls)
+                batch_session.logger.log("scraping", {
+                    "num_urls_requested": len(requested_urls),
+                    "num_urls_scraped": len(scraped_content)
+                })
                 
-            return response
-        except Exception as e:
-            # Log error and save logs before clearing
-            self.logger.log_error("pipeline_run", e, {"query": query})
-            self.logger.save_logs()
-            self.logger.clear_logs()
-            raise
+                # Embed the chunks of all pages together, the embedder batches them internally
+                all_chunks = await self._chunk_scraped_content(scraped_content, batch_session)
+                retriever = self._retriever_for(batch_session)
+                embedded_chunks = await self._embed_for(retriever, all_chunks, batch_session)
+                batch_session.logger.log("embedding", {"num_chunks": len(all_chunks)})
+                chunks_by_url: Dict[str, List[Dict[str, Any]]] = {}
+                for chunk in embedded_chunks:
+                    for url in chunk.get('source_urls', [chunk['url']]):
+                        chunks_by_url.setdefault(url, []).append(chunk)
+                
+                # Retrieve per query, then rerank all queries in a single pass
+                candidate_lists = []
+                for index in active:
+                    session = sessions[index]
+                    # A collapsed duplicate is listed under each of its urls, keep it once
+                    session.embedded_chunks = list({
+                        id(chunk): chunk for url in urls_per_query[index] for chunk in chunks_by_url.get(url, [])
+                    }.values())
+                    with self._stage("retrieve", session):
+                        initial_candidates = retriever.retrieve(session.embedded_chunks, queries[index])
+                    session.logger.log("initial_retrieval", {
+                        "num_candidates": len(initial_candidates),
+                        "top_candidate_score": initial_candidates[0]['similarity'] if initial_candidates else None
+                    })
+                    candidate_lists.append([self._rerank_candidate(chunk) for chunk in initial_candidates])
+                async with self._admit("reranking", batch_session):
+                    with self._stage("rerank", batch_session):
+                        reranked_lists = await asyncio.to_thread(
+                            self.reranker.rerank_batch, candidate_lists, [queries[index] for index in active]
+                        )
+                batch_session.logger.log("reranking", {
+                    "num_queries": len(active),
+                    "num_pairs": sum(len(candidates) for candidates in candidate_lists)
+                })
+            except Exception as e:
+                batch_session.logger.log_error("run_batch", e, {"num_queries": len(queries)})
+                for index in active:
+                    yield failure(index, e)
+                return
+            finally:
+                batch_session.logger.save_logs()
+                batch_session.logger.clear_logs()
+            
+            semaphore = asyncio.Semaphore(max_concurrent_answers)
+            
+            async def answer(index: int, reranked_chunks: List[Dict[str, Any]]) -> Dict[str, Any]:
+                query = queries[index]
+                session = sessions[index]
+                try:
+                    async with semaphore:
+                        session.current_context = self.build_context(reranked_chunks, search_results[index], query, session=session)
+                        response = await self.generate_response(session.current_context, query, session=session)
+                    session.logger.log("pipeline_complete", {
+                        "query": query,
+                        "response": response,
+                        "is_followup": False,
+                    })
+                    session.logger.save_logs()
+                    session.logger.clear_logs()
+                    return {
+                        "index": index,
+                        "query": query,
+                        "answer": response,
+                        "citations": self.get_citations(session.context_chunks, search_results[index])
+                    }
+                except Exception as e:
+                    return failure(index, e)
+            
+            tasks = [
+                asyncio.ensure_future(answer(index, reranked_chunks))
+                for index, reranked_chunks in zip(active, reranked_lists)
+            ]
+            try:
+                for finished in asyncio.as_completed(tasks):
+                    yield await finished
+            finally:
+                # Stop generating answers nobody will read
+                for task in tasks:
+                    task.cancel()
     
     def run_sync(self, query: str) -> str:
         """Synchronous version of run."""
@@ -614,9 +1155,10 @@ class RAGSearchPipeline:
         # Combine sorted results
         sorted_results = dated_results + undated_results
 
-        log_info(f"Found {len(sorted_results)} organic results", "RAGSearchPipeline")
-        for result in sorted_results:
-            log_info(f"Result: {result['title']} - {result['date']} - {result['link']}", "RAGSearchPipeline")
+        log_info("Found %d organic results", "RAGSearchPipeline", len(sorted_results))
+        if is_enabled("RAGSearchPipeline", DEBUG):
+            for result in sorted_results:
+                log_debug("Result: %s - %s - %s", "RAGSearchPipeline", result.get('title'), result.get('date'), result.get('link'))
         
         # Extract URLs from sorted results
         for result in sorted_results:
@@ -626,26 +1168,87 @@ class RAGSearchPipeline:
         return urls
 
 
-if __name__ == "__main__":
-    import argparse
-    
-    parser = argparse.ArgumentParser(description='RAG Search Pipeline')
-    parser.add_argument('--config', type=str, help='Path to YAML configuration file')
-    parser.add_argument('--use-openai', action='store_true', help='Use OpenAI API instead of local endpoints')
-    args = parser.parse_args()
+def build_jina_reranker(config: Dict[str, Any]) -> JinaAIReranker:
+    """Create the local Jina AI reranker configured in the reranker section."""
+    return JinaAIReranker(
+        verbose=config["reranker"]["verbose"],
+        top_k=config["reranker"]["top_k"],
+        batch_size=config["reranker"]["batch_size"],
+        max_length=config["reranker"]["max_length"],
+        score_cache_size=config["reranker"].get("score_cache_size", 100000),
+        score_cache_ttl=config["reranker"].get("score_cache_ttl"),
+        max_batch_tokens=config["reranker"].get("max_batch_tokens", 16384),
+        bucket_by_length=config["reranker"].get("bucket_by_length", True),
+        backend=config["reranker"].get("backend", "torch"),
+        onnx_file=config["reranker"].get("onnx_file", "onnx/model.onnx")
+    )
 
-    # Load configuration
-    config = load_config(args.config)
+def build_reranker(config: Dict[str, Any]) -> Reranker:
+    """Create the configured reranker, using the shared scoring service if it is enabled."""
+    service_config = config.get("scoring_service", {})
+    if service_config.get("enabled", False):
+        reranker = RemoteReranker(
+            url=service_config.get("url", "unix:///tmp/rag_search_scoring.sock"),
+            top_k=config["reranker"]["top_k"],
+            timeout=service_config.get("timeout", 30),
+            verbose=config["reranker"]["verbose"]
+        )
+    else:
+        reranker = build_jina_reranker(config)
     
+    cascade_config = config["reranker"].get("cascade", {})
+    if cascade_config.get("enabled", False):
+        # Small cross-encoder scores every candidate, Jina only the survivors
+        reranker = CascadeReranker(
+            first_stage=CrossEncoderReranker(
+                model_name=cascade_config.get("first_stage_model", "cross-encoder/ms-marco-MiniLM-L-6-v2"),
+                batch_size=cascade_config.get("first_stage_batch_size", 32),
+                verbose=config["reranker"]["verbose"]
+            ),
+            second_stage=reranker,
+            first_stage_top_n=cascade_config.get("first_stage_top_n", 20),
+            audit_rate=cascade_config.get("audit_rate", 0.01),
+            verbose=config["reranker"]["verbose"]
+        )
+    return reranker
+
+def build_quality_improver(config: Dict[str, Any]) -> QualityImprover:
+    """Create the quality improver, using the shared scoring service if it is enabled."""
+    service_config = config.get("scoring_service", {})
+    if service_config.get("enabled", False) and service_config.get("serve_quality", True):
+        return RemoteQualityImprover(
+            url=service_config.get("url", "unix:///tmp/rag_search_scoring.sock"),
+            timeout=service_config.get("timeout", 30),
+            verbose=config["quality_improver"]["verbose"]
+        )
+    return QualityImprover(verbose=config["quality_improver"]["verbose"])
+
+def build_chunker(config: Dict[str, Any], embedding_model: str) -> Chunker:
+    """Create the chunker, measuring tokens of the embedding model for type "markdown"."""
+    if config["chunker"].get("type", "recursive") == "markdown":
+        return MarkdownChunker(
+            chunk_size=config["chunker"].get("chunk_size_tokens", 256),
+            chunk_overlap=config["chunker"].get("chunk_overlap_tokens", 32),
+            model=embedding_model,
+            verbose=config["chunker"]["verbose"]
+        )
+    return Chunker(
+        verbose=config["chunker"]["verbose"],
+        chunk_size=config["chunker"]["chunk_size"],
+        chunk_overlap=config["chunker"]["chunk_overlap"]
+    )
+
+def build_pipeline(config: Dict[str, Any], use_openai: bool = False) -> RAGSearchPipeline:
+    """Create a RAGSearchPipeline with all components configured from config."""
     # Get unified API configuration
-    api_config = get_api_config(config, args.use_openai)
+    api_config = get_api_config(config, use_openai)
 
     # Initialize OpenAI clients using unified configuration
     embeding_client = openai.OpenAI(
         api_key=api_config["api_key"],
         base_url=api_config["embedding_url"]
     )
-    llm_client = openai.OpenAI(
+    llm_client = openai.AsyncOpenAI(
         api_key=api_config["api_key"],
         base_url=api_config["llm_url"]
     )
@@ -654,14 +1257,22 @@ if __name__ == "__main__":
         openai_client=llm_client,
         model=api_config["llm_model"],
         max_queries=config["query_enhancer"]["max_queries"],
+        cache_size=config["query_enhancer"].get("cache_size", 1024),
+        cache_ttl=config["query_enhancer"].get("cache_ttl", 3600),
         verbose=config["query_enhancer"]["verbose"]
     )
+    if config["query_enhancer"].get("use_router", False):
+        query_enhancer = QueryRouter(
+            llm_enhancer=query_enhancer,
+            max_simple_words=config["query_enhancer"].get("max_simple_words", 12),
+            verbose=config["query_enhancer"]["verbose"]
+        )
     
     search_provider = SearXNGProvider(
         verbose=config["search_provider"]["verbose"],
         instance_url=config["search_provider"]["instance_url"]
     )
-    quality_improver = QualityImprover(verbose=config["quality_improver"]["verbose"])
+    quality_improver = build_quality_improver(config)
     web_scraper = WebScraper(
         strategies=config["web_scraper"]["strategies"],
         debug=config["web_scraper"]["debug"], 
@@ -672,11 +1283,7 @@ if __name__ == "__main__":
         enable_quality_model=config["quality_improver"]["enable_quality_model"],
     )
 
-    chunker = Chunker(
-        verbose=config["chunker"]["verbose"],
-        chunk_size=config["chunker"]["chunk_size"],
-        chunk_overlap=config["chunker"]["chunk_overlap"]
-    )
+    chunker = build_chunker(config, api_config["embedding_model"])
 
     # Initialize embedder for initial retrieval
     embedder = OpenAIEmbedder(
@@ -688,21 +1295,80 @@ if __name__ == "__main__":
     )
     
     # Initialize retriever for first stage
-    retriever = CosineRetriever(
-        embedder=embedder, 
-        verbose=config["retriever"]["verbose"],
-        top_k=config["retriever"]["top_k"]
-    )
+    retriever_type = config["retriever"].get("type", "cosine")
+    if retriever_type == "hybrid":
+        dense_type = config["retriever"].get("hybrid_dense", "cosine")
+    else:
+        dense_type = retriever_type
+    if dense_type == "ann":
+        retriever = ANNRetriever(
+            embedder=embedder,
+            verbose=config["retriever"]["verbose"],
+            top_k=config["retriever"]["top_k"],
+            max_chunks=config["retriever"].get("max_chunks", 200000),
+            nlist=config["retriever"].get("nlist"),
+            nprobe=config["retriever"].get("nprobe", 16),
+            index_path=config["retriever"].get("index_path"),
+            search_corpus=config["retriever"].get("search_corpus", False)
+        )
+    else:
+        retriever = CosineRetriever(
+            embedder=embedder, 
+            verbose=config["retriever"]["verbose"],
+            top_k=config["retriever"]["top_k"]
+        )
+    if retriever_type in ("bm25", "hybrid"):
+        sparse_retriever = BM25Retriever(
+            verbose=config["retriever"]["verbose"],
+            top_k=config["retriever"]["top_k"],
+            k1=config["retriever"].get("bm25_k1", 1.5),
+            b=config["retriever"].get("bm25_b", 0.75),
+            max_chunks=config["retriever"].get("max_chunks", 200000)
+        )
+        if retriever_type == "bm25":
+            retriever = sparse_retriever
+        else:
+            retriever = HybridRetriever(
+                dense=retriever,
+                sparse=sparse_retriever,
+                verbose=config["retriever"]["verbose"],
+                top_k=config["retriever"]["top_k"],
+                candidate_k=config["retriever"].get("hybrid_candidates", 100),
+                rrf_k=config["retriever"].get("rrf_k", 60),
+                dense_weight=config["retriever"].get("dense_weight", 1.0),
+                sparse_weight=config["retriever"].get("sparse_weight", 1.0)
+            )
     
     # Initialize reranker for second stage
-    reranker = JinaAIReranker(
-        verbose=config["reranker"]["verbose"],
-        top_k=config["reranker"]["top_k"],
-        batch_size=config["reranker"]["batch_size"],
-        max_length=config["reranker"]["max_length"]
-    )
+    reranker = build_reranker(config)
     
     context_builder = LukaContextBuilder(verbose=config["context_builder"]["verbose"])
+    context_packer = ContextPacker(
+        max_tokens=config["context_builder"].get("max_context_tokens", 100000),
+        min_chunk_tokens=config["context_builder"].get("min_chunk_tokens", 50),
+        duplicate_threshold=config["context_builder"].get("duplicate_threshold", 0.8),
+        verbose=config["context_builder"]["verbose"]
+    )
+    
+    dedup_threshold = config["chunker"].get("dedup_threshold", 0.85)
+    deduplicator = None
+    if dedup_threshold is not None:
+        deduplicator = NearDuplicateFilter(
+            threshold=dedup_threshold,
+            num_perm=config["chunker"].get("dedup_num_perm", 64),
+            verbose=config["chunker"]["verbose"]
+        )
+    
+    # Per-stage concurrency caps, requests beyond them queue by priority
+    admission_config = config.get("admission", {})
+    admission = None
+    if admission_config.get("enabled", False):
+        admission = AdmissionController({
+            "scraping": admission_config.get("max_concurrent_scraping"),
+            "reranking": admission_config.get("max_concurrent_reranking"),
+            "llm": admission_config.get("max_concurrent_llm")
+        })
+    
     llm_provider = OpenAIProvider(
         model=api_config["llm_model"],
         api_key=api_config["api_key"],
@@ -710,8 +1376,18 @@ if __name__ == "__main__":
         verbose=config["llm_provider"]["verbose"]
     )
 
+    # Console log levels per component, e.g. {"default": "warning", "JinaAI": "debug"}
+    configure_levels(config.get("console_log_levels") or {})
+    
+    # Defaults of every session's PipelineLogger
+    PipelineLogger.configure(
+        level=config["pipeline"].get("log_level", "info"),
+        sample_rate=config["pipeline"].get("log_sample_rate", 1.0),
+        max_entries=config["pipeline"].get("log_max_entries", 1000)
+    )
+
     # Initialize pipeline with both retriever and reranker
-    pipeline = RAGSearchPipeline(
+    return RAGSearchPipeline(
         search_provider=search_provider,
         web_scraper=web_scraper,
         chunker=chunker,
@@ -721,9 +1397,34 @@ if __name__ == "__main__":
         context_builder=context_builder,
         llm_provider=llm_provider,
         query_enhancer=query_enhancer,
+        context_packer=context_packer,
+        deduplicator=deduplicator,
+        cpu_executor=create_executor(
+            config["pipeline"].get("cpu_executor", "thread"),
+            config["pipeline"].get("cpu_workers")
+        ),
         max_sources=config["pipeline"]["max_sources"],
-        debug=config["pipeline"]["debug"]
+        debug=config["pipeline"]["debug"],
+        log_dir=config["pipeline"].get("log_dir", "logs"),
+        snippet_fast_path=config["pipeline"].get("snippet_fast_path", False),
+        snippet_confidence_threshold=config["pipeline"].get("snippet_confidence_threshold", 0.8),
+        admission=admission,
+        tracer=Tracer.from_config(config.get("tracing", {}))
     )
+
+
+if __name__ == "__main__":
+    import argparse
+    
+    parser = argparse.ArgumentParser(description='RAG Search Pipeline')
+    parser.add_argument('--config', type=str, help='Path to YAML configuration file')
+    parser.add_argument('--use-openai', action='store_true', help='Use OpenAI API instead of local endpoints')
+    args = parser.parse_args()
+
+    # Load configuration
+    config = load_config(args.config)
+    
+    pipeline = build_pipeline(config, args.use_openai)
     
     # Run pipeline in continuous chat mode
     print("\033[92m")  # Green color
@@ -1,23 +1,23 @@
 import asyncio
 import json
 import logging
-from typing import Dict, Any, List, Optional, Callable
+import os
+import re
+import time
+from typing import Dict, Any, List, Optional, Callable, Tuple
 from fastapi import FastAPI, Request, HTTPException, WebSocket, WebSocketDisconnect
-from fastapi.responses import JSONResponse
+from fastapi.responses import JSONResponse, PlainTextResponse, StreamingResponse
 from pydantic import BaseModel
 import uvicorn
 import uuid
 from sse_starlette.sse import EventSourceResponse
 
-from main import RAGSearchPipeline
-from rag_search.llm.openai_provider import OpenAIProvider
-from rag_search.search.searxng import SearXNGProvider
-from rag_search.scraping.scraper import WebScraper
-from rag_search.processing.chunker import Chunker
-from rag_search.processing.embedder import SentenceTransformerEmbedder
-from rag_search.processing.reranker import CosineReranker
-from rag_search.processing.query_enhancer import QueryEnhancer
-from rag_search.context.builder import SimpleContextBuilder
+from main import RAGSearchPipeline, load_config, build_pipeline
+from rag_search.utils.session import PipelineSession, SessionStore
+from rag_search.utils.async_utils import SingleFlight
+from rag_search.utils.admission import AdmissionRejected, Priority
+from rag_search.utils.logging import configure_levels
+from rag_search.processing.ann_retriever import ANNRetriever
 
 # Configure logging
 logging.basicConfig(
@@ -32,6 +32,14 @@ app = FastAPI(title="RAGSearch API", version="1.0.0")
 # Models for API requests and responses
 class SearchQuery(BaseModel):
     query: str
+    session_id: Optional[str] = None
+    priority: Optional[str] = None  # "interactive" (default) or "batch"
+    timeout: Optional[float] = None  # Seconds the client is willing to wait
+    retrieval: Optional[str] = None  # "bm25" skips embedding for latency-critical requests
+
+class BatchSearchQuery(BaseModel):
+    queries: List[str]
+    priority: Optional[str] = "batch"
 
 class SearchResult(BaseModel):
     title: str
@@ -43,6 +51,7 @@ class SearchResult(BaseModel):
 class SearchResponse(BaseModel):
     results: List[SearchResult]
     query: str
+    session_id: Optional[str] = None
     
 # Connection manager for WebSockets
 class ConnectionManager:
@@ -83,45 +92,97 @@ class ConnectionManager:
 manager = ConnectionManager()
 
 # Create a default RAGSearchPipeline
-def create_default_pipeline() -> RAGSearchPipeline:
-    """Create a default RAGSearchPipeline instance."""
+def create_default_pipeline(config: Dict[str, Any]) -> RAGSearchPipeline:
+    """Create a default RAGSearchPipeline instance.
+    
+    RAG_USE_OPENAI=True switches to the OpenAI endpoints.
+    """
     try:
-        query_enhancer = QueryEnhancer()
-        search_provider = SearXNGProvider()
-        web_scraper = WebScraper()
-        chunker = Chunker()
-        embedder = SentenceTransformerEmbedder()
-        reranker = CosineReranker(embedder=embedder)
-        context_builder = SimpleContextBuilder()
-        llm_provider = OpenAIProvider(
-            model="nemotron",
-            api_key="sk-dummy",  # Replace with actual API key in production
-            api_base="http://localhost:8001/v1/",
-        )
+        pipeline = build_pipeline(config, use_openai=os.getenv("RAG_USE_OPENAI") == "True")
         
         logger.info("Default RAGSearchPipeline created successfully")
-        return RAGSearchPipeline(
-            search_provider=search_provider,
-            web_scraper=web_scraper,
-            chunker=chunker,
-            embedder=embedder,
-            reranker=reranker,
-            context_builder=context_builder,
-            llm_provider=llm_provider,
-            query_enhancer=query_enhancer,
-            max_sources=3,
-        )
+        return pipeline
     except Exception as e:
         logger.error(f"Failed to create default pipeline: {str(e)}")
         raise
 
-# Initialize the pipeline
+# The configuration file is taken from RAG_CONFIG (default config.yaml)
+config = load_config(os.getenv("RAG_CONFIG", "config.yaml"))
+server_config = config.get("api_server", {})
+
+# Initialize the pipeline; it only holds shared components (models, clients),
+# conversation state lives in per-session objects so requests can run concurrently
 try:
-    pipeline = create_default_pipeline()
+    pipeline = create_default_pipeline(config)
 except Exception as e:
     logger.critical(f"Failed to initialize pipeline: {str(e)}")
     raise
 
+sessions = SessionStore(
+    max_sessions=server_config.get("max_sessions", 1000),
+    ttl=server_config.get("session_ttl", 1800),
+    log_dir=config.get("pipeline", {}).get("log_dir", "logs")
+)
+
+# Identical queries arriving while one is in flight share its pipeline execution
+coalesce_requests = server_config.get("coalesce_requests", True)
+in_flight = SingleFlight()
+
+def coalescing_key(kind: str, query: str, retrieval_mode: Optional[str] = None) -> tuple:
+    """Key under which identical (normalized) queries are coalesced."""
+    return (kind, retrieval_mode, re.sub(r'\s+', ' ', query).strip().lower())
+
+async def run_stream_detached(query: str, priority: Priority, deadline: Optional[float], retrieval_mode: Optional[str] = None):
+    """Run a fresh conversation in its own session and finally hand its state to the subscribers."""
+    flight_session = pipeline.new_session()
+    flight_session.priority = priority
+    flight_session.deadline = deadline
+    flight_session.retrieval_mode = retrieval_mode
+    async for event in pipeline.run_stream(query, session=flight_session):
+        yield event
+    # Internal event, not forwarded to clients
+    yield {"type": "session_state", "data": flight_session}
+
+default_request_timeout = server_config.get("request_timeout", 60)
+
+def admit_request(query: SearchQuery) -> Tuple[Priority, float, Optional[str]]:
+    """Resolve the request's priority, deadline and retrieval mode and reject it early if overloaded.
+    
+    The values are applied to the session with apply_request() only once its lock is held,
+    so a concurrent request of the same session cannot overwrite them mid-run.
+    
+    Returns:
+        Priority, absolute deadline and retrieval mode (None for the configured default)
+    
+    Raises:
+        HTTPException: 400 for an unknown priority or retrieval mode, 429 with Retry-After
+            if the expected queueing time exceeds the request's timeout
+    """
+    try:
+        priority = Priority.from_name(query.priority)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    if query.retrieval not in (None, "default", "bm25"):
+        raise HTTPException(status_code=400, detail=f"Unknown retrieval mode: {query.retrieval}")
+    retrieval_mode = query.retrieval if query.retrieval != "default" else None
+    deadline = time.monotonic() + (query.timeout or default_request_timeout)
+    
+    if pipeline.admission is not None:
+        try:
+            pipeline.admission.check(priority, deadline)
+        except AdmissionRejected as e:
+            raise rejection_response(e)
+    return priority, deadline, retrieval_mode
+
+def apply_request(session: PipelineSession, options: Tuple[Priority, float, Optional[str]]):
+    """Attach an admitted request's options to its session; call with the session lock held."""
+    session.priority, session.deadline, session.retrieval_mode = options
+
+def rejection_response(e: AdmissionRejected) -> HTTPException:
+    """429 response telling the client when to retry."""
+    logger.warning(f"Request rejected: {str(e)}")
+    return HTTPException(status_code=429, detail=str(e), headers={"Retry-After": e.retry_after_header})
+
 # Create an event emitter function for a specific client
 def create_emitter(client_id: str) -> Callable[[Dict[str, Any]], None]:
     async def emit_event(event: Dict[str, Any]):
@@ -140,126 +201,264 @@ def create_emitter(client_id: str) -> Callable[[Dict[str, Any]], None]:
     return emitter
 
 # Modified search method with progress reporting
-async def search_with_progress(query: str, client_id: str) -> Dict[str, Any]:
+async def search_with_progress(query: str, client_id: str, session: PipelineSession) -> Dict[str, Any]:
     """Run the pipeline with progress reporting"""
     logger.info(f"Starting search with progress for query: '{query}', client: {client_id}")
     emitter = create_emitter(client_id)
     
-    # Initial status
-    emitter({
-        "type": "status",
-        "data": {
-            "status": "in_progress",
-            "description": f"Processing query: {query}",
-            "done": False,
-            "action": "search_start",
-            "urls": [],
-        }
-    })
-    
-    try:
-        # Search
+    with pipeline.tracer.start_trace("api.search", query=query, client_id=client_id, session_id=session.session_id):
+        # Initial status
         emitter({
             "type": "status",
             "data": {
                 "status": "in_progress",
-                "description": f"Searching for results",
+                "description": f"Processing query: {query}",
                 "done": False,
-                "action": "search",
+                "action": "search_start",
                 "urls": [],
             }
         })
-        search_results = await pipeline.search(query)
-        logger.info(f"Search completed for query: '{query}', found {len(search_results)} results")
         
-        # Extract URLs
-        urls = pipeline._extract_urls(search_results)[:pipeline.max_sources]
-        logger.info(f"Extracted {len(urls)} URLs for processing")
-        
-        # Scrape
-        emitter({
-            "type": "status",
-            "data": {
-                "status": "in_progress",
-                "description": f"Scraping content from {len(urls)} sources",
-                "done": False,
-                "action": "scrape",
-                "urls": urls,
-            }
-        })
-        scraped_content = await pipeline.scrape_content(search_results)
-        logger.info(f"Content scraped from {len(scraped_content)} sources")
-        
-        # Process
-        emitter({
-            "type": "status",
-            "data": {
-                "status": "in_progress",
-                "description": "Processing and ranking content",
-                "done": False,
-                "action": "process",
-                "urls": urls,
-            }
-        })
-        processed_content = await pipeline.process_content(scraped_content, query)
-        logger.info(f"Content processed, {len(processed_content)} items after processing")
-        
-        # Format as API response
-        results = []
-        for item in processed_content:
-            result = {
-                "title": item.get("title", "Untitled"),
-                "url": item.get("url", ""),
-                "content": item.get("content", ""),
-                "snippet": item.get("snippet", ""),
-            }
-            if "score" in item:
-                result["score"] = item["score"]
-            results.append(result)
-        
-        # Final status
-        emitter({
-            "type": "status",
-            "data": {
-                "status": "complete",
-                "description": f"Search completed with {len(results)} results",
-                "done": True,
-                "action": "search_complete",
-                "urls": urls,
-            }
-        })
-        
-        logger.info(f"Search with progress completed successfully for client: {client_id}")
-        return {
-            "results": results,
-            "query": query
-        }
-    except Exception as e:
-        logger.error(f"Error in search_with_progress for query '{query}', client {client_id}: {str(e)}")
-        # Notify client about the error
-        emitter({
-            "type": "error",
-            "data": {
-                "status": "error",
-                "description": f"Search failed: {str(e)}",
-                "done": True,
-                "action": "search_error",
+        try:
+            # Search
+            emitter({
+                "type": "status",
+                "data": {
+                    "status": "in_progress",
+                    "description": f"Searching for results",
+                    "done": False,
+                    "action": "search",
+                    "urls": [],
+                }
+            })
+            search_results = await pipeline.search(query, session=session)
+            logger.info(f"Search completed for query: '{query}', found {len(search_results)} results")
+            
+            # Extract URLs
+            urls = pipeline._extract_urls(search_results)[:pipeline.max_sources]
+            logger.info(f"Extracted {len(urls)} URLs for processing")
+            
+            # Scrape
+            emitter({
+                "type": "status",
+                "data": {
+                    "status": "in_progress",
+                    "description": f"Scraping content from {len(urls)} sources",
+                    "done": False,
+                    "action": "scrape",
+                    "urls": urls,
+                }
+            })
+            async with pipeline._admit("scraping", session):
+                with pipeline._stage("scrape", session, num_urls=len(urls)):
+                    scraped_content = await pipeline.web_scraper.scrape_many(urls)
+            logger.info(f"Content scraped from {len(scraped_content)} sources")
+            
+            # Process
+            emitter({
+                "type": "status",
+                "data": {
+                    "status": "in_progress",
+                    "description": "Processing and ranking content",
+                    "done": False,
+                    "action": "process",
+                    "urls": urls,
+                }
+            })
+            processed_content = await pipeline.process_content(scraped_content, query, session=session)
+            logger.info(f"Content processed, {len(processed_content)} items after processing")
+            
+            # Format as API response
+            results = []
+            for item in processed_content:
+                result = {
+                    "title": item.get("title", "Untitled"),
+                    "url": item.get("url", ""),
+                    "content": item.get("content", ""),
+                    "snippet": item.get("snippet", ""),
+                }
+                if "score" in item:
+                    result["score"] = item["score"]
+                results.append(result)
+            
+            # Final status
+            emitter({
+                "type": "status",
+                "data": {
+                    "status": "complete",
+                    "description": f"Search completed with {len(results)} results",
+                    "done": True,
+                    "action": "search_complete",
+                    "urls": urls,
+                }
+            })
+            
+            logger.info(f"Search with progress completed successfully for client: {client_id}")
+            return {
+                "results": results,
+                "query": query,
+                "session_id": session.session_id
             }
-        })
-        raise
+        except Exception as e:
+            logger.error(f"Error in search_with_progress for query '{query}', client {client_id}: {str(e)}")
+            # Notify client about the error
+            emitter({
+                "type": "error",
+                "data": {
+                    "status": "error",
+                    "description": f"Search failed: {str(e)}",
+                    "done": True,
+                    "action": "search_error",
+                }
+            })
+            raise
+        finally:
+            session.logger.save_logs()
+            session.logger.clear_logs()
 
 # Regular HTTP endpoint for search
 @app.post("/search", response_model=SearchResponse)
 async def search_endpoint(query: SearchQuery, request: Request):
     client_id = str(uuid.uuid4())
     logger.info(f"Search request received: '{query.query}', assigned client ID: {client_id}")
+    session = sessions.get_or_create(query.session_id)
+    options = admit_request(query)
     try:
-        response = await search_with_progress(query.query, client_id)
+        async with session.lock:
+            apply_request(session, options)
+            if not coalesce_requests:
+                return await search_with_progress(query.query, client_id, session)
+            
+            response, shared = await in_flight.do(
+                coalescing_key("search", query.query, session.retrieval_mode),
+                lambda: search_with_progress(query.query, client_id, session)
+            )
+            if shared:
+                logger.info(f"Request {client_id} shared an in-flight search for '{query.query}'")
+                # Let follow-ups in this session retrieve from the chunks the shared run embedded
+                leader_session = sessions.get(response["session_id"])
+                if leader_session is not None:
+                    session.embedded_chunks = leader_session.embedded_chunks
+                response = {**response, "session_id": session.session_id}
         return response
+    except AdmissionRejected as e:
+        raise rejection_response(e)
     except Exception as e:
         logger.error(f"Error processing search request: {str(e)}")
         raise HTTPException(status_code=500, detail=str(e))
 
+# Streaming answer endpoint: citations as soon as the context is built, then the answer token by token
+@app.post("/search/stream")
+async def search_stream_endpoint(query: SearchQuery, request: Request):
+    client_id = str(uuid.uuid4())
+    logger.info(f"Streaming search request received: '{query.query}', assigned client ID: {client_id}")
+    
+    session = sessions.get_or_create(query.session_id)
+    options = admit_request(query)
+    
+    async def event_generator():
+        yield {"event": "session", "data": json.dumps({"session_id": session.session_id})}
+        yield {
+            "event": "status",
+            "data": json.dumps({
+                "status": "in_progress",
+                "description": f"Processing query: {query.query}",
+                "done": False,
+                "action": "search_start",
+            })
+        }
+        try:
+            # Requests of one conversation run one after another, other sessions are unaffected
+            async with session.lock:
+                apply_request(session, options)
+                disconnected = False
+                if coalesce_requests and not session.is_followup:
+                    # New conversations with the same question share one run and its stream
+                    events, shared = in_flight.stream(
+                        coalescing_key("stream", query.query, session.retrieval_mode),
+                        lambda: run_stream_detached(query.query, session.priority, session.deadline, session.retrieval_mode)
+                    )
+                    if shared:
+                        logger.info(f"Client {client_id} joined an in-flight stream for '{query.query}'")
+                else:
+                    events = pipeline.run_stream(query.query, session=session)
+                try:
+                    async for event in events:
+                        if event["type"] == "session_state":
+                            session.copy_from(event["data"])
+                            continue
+                        if await request.is_disconnected():
+                            logger.info(f"Client {client_id} disconnected, stopping stream")
+                            disconnected = True
+                            break
+                        # JSON-encode payloads so tokens containing newlines survive SSE framing
+                        yield {"event": event["type"], "data": json.dumps(event["data"])}
+                finally:
+                    # Closing the pipeline stream also closes the upstream LLM stream
+                    await events.aclose()
+            if not disconnected:
+                yield {
+                    "event": "status",
+                    "data": json.dumps({
+                        "status": "complete",
+                        "description": "Answer generated",
+                        "done": True,
+                        "action": "search_complete",
+                    })
+                }
+        except AdmissionRejected as e:
+            # Headers are already sent, report the overload as an event
+            logger.warning(f"Streaming request of client {client_id} rejected: {str(e)}")
+            yield {
+                "event": "error",
+                "data": json.dumps({
+                    "status": "overloaded",
+                    "description": str(e),
+                    "done": True,
+                    "action": "search_rejected",
+                    "retry_after": int(e.retry_after_header),
+                })
+            }
+        except Exception as e:
+            logger.error(f"Error in streaming search for client {client_id}: {str(e)}")
+            yield {
+                "event": "error",
+                "data": json.dumps({
+                    "status": "error",
+                    "description": f"Search failed: {str(e)}",
+                    "done": True,
+                    "action": "search_error",
+                })
+            }
+    
+    return EventSourceResponse(event_generator())
+
+# Batch endpoint for offline workloads: one NDJSON line per query, in completion order
+@app.post("/search/batch")
+async def search_batch_endpoint(batch: BatchSearchQuery):
+    max_batch_size = server_config.get("max_batch_size", 1000)
+    if len(batch.queries) > max_batch_size:
+        raise HTTPException(status_code=400, detail=f"At most {max_batch_size} queries per batch")
+    try:
+        priority = Priority.from_name(batch.priority)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    logger.info(f"Batch search request received with {len(batch.queries)} queries")
+    
+    async def result_lines():
+        results = pipeline.run_batch(
+            batch.queries,
+            priority=priority,
+            max_concurrent_answers=server_config.get("batch_concurrency", 8)
+        )
+        try:
+            async for result in results:
+                yield json.dumps(result) + "\n"
+        finally:
+            await results.aclose()
+    
+    return StreamingResponse(result_lines(), media_type="application/x-ndjson")
+
 # WebSocket endpoint for real-time progress updates
 @app.websocket("/ws/{client_id}")
 async def websocket_endpoint(websocket: WebSocket, client_id: str):
@@ -303,11 +502,58 @@ async def sse_endpoint(client_id: str):
         logger.error(f"Error setting up SSE for client {client_id}: {str(e)}")
         raise HTTPException(status_code=500, detail=str(e))
 
+# Drop a conversation and its cached content
+@app.delete("/sessions/{session_id}")
+async def delete_session(session_id: str):
+    sessions.delete(session_id)
+    return {"status": "ok", "session_id": session_id}
+
+# Prometheus scrape target with per-stage latency histograms and pipeline counters
+@app.get("/metrics", response_class=PlainTextResponse)
+async def metrics():
+    return PlainTextResponse(pipeline.metrics.render(), media_type="text/plain; version=0.0.4")
+
+# Queue depth and wait times of the admission-controlled stages
+@app.get("/admission")
+async def admission_stats():
+    if pipeline.admission is None:
+        return {"enabled": False, "stages": {}}
+    return {"enabled": True, "stages": pipeline.admission.stats()}
+
+# Change console log levels at runtime, e.g. {"JinaAI": "debug", "default": "warning"}
+@app.post("/log-levels")
+async def set_log_levels(levels: Dict[str, str]):
+    try:
+        configure_levels(levels)
+    except KeyError as e:
+        raise HTTPException(status_code=400, detail=f"Unknown log level {e}")
+    return {"status": "ok", "levels": levels}
+
+# Keep the rolling retrieval corpus across restarts
+@app.on_event("shutdown")
+async def save_retriever_index():
+    # A hybrid retriever keeps the ANN index as its dense half
+    retriever = getattr(pipeline.retriever, "dense", pipeline.retriever)
+    if isinstance(retriever, ANNRetriever) and retriever.index_path:
+        retriever.save()
+        logger.info(f"Saved retrieval corpus of {len(retriever.chunks)} chunks")
+
+@app.on_event("shutdown")
+async def shutdown_cpu_executor():
+    if pipeline.cpu_executor is not None:
+        pipeline.cpu_executor.shutdown(wait=False, cancel_futures=True)
+
+# Close the LLM provider's pooled HTTP connections
+@app.on_event("shutdown")
+async def close_llm_provider():
+    if hasattr(pipeline.llm_provider, "aclose"):
+        await pipeline.llm_provider.aclose()
+
 # Health check endpoint
 @app.get("/health")
 async def health_check():
     logger.debug("Health check endpoint called")
-    return {"status": "ok"}
+    return {"status": "ok", "sessions": len(sessions), "in_flight": in_flight.in_flight()}
 
 # Run the server when executed directly
 if __name__ == "__main__":
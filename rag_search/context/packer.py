@@ -0,0 +1,169 @@
+import hashlib
+import re
+from typing import Any, Dict, List, Optional, Set, Tuple
+
+from rag_search.utils.logging import log_info
+from rag_search.utils.tokens import TokenCounter, get_token_counter
+
+_WORD_RE = re.compile(r"\w+")
+
+class ContextPacker:
+    """Selects and trims chunks to fit the LLM context, maximizing relevance per token.
+
+    Chunks are taken greedily by relevance density (reranker similarity per token), a
+    chunk that does not fit any more is trimmed into the remaining budget at the end.
+    Chunks mostly repeating already selected text are dropped, and the text a chunk shares
+    with an adjacent chunk of the same page (chunker overlap) is cut from one of them.
+    """
+
+    def __init__(
+        self,
+        max_tokens: int = 100000,
+        min_chunk_tokens: int = 50,
+        duplicate_threshold: float = 0.8,
+        shingle_size: int = 5,
+        verbose: bool = False
+    ):
+        """
+        Initialize the packer.
+
+        Args:
+            max_tokens: Token budget of all chunks together
+            min_chunk_tokens: Smallest remaining budget worth filling with a trimmed chunk
+            duplicate_threshold: Fraction of a chunk's word shingles already in the
+                selected chunks above which it is dropped as a duplicate
+            shingle_size: Number of words per shingle for duplicate detection
+            verbose: Whether to enable verbose logging
+        """
+        self.max_tokens = max_tokens
+        self.min_chunk_tokens = min_chunk_tokens
+        self.duplicate_threshold = duplicate_threshold
+        self.shingle_size = shingle_size
+        self.verbose = verbose
+
+    def _shingles(self, text: str) -> Set[bytes]:
+        words = _WORD_RE.findall(text.lower())
+        if len(words) <= self.shingle_size:
+            return {hashlib.blake2b(" ".join(words).encode(), digest_size=8).digest()} if words else set()
+        return {
+            hashlib.blake2b(" ".join(words[i:i + self.shingle_size]).encode(), digest_size=8).digest()
+            for i in range(len(words) - self.shingle_size + 1)
+        }
+
+    @staticmethod
+    def _overlap(before: str, after: str, min_overlap: int = 20) -> int:
+        """Length of the longest suffix of before that is a prefix of after."""
+        if len(before) < min_overlap or len(after) < min_overlap:
+            return 0
+        tail = before[-len(after):]
+        probe = after[:min_overlap]
+        start = tail.find(probe)
+        while start != -1:
+            if after.startswith(tail[start:]):
+                return len(tail) - start
+            start = tail.find(probe, start + 1)
+        return 0
+
+    def _strip_overlaps(self, chunk: Dict[str, Any], content: str, selected: Dict[Tuple[Any, int], str]) -> str:
+        """Cut the text content shares with the selected neighbours of the same page."""
+        url, index = chunk.get("url"), chunk.get("chunk_index")
+        if url is None or index is None:
+            return content
+        previous = selected.get((url, index - 1))
+        if previous:
+            content = content[self._overlap(previous, content):]
+        following = selected.get((url, index + 1))
+        if following:
+            overlap = self._overlap(content, following)
+            if overlap:
+                content = content[:-overlap]
+        return content
+
+    def pack(
+        self,
+        chunks: List[Dict[str, Any]],
+        token_counter: Optional[TokenCounter] = None,
+        max_tokens: Optional[int] = None
+    ) -> List[Dict[str, Any]]:
+        """
+        Pack chunks into the token budget.
+
+        Args:
+            chunks: Content chunks, ordered by relevance, with 'similarity' scores
+            token_counter: Counter of the LLM's tokenizer (cl100k_base if not given)
+            max_tokens: Token budget, the packer's max_tokens if not given
+
+        Returns:
+            Selected chunks in their original order; trimmed ones are copies with
+            shortened content and 'token_count' set on every chunk
+        """
+        token_counter = token_counter or get_token_counter("gpt-4")
+        budget = self.max_tokens if max_tokens is None else max_tokens
+
+        def count(chunk: Dict[str, Any], content: str) -> int:
+            # Chunks sized by the chunker with the same tokenizer are not tokenized again
+            if content == chunk["content"] and chunk.get("tokenizer") == token_counter.name \
+                    and chunk.get("token_count") is not None:
+                return chunk["token_count"]
+            return token_counter.count(content)
+
+        candidates = []
+        for position, chunk in enumerate(chunks):
+            content = chunk.get("content", "")
+            if not content:
+                continue
+            tokens = max(count(chunk, content), 1)
+            value = max(float(chunk.get("similarity") or 0.0), 0.0) + 1e-6
+            candidates.append((value / tokens, value, position, chunk))
+        # Highest relevance per token first, earlier (better ranked) chunks on ties
+        candidates.sort(key=lambda c: (-c[0], c[2]))
+
+        selected: Dict[int, Dict[str, Any]] = {}
+        selected_text: Dict[Tuple[Any, int], str] = {}
+        seen_shingles: Set[bytes] = set()
+        deferred = []
+        duplicates = 0
+        remaining = budget
+
+        def accept(position: int, chunk: Dict[str, Any], content: str, tokens: int):
+            packed = dict(chunk)
+            packed["content"] = content
+            packed["token_count"] = tokens
+            packed["tokenizer"] = token_counter.name
+            selected[position] = packed
+            if chunk.get("url") is not None and chunk.get("chunk_index") is not None:
+                selected_text[(chunk["url"], chunk["chunk_index"])] = content
+
+        for _, _, position, chunk in candidates:
+            shingles = self._shingles(chunk["content"])
+            if shingles and len(shingles & seen_shingles) / len(shingles) >= self.duplicate_threshold:
+                duplicates += 1
+                continue
+
+            content = self._strip_overlaps(chunk, chunk["content"], selected_text)
+            tokens = count(chunk, content)
+            if tokens == 0:
+                continue
+            if tokens > remaining:
+                deferred.append((position, chunk, content))
+                continue
+
+            accept(position, chunk, content, tokens)
+            seen_shingles |= shingles
+            remaining -= tokens
+
+        # Fill what is left with the densest chunk that did not fit, cut to the budget
+        if deferred and remaining >= self.min_chunk_tokens:
+            position, chunk, content = deferred[0]
+            content = token_counter.truncate(content, remaining)
+            tokens = token_counter.count(content)
+            accept(position, chunk, content, tokens)
+            remaining -= tokens
+
+        if self.verbose:
+            log_info(
+                "packed %d of %d chunks into %d of %d tokens (%d duplicates dropped)", "ContextPacker",
+                len(selected), len(chunks), budget - remaining, budget, duplicates
+            )
+
+        return [selected[position] for position in sorted(selected)]
@@ -1,7 +1,7 @@
 from typing import List, Dict, Any, Optional, AsyncGenerator
 import os
-import asyncio
 import json
+import httpx
 from termcolor import colored
 
 from rag_search.llm.provider import LLMProvider, LLMException
@@ -23,6 +23,8 @@ class OpenAIProvider(LLMProvider):
         context_length: int = 4096,
         verbose: bool = False,
         default_system_prompt: str = DEFAULT_SYSTEM_PROMPT,
+        http_client: Optional[httpx.AsyncClient] = None,
+        max_connections: int = 100,
         **kwargs
     ):
         """
@@ -35,6 +37,9 @@ class OpenAIProvider(LLMProvider):
             context_length: Maximum context length
             verbose: Whether to print verbose output
             default_system_prompt: Default system prompt to use
+            http_client: Optional shared httpx.AsyncClient, e.g. to pool connections
+                across several providers
+            max_connections: Connection pool size when no http_client is given
             **kwargs: Additional parameters to pass to OpenAI API
         """
         try:
@@ -51,10 +56,20 @@ class OpenAIProvider(LLMProvider):
         self.verbose = verbose
         self.additional_kwargs = kwargs
         
-        # Set up OpenAI client
-        self.client = openai.OpenAI(
+        # Set up async OpenAI client; all requests made through this provider
+        # reuse the same keep-alive connection pool
+        self._owns_http_client = http_client is None
+        self.http_client = http_client or httpx.AsyncClient(
+            limits=httpx.Limits(
+                max_connections=max_connections,
+                max_keepalive_connections=max_connections
+            ),
+            timeout=httpx.Timeout(600.0, connect=10.0)
+        )
+        self.client = openai.AsyncOpenAI(
             api_key=self.api_key,
-            base_url=self.api_base
+            base_url=self.api_base,
+            http_client=self.http_client
         )
         
         # Test connection if possible
@@ -101,24 +116,20 @@ class OpenAIProvider(LLMProvider):
                     log_input(f"Query: {content}", "LLM")
                     break
         
+        stream = None
         try:
-            # Run the completion in a thread pool since it's blocking
-            loop = asyncio.get_event_loop()
-            stream = await loop.run_in_executor(
-                None,
-                lambda: self.client.chat.completions.create(
-                    model=self.model,
-                    messages=messages,
-                    max_tokens=max_tokens,
-                    temperature=temperature,
-                    stream=True,
-                    **self.additional_kwargs
-                )
+            stream = await self.client.chat.completions.create(
+                model=self.model,
+                messages=messages,
+                max_tokens=max_tokens,
+                temperature=temperature,
+                stream=True,
+                **self.additional_kwargs
             )
             
             collected_chunks = []
             is_first = True
-            for chunk in stream:
+            async for chunk in stream:
                 if chunk and chunk.choices and len(chunk.choices) > 0:
                     content = chunk.choices[0].delta.content
                     if content:
@@ -139,6 +150,11 @@ class OpenAIProvider(LLMProvider):
                 log_error(f"Generation failed: {str(e)}", "LLM")
                 log_operation_end("GENERATING STREAMING RESPONSE", "LLM")
             raise LLMException(f"Error generating streaming response with OpenAI: {str(e)}")
+        finally:
+            # Release the upstream response when the consumer stops early,
+            # e.g. the generator is closed or the task is cancelled on client disconnect
+            if stream is not None:
+                await stream.close()
     
     async def generate(
         self,
@@ -167,4 +183,9 @@ class OpenAIProvider(LLMProvider):
             max_tokens=max_tokens
         ):
             chunks.append(chunk)
-        return "".join(chunks) 
\ No newline at end of file
+        return "".join(chunks)
+    
+    async def aclose(self):
+        """Close the underlying HTTP connection pool if this provider created it."""
+        if self._owns_http_client:
+            await self.http_client.aclose() 
\ No newline at end of file
@@ -0,0 +1,494 @@
+import hashlib
+import json
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+
+from rag_search.processing.embedder import Embedder
+from rag_search.processing.retriever import CosineRetriever, Retriever
+from rag_search.utils.logging import (
+    log_operation_start, log_operation_end, log_info,
+    log_data, log_success, log_chunks, log_warning
+)
+
+class IVFIndex:
+    """Inverted-file index over normalized vectors (cosine similarity) in NumPy.
+
+    Vectors are assigned to the nearest of nlist k-means centroids and a query only scans
+    the lists of its nprobe nearest centroids. Below train_size vectors the index is
+    searched exhaustively; the centroids are retrained whenever the number of vectors
+    doubled since the last training, so lists stay balanced as the corpus grows.
+    """
+
+    def __init__(self, nlist: Optional[int] = None, nprobe: int = 8, train_size: int = 2048, seed: int = 0):
+        """
+        Initialize the index.
+
+        Args:
+            nlist: Number of centroids, about sqrt(n) at training time if not given
+            nprobe: Number of lists scanned per query
+            train_size: Number of vectors from which on the index is clustered
+            seed: Seed of the k-means initialization
+        """
+        self.nlist = nlist
+        self.nprobe = nprobe
+        self.train_size = train_size
+        self.seed = seed
+        self.vectors: Optional[np.ndarray] = None
+        self.alive = np.zeros(0, dtype=bool)
+        self.assignments = np.zeros(0, dtype=np.int32)
+        self.centroids: Optional[np.ndarray] = None
+        self.size = 0
+        self._trained_at = 0
+
+    def __len__(self) -> int:
+        return int(self.alive[:self.size].sum())
+
+    @staticmethod
+    def _normalize(vectors: np.ndarray) -> np.ndarray:
+        norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+        norms[norms == 0] = 1.0
+        return vectors / norms
+
+    def _kmeans(self, data: np.ndarray, k: int, iterations: int = 10) -> np.ndarray:
+        rng = np.random.default_rng(self.seed)
+        centroids = data[rng.choice(len(data), size=k, replace=False)]
+        for _ in range(iterations):
+            labels = np.argmax(data @ centroids.T, axis=1)
+            for c in range(k):
+                members = data[labels == c]
+                if len(members):
+                    centroids[c] = members.mean(axis=0)
+                else:
+                    # Re-seed empty clusters with a random vector
+                    centroids[c] = data[rng.integers(len(data))]
+            centroids = self._normalize(centroids)
+        return centroids.astype(np.float32)
+
+    def train(self):
+        """Cluster the live vectors and reassign every vector to its nearest centroid."""
+        live = self.vectors[:self.size][self.alive[:self.size]]
+        if len(live) == 0:
+            return
+        k = min(self.nlist or max(int(np.sqrt(len(live))), 1), len(live))
+        self.centroids = self._kmeans(live.copy(), k)
+        self.assignments[:self.size] = np.argmax(self.vectors[:self.size] @ self.centroids.T, axis=1)
+        self._trained_at = len(live)
+
+    def add(self, vectors: np.ndarray) -> np.ndarray:
+        """
+        Insert vectors.
+
+        Args:
+            vectors: Array of shape (n, dim)
+
+        Returns:
+            Row ids of the inserted vectors
+        """
+        vectors = self._normalize(np.asarray(vectors, dtype=np.float32))
+        n = len(vectors)
+        if self.vectors is None:
+            self.vectors = np.zeros((max(n, 1024), vectors.shape[1]), dtype=np.float32)
+            self.alive = np.zeros(len(self.vectors), dtype=bool)
+            self.assignments = np.zeros(len(self.vectors), dtype=np.int32)
+        if self.size + n > len(self.vectors):
+            capacity = max(2 * len(self.vectors), self.size + n)
+            self.vectors = np.vstack([self.vectors, np.zeros((capacity - len(self.vectors), self.vectors.shape[1]), dtype=np.float32)])
+            self.alive = np.concatenate([self.alive, np.zeros(capacity - len(self.alive), dtype=bool)])
+            self.assignments = np.concatenate([self.assignments, np.zeros(capacity - len(self.assignments), dtype=np.int32)])
+
+        rows = np.arange(self.size, self.size + n)
+        self.vectors[rows] = vectors
+        self.alive[rows] = True
+        if self.centroids is not None:
+            self.assignments[rows] = np.argmax(vectors @ self.centroids.T, axis=1)
+        self.size += n
+
+        live = len(self)
+        if live >= self.train_size and live >= 2 * self._trained_at:
+            self.train()
+        return rows
+
+    def remove(self, rows: List[int]):
+        """Delete vectors by row id."""
+        self.alive[np.asarray(rows, dtype=np.int64)] = False
+
+    def search(
+        self,
+        query: np.ndarray,
+        k: int,
+        nprobe: Optional[int] = None,
+        rows: Optional[List[int]] = None
+    ) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Find the k most similar live vectors.
+
+        Args:
+            query: Query vector of shape (dim,)
+            k: Number of results
+            nprobe: Lists to scan, the index's nprobe if not given
+            rows: Only consider these row ids, scanned exhaustively
+
+        Returns:
+            Row ids and cosine similarities, most similar first
+        """
+        if self.vectors is None or self.size == 0:
+            return np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.float32)
+        query = self._normalize(np.asarray(query, dtype=np.float32).reshape(1, -1))[0]
+
+        if rows is not None:
+            rows = np.asarray(rows, dtype=np.int64)
+            rows = rows[self.alive[rows]]
+        else:
+            candidates = self.alive[:self.size].copy()
+            if self.centroids is not None:
+                probe = np.argsort(-(self.centroids @ query))[:nprobe or self.nprobe]
+                candidates &= np.isin(self.assignments[:self.size], probe)
+            rows = np.nonzero(candidates)[0]
+        if len(rows) == 0:
+            return rows, np.zeros(0, dtype=np.float32)
+
+        scores = self.vectors[rows] @ query
+        if len(rows) > k:
+            top = np.argpartition(-scores, k)[:k]
+            rows, scores = rows[top], scores[top]
+        order = np.argsort(-scores)
+        return rows[order], scores[order]
+
+    def compact(self) -> np.ndarray:
+        """Drop deleted vectors, returning the new row id of every old row (-1 if deleted)."""
+        keep = np.nonzero(self.alive[:self.size])[0]
+        mapping = np.full(self.size, -1, dtype=np.int64)
+        mapping[keep] = np.arange(len(keep))
+        self.vectors = self.vectors[keep].copy() if len(keep) else None
+        self.assignments = self.assignments[keep].copy()
+        self.alive = np.ones(len(keep), dtype=bool)
+        self.size = len(keep)
+        return mapping
+
+    def state(self) -> Dict[str, np.ndarray]:
+        """Arrays to persist the index with np.savez."""
+        state = {
+            "vectors": self.vectors[:self.size] if self.vectors is not None else np.zeros((0, 0), dtype=np.float32),
+            "alive": self.alive[:self.size],
+            "assignments": self.assignments[:self.size],
+            "trained_at": np.array(self._trained_at)
+        }
+        if self.centroids is not None:
+            state["centroids"] = self.centroids
+        return state
+
+    def load_state(self, state: Dict[str, np.ndarray]):
+        """Restore the index from arrays written by state()."""
+        self.size = len(state["alive"])
+        self.vectors = state["vectors"].astype(np.float32) if self.size else None
+        self.alive = state["alive"].astype(bool)
+        self.assignments = state["assignments"].astype(np.int32)
+        self.centroids = state["centroids"] if "centroids" in state else None
+        self._trained_at = int(state["trained_at"])
+
+class ANNRetriever(Retriever):
+    """Retriever over a rolling corpus of recently embedded chunks, using an IVF index.
+
+    Every retrieve() call adds the request's chunks to the corpus. By default only those
+    chunks are ranked, so one session never sees chunks scraped for another user's
+    query; with search_corpus the whole corpus is searched through the index, letting
+    later requests retrieve chunks scraped for earlier ones. The oldest pages are
+    evicted once the corpus exceeds max_chunks. The corpus is shared by concurrent
+    requests running in threads and guarded by a lock.
+    """
+
+    def __init__(
+        self,
+        embedder: Optional[Embedder] = None,
+        top_k: int = 5,
+        score_threshold: float = 0.0,
+        max_chunks: int = 200000,
+        nlist: Optional[int] = None,
+        nprobe: int = 8,
+        train_size: int = 2048,
+        index_path: Optional[str] = None,
+        search_corpus: bool = False,
+        verbose: bool = False
+    ):
+        """
+        Initialize the ANN retriever.
+
+        Args:
+            embedder: Embedder to use for query embedding
+            top_k: Number of top results to return
+            score_threshold: Minimum similarity score to include a result
+            max_chunks: Corpus size above which the chunks of the oldest pages are evicted
+            nlist: Number of IVF lists, about sqrt(corpus size) if not given
+            nprobe: Number of IVF lists scanned per query (higher is slower but more exact)
+            train_size: Corpus size from which on the index is clustered instead of exhaustive
+            index_path: Directory the corpus is loaded from (if present) and saved to by save()
+            search_corpus: Retrieve from the whole corpus instead of only the chunks passed
+                to retrieve(), including chunks scraped for other sessions
+            verbose: Whether to enable verbose logging
+        """
+        self.embedder = embedder
+        self.top_k = top_k
+        self.score_threshold = score_threshold
+        self.max_chunks = max_chunks
+        self.index_path = index_path
+        self.search_corpus = search_corpus
+        self.verbose = verbose
+        # Requests add, evict and search from several threads
+        self._lock = threading.RLock()
+
+        self.index = IVFIndex(nlist=nlist, nprobe=nprobe, train_size=train_size)
+        # Row id -> chunk without its embedding, and per URL its row ids (oldest URL first)
+        self.chunks: Dict[int, Dict[str, Any]] = {}
+        self.rows_by_url: "OrderedDict[str, List[int]]" = OrderedDict()
+        self.row_by_key: Dict[str, int] = {}
+
+        if index_path and os.path.exists(os.path.join(index_path, "index.npz")):
+            self.load(index_path)
+
+        if self.verbose:
+            log_info("ANNRetriever initialized", "Retriever")
+            log_data("Top-K", top_k, "Retriever")
+            log_data("Corpus size", len(self.index), "Retriever")
+
+    @staticmethod
+    def _chunk_key(chunk: Dict[str, Any]) -> str:
+        text = f"{chunk.get('url', '')}\n{chunk.get('content', '')}"
+        return hashlib.blake2b(text.encode("utf-8", "replace"), digest_size=16).hexdigest()
+
+    def add_chunks(self, embedded_chunks: List[Dict[str, Any]]) -> int:
+        """
+        Insert chunks not yet in the corpus.
+
+        Args:
+            embedded_chunks: Content chunks with 'embedding' fields
+
+        Returns:
+            Number of chunks inserted
+        """
+        with self._lock:
+            return self._add_chunks(embedded_chunks)
+
+    def _add_chunks(self, embedded_chunks: List[Dict[str, Any]]) -> int:
+        new_chunks = []
+        keys = set()
+        for chunk in embedded_chunks:
+            if 'embedding' not in chunk:
+                continue
+            key = self._chunk_key(chunk)
+            if key in self.row_by_key or key in keys:
+                continue
+            keys.add(key)
+            new_chunks.append((key, chunk))
+        if not new_chunks:
+            return 0
+
+        rows = self.index.add(np.array([chunk['embedding'] for _, chunk in new_chunks], dtype=np.float32))
+        for row, (key, chunk) in zip(rows.tolist(), new_chunks):
+            stored = {k: v for k, v in chunk.items() if k != 'embedding'}
+            self.chunks[row] = stored
+            self.row_by_key[key] = row
+            url = chunk.get('url', '')
+            self.rows_by_url.setdefault(url, []).append(row)
+            self.rows_by_url.move_to_end(url)
+
+        while len(self.chunks) > self.max_chunks and len(self.rows_by_url) > 1:
+            self._delete_url(next(iter(self.rows_by_url)))
+        return len(new_chunks)
+
+    def delete_url(self, url: str) -> int:
+        """
+        Remove all chunks of a page, e.g. when it was re-scraped or is outdated.
+
+        Args:
+            url: URL whose chunks are removed
+
+        Returns:
+            Number of chunks removed
+        """
+        with self._lock:
+            return self._delete_url(url)
+
+    def _delete_url(self, url: str) -> int:
+        rows = self.rows_by_url.pop(url, [])
+        if not rows:
+            return 0
+        self.index.remove(rows)
+        for row in rows:
+            chunk = self.chunks.pop(row)
+            self.row_by_key.pop(self._chunk_key(chunk), None)
+
+        # Reclaim the space of deleted vectors once they make up half the index
+        if self.index.size > 2 * max(len(self.chunks), 1):
+            self._compact()
+        return len(rows)
+
+    def compact(self):
+        """Drop deleted vectors from the index and renumber the rows of the corpus."""
+        with self._lock:
+            self._compact()
+
+    def _compact(self):
+        mapping = self.index.compact()
+        self.chunks = {int(mapping[row]): chunk for row, chunk in self.chunks.items()}
+        self.rows_by_url = OrderedDict((url, [int(mapping[row]) for row in rows]) for url, rows in self.rows_by_url.items())
+        self.row_by_key = {key: int(mapping[row]) for key, row in self.row_by_key.items()}
+
+    def retrieve(
+        self,
+        embedded_chunks: List[Dict[str, Any]],
+        query: str,
+        top_k: Optional[int] = None
+    ) -> List[Dict[str, Any]]:
+        """
+        Add the chunks to the corpus and retrieve the most similar of them.
+
+        Args:
+            embedded_chunks: List of content chunks with embeddings
+            query: Query to retrieve against
+            top_k: Number of results, overriding the retriever's top_k
+
+        Returns:
+            Retrieved list of content chunks with highest similarity first, taken
+            from the whole corpus if search_corpus is set
+        """
+        if self.verbose:
+            log_operation_start("ANN RETRIEVING", "Retriever")
+            log_data("Chunks to add", len(embedded_chunks), "Retriever")
+            log_data("Query", query, "Retriever")
+
+        added = self.add_chunks(embedded_chunks)
+        if len(self.chunks) == 0:
+            if self.verbose:
+                log_warning("No chunks to retrieve from", "Retriever")
+                log_operation_end("ANN RETRIEVING", "Retriever")
+            return []
+
+        # Embedded outside the lock, it is an API round-trip
+        query_embedding = np.array(self._get_query_embedding(query), dtype=np.float32)
+        with self._lock:
+            scope = None
+            if not self.search_corpus:
+                keys = {self._chunk_key(chunk) for chunk in embedded_chunks}
+                scope = [self.row_by_key[key] for key in keys if key in self.row_by_key]
+            rows, scores = self.index.search(query_embedding, top_k or self.top_k, rows=scope)
+
+            result = []
+            for row, score in zip(rows.tolist(), scores.tolist()):
+                if score >= self.score_threshold:
+                    chunk_with_score = dict(self.chunks[row])
+                    chunk_with_score['similarity'] = float(score)
+                    result.append(chunk_with_score)
+
+        if self.verbose:
+            log_data("Chunks added", added, "Retriever")
+            log_data("Corpus size", len(self.chunks), "Retriever")
+            log_success(f"Returning top {len(result)} chunks", "Retriever")
+            log_chunks(result, "Retriever")
+            log_operation_end("ANN RETRIEVING", "Retriever")
+
+        return result
+
+    def _get_query_embedding(self, query: str) -> List[float]:
+        """Generate embedding for query string."""
+        if self.embedder is None:
+            raise ValueError("Embedder is required for generating query embedding")
+        return self.embedder.embed_text(query)
+
+    def save(self, path: Optional[str] = None):
+        """
+        Persist the corpus and index.
+
+        Args:
+            path: Directory to write to, the retriever's index_path if not given
+        """
+        path = path or self.index_path
+        if not path:
+            raise ValueError("No index path configured")
+        os.makedirs(path, exist_ok=True)
+        with self._lock:
+            np.savez(os.path.join(path, "index.npz"), **self.index.state())
+            with open(os.path.join(path, "chunks.json"), "w", encoding="utf-8") as f:
+                json.dump({
+                    "chunks": {str(row): chunk for row, chunk in self.chunks.items()},
+                    "urls": list(self.rows_by_url.keys())
+                }, f, ensure_ascii=False)
+
+    def load(self, path: str):
+        """
+        Load a corpus and index written by save().
+
+        Args:
+            path: Directory to read from
+        """
+        with np.load(os.path.join(path, "index.npz")) as state:
+            index_state = {key: state[key] for key in state.files}
+        with open(os.path.join(path, "chunks.json"), "r", encoding="utf-8") as f:
+            data = json.load(f)
+        chunks = {int(row): chunk for row, chunk in data["chunks"].items()}
+        # Rebuild the URL lists in the saved order (oldest first)
+        rows_by_url: Dict[str, List[int]] = {}
+        for row, chunk in sorted(chunks.items()):
+            rows_by_url.setdefault(chunk.get('url', ''), []).append(row)
+        with self._lock:
+            self.index.load_state(index_state)
+            self.chunks = chunks
+            self.rows_by_url = OrderedDict((url, rows_by_url[url]) for url in data["urls"] if url in rows_by_url)
+            self.row_by_key = {self._chunk_key(chunk): row for row, chunk in self.chunks.items()}
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Recall and latency of the IVF index against exact search")
+    parser.add_argument("--n", type=int, default=50000, help="Number of vectors in the corpus")
+    parser.add_argument("--dim", type=int, default=256, help="Vector dimension")
+    parser.add_argument("--queries", type=int, default=200, help="Number of queries")
+    parser.add_argument("--k", type=int, default=50, help="Results per query (the retriever's top_k)")
+    parser.add_argument("--nprobe", type=int, nargs="+", default=[1, 2, 4, 8, 16, 32], help="nprobe values to measure")
+    args = parser.parse_args()
+
+    # Clustered data, like chunks of many pages on a few topics
+    rng = np.random.default_rng(0)
+    topics = rng.normal(size=(1000, args.dim)).astype(np.float32)
+    data = topics[rng.integers(len(topics), size=args.n)] + 0.7 * rng.normal(size=(args.n, args.dim)).astype(np.float32)
+    queries = topics[rng.integers(len(topics), size=args.queries)] + 0.7 * rng.normal(size=(args.queries, args.dim)).astype(np.float32)
+
+    index = IVFIndex()
+    start = time.perf_counter()
+    for batch in np.array_split(data, 50):
+        index.add(batch)
+    print(f"Inserted {args.n} vectors incrementally in {time.perf_counter() - start:.2f} s ({index.centroids.shape[0] if index.centroids is not None else 0} lists)")
+
+    normalized = IVFIndex._normalize(data)
+    start = time.perf_counter()
+    exact = [set(np.argsort(-(normalized @ IVFIndex._normalize(q.reshape(1, -1))[0]))[:args.k].tolist()) for q in queries]
+    exact_ms = (time.perf_counter() - start) / args.queries * 1000
+    print(f"exact (NumPy brute force): recall 1.000, {exact_ms:.2f} ms/query")
+
+    # The exact retriever loops over every chunk in Python, so it is timed on a few queries
+    class QueryEmbedder:
+        query = None
+
+        def embed_text(self, text):
+            return self.query
+
+    embedder = QueryEmbedder()
+    chunks = [{"content": str(i), "url": str(i), "embedding": vector} for i, vector in enumerate(data)]
+    exact_retriever = CosineRetriever(embedder=embedder, top_k=args.k)
+    sample = queries[:10]
+    start = time.perf_counter()
+    for q in sample:
+        embedder.query = q
+        exact_retriever.retrieve(chunks, "")
+    print(f"exact (CosineRetriever): recall 1.000, {(time.perf_counter() - start) / len(sample) * 1000:.2f} ms/query")
+
+    for nprobe in args.nprobe:
+        start = time.perf_counter()
+        found = [index.search(q, args.k, nprobe=nprobe)[0] for q in queries]
+        elapsed_ms = (time.perf_counter() - start) / args.queries * 1000
+        recall = np.mean([len(exact_set & set(rows.tolist())) / args.k for exact_set, rows in zip(exact, found)])
+        print(f"ivf nprobe={nprobe:<3}: recall@{args.k} {recall:.3f}, {elapsed_ms:.2f} ms/query")
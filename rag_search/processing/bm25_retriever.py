@@ -0,0 +1,292 @@
+import hashlib
+import math
+import re
+from collections import Counter, OrderedDict
+from typing import Any, Dict, List, Optional
+
+from rag_search.processing.retriever import Retriever
+from rag_search.utils.logging import (
+    log_operation_start, log_operation_end, log_info,
+    log_data, log_success, log_chunks, log_warning
+)
+
+_TOKEN_RE = re.compile(r"\w+", re.UNICODE)
+
+def tokenize(text: str) -> List[str]:
+    """Lowercased word tokens; numbers, names and codes are kept as they are."""
+    return _TOKEN_RE.findall(text.lower())
+
+class BM25Retriever(Retriever):
+    """Sparse retriever scoring chunks with Okapi BM25 over an incremental inverted index.
+
+    Chunks are indexed the first time they are seen, so term statistics grow with the
+    pages scraped for all requests, while retrieve() only ranks the chunks it is given.
+    Works without embeddings, so the pipeline can skip the embedding stage for it.
+    """
+
+    requires_embeddings = False
+
+    def __init__(
+        self,
+        top_k: int = 5,
+        k1: float = 1.5,
+        b: float = 0.75,
+        max_chunks: int = 200000,
+        verbose: bool = False
+    ):
+        """
+        Initialize the BM25 retriever.
+
+        Args:
+            top_k: Number of top results to return
+            k1: Term frequency saturation
+            b: Document length normalization
+            max_chunks: Indexed chunks above which the chunks of the oldest pages are dropped
+            verbose: Whether to enable verbose logging
+        """
+        self.top_k = top_k
+        self.k1 = k1
+        self.b = b
+        self.max_chunks = max_chunks
+        self.verbose = verbose
+
+        # term -> {doc id: term frequency}
+        self.postings: Dict[str, Dict[str, int]] = {}
+        self.doc_lengths: Dict[str, int] = {}
+        self.total_length = 0
+        # URL -> doc ids, oldest URL first
+        self.docs_by_url: "OrderedDict[str, List[str]]" = OrderedDict()
+        self._doc_terms: Dict[str, Counter] = {}
+
+        if self.verbose:
+            log_info("BM25Retriever initialized", "Retriever")
+            log_data("Top-K", top_k, "Retriever")
+
+    @staticmethod
+    def doc_id(chunk: Dict[str, Any]) -> str:
+        """Identifier of a chunk in the index, a hash of its URL and content."""
+        text = f"{chunk.get('url', '')}\n{chunk.get('content', '')}"
+        return hashlib.blake2b(text.encode("utf-8", "replace"), digest_size=16).hexdigest()
+
+    def __len__(self) -> int:
+        return len(self.doc_lengths)
+
+    def add_chunks(self, chunks: List[Dict[str, Any]]) -> int:
+        """
+        Index chunks not indexed yet.
+
+        Args:
+            chunks: Content chunks, embeddings are not needed
+
+        Returns:
+            Number of chunks indexed
+        """
+        added = 0
+        for chunk in chunks:
+            doc_id = self.doc_id(chunk)
+            if doc_id in self.doc_lengths:
+                continue
+            terms = Counter(tokenize(chunk.get('content', '')))
+            for term, frequency in terms.items():
+                self.postings.setdefault(term, {})[doc_id] = frequency
+            length = sum(terms.values())
+            self.doc_lengths[doc_id] = length
+            self.total_length += length
+            self._doc_terms[doc_id] = terms
+            url = chunk.get('url', '')
+            self.docs_by_url.setdefault(url, []).append(doc_id)
+            self.docs_by_url.move_to_end(url)
+            added += 1
+
+        while len(self.doc_lengths) > self.max_chunks and len(self.docs_by_url) > 1:
+            self.delete_url(next(iter(self.docs_by_url)))
+        return added
+
+    def delete_url(self, url: str) -> int:
+        """
+        Remove the chunks of a page from the index.
+
+        Args:
+            url: URL whose chunks are removed
+
+        Returns:
+            Number of chunks removed
+        """
+        doc_ids = self.docs_by_url.pop(url, [])
+        for doc_id in doc_ids:
+            for term in self._doc_terms.pop(doc_id, ()):
+                postings = self.postings.get(term)
+                if postings is not None:
+                    postings.pop(doc_id, None)
+                    if not postings:
+                        del self.postings[term]
+            self.total_length -= self.doc_lengths.pop(doc_id, 0)
+        return len(doc_ids)
+
+    def score(self, query: str, doc_ids: Optional[set] = None) -> Dict[str, float]:
+        """
+        BM25 scores of the documents matching any query term.
+
+        Args:
+            query: Query text
+            doc_ids: Restrict scoring to these documents (all indexed documents if None)
+
+        Returns:
+            Score per matching document id
+        """
+        n = len(self.doc_lengths)
+        if n == 0:
+            return {}
+        average_length = self.total_length / n
+        scores: Dict[str, float] = {}
+        for term in set(tokenize(query)):
+            postings = self.postings.get(term)
+            if not postings:
+                continue
+            idf = math.log(1 + (n - len(postings) + 0.5) / (len(postings) + 0.5))
+            for doc_id, frequency in postings.items():
+                if doc_ids is not None and doc_id not in doc_ids:
+                    continue
+                norm = self.k1 * (1 - self.b + self.b * self.doc_lengths[doc_id] / average_length)
+                scores[doc_id] = scores.get(doc_id, 0.0) + idf * frequency * (self.k1 + 1) / (frequency + norm)
+        return scores
+
+    def retrieve(
+        self,
+        embedded_chunks: List[Dict[str, Any]],
+        query: str,
+        top_k: Optional[int] = None
+    ) -> List[Dict[str, Any]]:
+        """
+        Retrieve the chunks with the highest BM25 score for the query.
+
+        Args:
+            embedded_chunks: List of content chunks (embeddings are not needed)
+            query: Query to retrieve against
+            top_k: Number of results, overriding the retriever's top_k
+
+        Returns:
+            Retrieved list of content chunks with highest score first
+        """
+        if self.verbose:
+            log_operation_start("BM25 RETRIEVING", "Retriever")
+            log_data("Chunks to retrieve from", len(embedded_chunks), "Retriever")
+            log_data("Query", query, "Retriever")
+
+        if not embedded_chunks:
+            if self.verbose:
+                log_warning("No chunks to retrieve from", "Retriever")
+                log_operation_end("BM25 RETRIEVING", "Retriever")
+            return []
+
+        self.add_chunks(embedded_chunks)
+        chunks_by_id = {self.doc_id(chunk): chunk for chunk in embedded_chunks}
+        scores = self.score(query, set(chunks_by_id))
+
+        ranked = sorted(scores.items(), key=lambda item: item[1], reverse=True)[:top_k or self.top_k]
+        result = []
+        for doc_id, score in ranked:
+            chunk_with_score = dict(chunks_by_id[doc_id])
+            chunk_with_score['similarity'] = score
+            chunk_with_score['bm25_score'] = score
+            result.append(chunk_with_score)
+
+        if self.verbose:
+            log_success(f"Returning top {len(result)} chunks", "Retriever")
+            log_chunks(result, "Retriever")
+            log_operation_end("BM25 RETRIEVING", "Retriever")
+
+        return result
+
+class HybridRetriever(Retriever):
+    """Fuses a dense and the BM25 ranking with reciprocal rank fusion.
+
+    Exact terms (names, numbers, codes) are found by BM25 even when the embeddings miss
+    them. If the dense ranking is degenerate (all similarities zero, as when the embedding
+    endpoint failed and returned zero vectors) the BM25 ranking is used alone.
+    """
+
+    def __init__(
+        self,
+        dense: Retriever,
+        sparse: Optional[BM25Retriever] = None,
+        top_k: int = 5,
+        candidate_k: int = 100,
+        rrf_k: int = 60,
+        dense_weight: float = 1.0,
+        sparse_weight: float = 1.0,
+        verbose: bool = False
+    ):
+        """
+        Initialize the hybrid retriever.
+
+        Args:
+            dense: Embedding-based retriever (CosineRetriever or ANNRetriever)
+            sparse: BM25 retriever, a default one is created if not given; it keeps its
+                own top_k for requests that retrieve with BM25 only
+            top_k: Number of fused results to return
+            candidate_k: Results taken from each retriever before fusion
+            rrf_k: Rank offset of reciprocal rank fusion, larger values flatten the ranks
+            dense_weight: Weight of the dense ranking
+            sparse_weight: Weight of the BM25 ranking
+            verbose: Whether to enable verbose logging
+        """
+        self.dense = dense
+        self.sparse = sparse or BM25Retriever()
+        self.top_k = top_k
+        self.candidate_k = candidate_k
+        self.rrf_k = rrf_k
+        self.dense_weight = dense_weight
+        self.sparse_weight = sparse_weight
+        self.verbose = verbose
+
+    def retrieve(
+        self,
+        embedded_chunks: List[Dict[str, Any]],
+        query: str,
+        top_k: Optional[int] = None
+    ) -> List[Dict[str, Any]]:
+        """
+        Retrieve with both retrievers and fuse their rankings.
+
+        Args:
+            embedded_chunks: List of content chunks with embeddings
+            query: Query to retrieve against
+            top_k: Number of fused results, overriding the retriever's top_k
+
+        Returns:
+            Retrieved list of content chunks, best fused rank first, with the
+            fused score as 'similarity' and the dense score as 'dense_score'
+        """
+        sparse_results = self.sparse.retrieve(embedded_chunks, query, top_k=self.candidate_k)
+        dense_results = self.dense.retrieve(embedded_chunks, query, top_k=self.candidate_k)
+        if dense_results and dense_results[0].get('similarity', 0.0) <= 0.0:
+            if self.verbose:
+                log_warning("Dense similarities are all zero, using BM25 only", "Retriever")
+            dense_results = []
+
+        fused: Dict[str, float] = {}
+        chunks: Dict[str, Dict[str, Any]] = {}
+        for results, weight in ((dense_results, self.dense_weight), (sparse_results, self.sparse_weight)):
+            for rank, chunk in enumerate(results):
+                doc_id = BM25Retriever.doc_id(chunk)
+                fused[doc_id] = fused.get(doc_id, 0.0) + weight / (self.rrf_k + rank + 1)
+                merged = chunks.setdefault(doc_id, dict(chunk))
+                if results is dense_results:
+                    merged['dense_score'] = chunk.get('similarity')
+                else:
+                    merged['bm25_score'] = chunk.get('bm25_score')
+
+        ranked = sorted(fused.items(), key=lambda item: item[1], reverse=True)[:top_k or self.top_k]
+        result = []
+        for doc_id, score in ranked:
+            chunk = chunks[doc_id]
+            chunk['similarity'] = score
+            result.append(chunk)
+
+        if self.verbose:
+            log_info(
+                "fused %d dense and %d BM25 results into %d", "Retriever",
+                len(dense_results), len(sparse_results), len(result)
+            )
+        return result
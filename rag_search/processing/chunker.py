@@ -1,6 +1,20 @@
-from typing import List, Optional, Dict, Any
+import math
+import re
+from typing import List, Optional, Dict, Any, Tuple
 from langchain_text_splitters import RecursiveCharacterTextSplitter
 
+from rag_search.utils.logging import log_debug
+from rag_search.utils.tokens import TokenCounter, get_token_counter
+
+# Split points from coarse to fine: markdown structure (the patterns of MarkdownChunking
+# in crawl4ai_scraper), lines, sentences and words
+_SPLIT_LEVELS = [
+    re.compile(r"(?=^#{1,6} .*$)|(?=^---$)|\n\n", re.MULTILINE),
+    re.compile(r"\n"),
+    re.compile(r"(?<=[.!?])\s+"),
+    re.compile(r"\s+"),
+]
+
 
 class Chunker:
     """A modular text chunking class that splits text into smaller, overlapping segments.
@@ -57,6 +71,27 @@ class Chunker:
         """
         return self.splitter.split_text(text)
     
+    def split_spans(self, text: str) -> List[Tuple[int, int, Optional[int]]]:
+        """Split a single text into chunks given as offsets into it.
+        
+        Args:
+            text (str): The input text to be split into chunks.
+            
+        Returns:
+            List[Tuple[int, int, Optional[int]]]: (start, end, token count) of every
+                chunk, the token count is None as this chunker measures characters.
+        """
+        spans = []
+        position = 0
+        for chunk in self.split_text(text):
+            # Chunks are in order and may overlap the previous one
+            start = text.find(chunk, max(position - self.chunk_overlap, 0))
+            if start < 0:
+                start = text.find(chunk)
+            spans.append((start, start + len(chunk), None))
+            position = start + len(chunk)
+        return spans
+    
     def split_texts(self, texts: List[str]) -> List[List[str]]:
         """Split multiple texts into chunks.
         
@@ -107,5 +142,133 @@ class Chunker:
                 chunks.append(chunk_obj)
         
         return chunks
+
+
+class MarkdownChunker(Chunker):
+    """Chunker splitting on markdown structure with sizes measured in tokens.
+    
+    Text is split at headings, horizontal rules and paragraph breaks first, sections
+    still above chunk_size at line, sentence and word boundaries. Adjacent pieces are
+    then merged up to chunk_size tokens of the embedding model, repeating up to
+    chunk_overlap tokens of trailing pieces at the start of the next chunk.
+    
+    Attributes:
+        chunk_size (int): Maximum tokens per chunk.
+        chunk_overlap (int): Maximum tokens repeated from the previous chunk.
+        token_counter (TokenCounter): Counter of the embedding model's tokenizer.
+    """
+    
+    def __init__(
+        self,
+        chunk_size: int = 256,
+        chunk_overlap: int = 32,
+        model: str = "text-embedding-3-small",
+        token_counter: Optional[TokenCounter] = None,
+        verbose: bool = False
+    ):
+        """Initialize the MarkdownChunker.
+        
+        Args:
+            chunk_size (int, optional): Maximum tokens per chunk. Defaults to 256.
+            chunk_overlap (int, optional): Maximum overlapping tokens. Defaults to 32.
+            model (str, optional): Embedding model whose tokenizer measures sizes.
+            token_counter (TokenCounter, optional): Counter to use instead of the model's.
+        """
+        self.chunk_size = chunk_size
+        self.chunk_overlap = chunk_overlap
+        self.token_counter = token_counter or get_token_counter(model)
+        self.verbose = verbose
+    
+    def __getstate__(self) -> Dict[str, Any]:
+        # Sent to process pool workers by model name, each worker loads the tokenizer once
+        state = self.__dict__.copy()
+        state['token_counter'] = self.token_counter.model
+        return state
+    
+    def __setstate__(self, state: Dict[str, Any]):
+        self.__dict__.update(state)
+        self.token_counter = get_token_counter(state['token_counter'])
+    
+    def _pieces(self, text: str, start: int, end: int, level: int) -> List[Tuple[int, int, int]]:
+        """Split text[start:end] at the given level into (start, end, tokens) pieces within chunk_size."""
+        if level == len(_SPLIT_LEVELS):
+            # A single word above chunk_size, cut it into equal parts
+            count = self.token_counter.count(text[start:end])
+            parts = math.ceil(count / self.chunk_size)
+            step = math.ceil((end - start) / parts)
+            return [
+                (cut, min(cut + step, end), self.token_counter.count(text[cut:min(cut + step, end)]))
+                for cut in range(start, end, step)
+            ]
         
+        cuts = [start]
+        for match in _SPLIT_LEVELS[level].finditer(text, start, end):
+            if cuts[-1] < match.end() < end:
+                cuts.append(match.end())
+        cuts.append(end)
         
+        pieces = []
+        for piece_start, piece_end in zip(cuts, cuts[1:]):
+            count = self.token_counter.count(text[piece_start:piece_end])
+            if count <= self.chunk_size:
+                pieces.append((piece_start, piece_end, count))
+            else:
+                pieces.extend(self._pieces(text, piece_start, piece_end, level + 1))
+        return pieces
+    
+    def split_spans(self, text: str) -> List[Tuple[int, int, Optional[int]]]:
+        """Split a single text into chunks given as offsets into it.
+        
+        Args:
+            text (str): The input text to be split into chunks.
+            
+        Returns:
+            List[Tuple[int, int, Optional[int]]]: (start, end, token count) of every
+                chunk, without surrounding whitespace. The token count is the sum over
+                the chunk's pieces, within a few tokens of the count of the whole chunk.
+        """
+        if not text or not text.strip():
+            return []
+        pieces = self._pieces(text, 0, len(text), 0)
+        
+        spans = []
+        first = 0
+        while first < len(pieces):
+            last = first
+            tokens = 0
+            while last < len(pieces) and (last == first or tokens + pieces[last][2] <= self.chunk_size):
+                tokens += pieces[last][2]
+                last += 1
+            
+            start, end = pieces[first][0], pieces[last - 1][1]
+            while start < end and text[start].isspace():
+                start += 1
+            while end > start and text[end - 1].isspace():
+                end -= 1
+            if start < end:
+                spans.append((start, end, tokens))
+            if last == len(pieces):
+                break
+            
+            # Start the next chunk with trailing pieces of this one, within chunk_overlap
+            overlap = 0
+            next_first = last
+            while next_first - 1 > first and overlap + pieces[next_first - 1][2] <= self.chunk_overlap:
+                next_first -= 1
+                overlap += pieces[next_first][2]
+            first = next_first
+        
+        if self.verbose:
+            log_debug("Split %d characters into %d chunks", "Chunker", len(text), len(spans))
+        return spans
+    
+    def split_text(self, text: str) -> List[str]:
+        """Split a single text into chunks.
+        
+        Args:
+            text (str): The input text to be split into chunks.
+            
+        Returns:
+            List[str]: A list of text chunks.
+        """
+        return [text[start:end] for start, end, _ in self.split_spans(text)]
@@ -0,0 +1,134 @@
+import re
+import zlib
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+
+from rag_search.utils.logging import log_info
+
+_WORD_RE = re.compile(r"\w+")
+# Hash functions are (a * x + b) mod p on 32-bit shingle hashes, which stays within uint64
+_PRIME = (1 << 31) - 1
+
+class NearDuplicateFilter:
+    """Collapses near-duplicate chunks with MinHash signatures and an LSH band index.
+
+    Mirrored pages, syndicated articles and the same page extracted by several strategies
+    yield chunks that are almost identical. Only the first chunk of every group is kept;
+    it lists the URLs of all its duplicates in 'source_urls' so they can still be cited.
+    """
+
+    def __init__(
+        self,
+        threshold: float = 0.85,
+        num_perm: int = 64,
+        shingle_size: int = 5,
+        seed: int = 1,
+        verbose: bool = False
+    ):
+        """
+        Initialize the filter.
+
+        Args:
+            threshold: Estimated Jaccard similarity of word shingles above which two
+                chunks are duplicates
+            num_perm: Number of MinHash permutations (signature length)
+            shingle_size: Number of words per shingle
+            seed: Seed of the hash permutations
+            verbose: Whether to enable verbose logging
+        """
+        self.threshold = threshold
+        self.num_perm = num_perm
+        self.shingle_size = shingle_size
+        self.verbose = verbose
+        self.bands, self.rows = self._lsh_params(threshold, num_perm)
+
+        rng = np.random.RandomState(seed)
+        self._a = rng.randint(1, _PRIME, num_perm).astype(np.uint64)
+        self._b = rng.randint(0, _PRIME, num_perm).astype(np.uint64)
+
+    @staticmethod
+    def _lsh_params(threshold: float, num_perm: int) -> Tuple[int, int]:
+        """Bands and rows per band whose candidate threshold (1/b)^(1/r) is closest to threshold."""
+        best = (num_perm, 1)
+        best_error = float("inf")
+        for rows in range(1, num_perm + 1):
+            bands = num_perm // rows
+            error = abs((1 / bands) ** (1 / rows) - threshold)
+            if error < best_error:
+                best, best_error = (bands, rows), error
+        return best
+
+    def signature(self, text: str) -> Optional[np.ndarray]:
+        """
+        MinHash signature of a text's word shingles.
+
+        Args:
+            text: Text to sign
+
+        Returns:
+            Array of num_perm minimum hashes, None for a text without words
+        """
+        words = _WORD_RE.findall(text.lower())
+        if not words:
+            return None
+        size = self.shingle_size
+        shingles = {" ".join(words[i:i + size]) for i in range(max(len(words) - size + 1, 1))}
+        hashes = np.fromiter(
+            (zlib.crc32(shingle.encode("utf-8")) for shingle in shingles),
+            dtype=np.uint64, count=len(shingles)
+        )
+        return ((np.outer(hashes, self._a) + self._b) % _PRIME).min(axis=0)
+
+    def deduplicate(self, chunks: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """
+        Drop chunks that nearly duplicate an earlier chunk.
+
+        Args:
+            chunks: Chunks with 'content' and 'url'
+
+        Returns:
+            The first chunk of every group of near-duplicates, in input order, with the
+            URLs of the whole group in 'source_urls' and the number of dropped
+            chunks in 'duplicates'
+        """
+        kept: List[Dict[str, Any]] = []
+        signatures: List[Optional[np.ndarray]] = []
+        # (band, band hash values) -> positions in kept
+        buckets: Dict[Tuple[int, bytes], List[int]] = {}
+
+        for chunk in chunks:
+            signature = self.signature(chunk.get('content', ''))
+            if signature is None:
+                kept.append(dict(chunk, source_urls=[chunk.get('url')], duplicates=0))
+                signatures.append(None)
+                continue
+
+            keys = [
+                (band, signature[band * self.rows:(band + 1) * self.rows].tobytes())
+                for band in range(self.bands)
+            ]
+            match = None
+            for key in keys:
+                for position in buckets.get(key, ()):
+                    if np.mean(signatures[position] == signature) >= self.threshold:
+                        match = position
+                        break
+                if match is not None:
+                    break
+
+            if match is None:
+                position = len(kept)
+                kept.append(dict(chunk, source_urls=[chunk.get('url')], duplicates=0))
+                signatures.append(signature)
+                for key in keys:
+                    buckets.setdefault(key, []).append(position)
+            else:
+                representative = kept[match]
+                representative['duplicates'] += 1
+                if chunk.get('url') not in representative['source_urls']:
+                    representative['source_urls'].append(chunk.get('url'))
+
+        if self.verbose:
+            log_info("kept %d of %d chunks after near-duplicate removal", "Dedup", len(kept), len(chunks))
+        return kept
@@ -2,14 +2,14 @@ from typing import List, Dict, Any, Optional, Union
 import numpy as np
 from abc import ABC, abstractmethod
 import openai
-import tiktoken
-from transformers import AutoTokenizer
 
 from rag_search.utils.logging import (
     log_operation_start, log_operation_end, log_info, 
     log_data, log_error, log_success, log_embedding_operation,
     log_warning
 )
+from rag_search.utils.tokens import get_token_counter
+from rag_search.utils.tracing import span
 
 class Embedder(ABC):
     """Base class for text embedding models."""
@@ -366,13 +366,11 @@ class OpenAIEmbedder(Embedder):
         self.batch_size = batch_size
         self.embedding_dim = 3584  # BGE model dimension
         
-        # Initialize tokenizer based on model
+        # Shared token counter of the embedding model (tiktoken for OpenAI models)
+        self.token_counter = get_token_counter(model_name)
         if  "text-embedding" in model_name:
             log_info("Using tiktoken for OpenAI models", "OpenAIEmbedder")
-            self.tokenizer = tiktoken.get_encoding("cl100k_base")
             self.embedding_dim = 1536  # text-embedding-3-small dimension
-        else:
-            self.tokenizer = AutoTokenizer.from_pretrained(model_name)
         
         if self.verbose:
             log_operation_start("INITIALIZE EMBEDDER", "OpenAIEmbedder")
@@ -381,8 +379,8 @@ class OpenAIEmbedder(Embedder):
             log_success("OpenAI embedder initialized successfully", "OpenAIEmbedder")
             log_operation_end("INITIALIZE EMBEDDER", "OpenAIEmbedder")
     
-    def _truncate_text(self, text: str) -> str:
-        """Truncate text to max token length."""
+    def _truncate_text(self, text: str, token_count: Optional[int] = None) -> str:
+        """Truncate text to max token length, token_count is its known size in this model's tokens."""
         if not text or not isinstance(text, str):
             if self.verbose:
                 log_warning("Empty or non-string text provided", "OpenAIEmbedder")
@@ -395,22 +393,12 @@ class OpenAIEmbedder(Embedder):
                 log_warning("Text is empty after cleaning", "OpenAIEmbedder")
             return ""
         
+        if token_count is not None and token_count <= self.max_tokens:
+            return text
+        
         try:
-            if self.model_name == "text-embedding-3-small":
-                # Use tiktoken for OpenAI models
-                tokens = self.tokenizer.encode(text)
-                if len(tokens) > self.max_tokens:
-                    tokens = tokens[:self.max_tokens]
-                return self.tokenizer.decode(tokens)
-            else:
-                # Use AutoTokenizer for other models
-                encoded = self.tokenizer(
-                    text,
-                    truncation=True,
-                    max_length=self.max_tokens,
-                    return_tensors='pt'
-                )
-                return self.tokenizer.decode(encoded['input_ids'][0])
+            # Counts are cached, texts already within the limit are not tokenized again
+            return self.token_counter.truncate(text, self.max_tokens)
         except Exception as e:
             if self.verbose:
                 log_error(f"Error truncating text: {str(e)}", "OpenAIEmbedder")
@@ -456,8 +444,33 @@ class OpenAIEmbedder(Embedder):
                 log_operation_end("EMBED TEXT", "OpenAIEmbedder")
             return [0.0] * self.embedding_dim
         
-    def embed_texts(self, texts: List[str]) -> List[List[float]]:
-        """Generate embeddings for multiple texts."""
+    def embed_chunks(self, chunks: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """
+        Embed a list of content chunks.
+        
+        Args:
+            chunks: List of content chunks with 'content' field, chunks sized by a
+                chunker with this model's tokenizer skip tokenization
+            
+        Returns:
+            Same chunks with 'embedding' field added
+        """
+        texts = [chunk.get('content', '') for chunk in chunks]
+        token_counts = [
+            chunk.get('token_count') if chunk.get('tokenizer') == self.token_counter.name else None
+            for chunk in chunks
+        ]
+        embeddings = self.embed_texts(texts, token_counts)
+        
+        result = []
+        for chunk, embedding in zip(chunks, embeddings):
+            chunk_with_embedding = dict(chunk)
+            chunk_with_embedding['embedding'] = embedding
+            result.append(chunk_with_embedding)
+        return result
+        
+    def embed_texts(self, texts: List[str], token_counts: Optional[List[Optional[int]]] = None) -> List[List[float]]:
+        """Generate embeddings for multiple texts, token_counts are their known sizes if any."""
         if self.verbose:
             log_operation_start("EMBED TEXTS", "OpenAIEmbedder")
             log_embedding_operation(len(texts), "OpenAIEmbedder")
@@ -474,6 +487,7 @@ class OpenAIEmbedder(Embedder):
         
         for i in range(0, len(texts), self.batch_size):
             batch = texts[i:i + self.batch_size]
+            batch_counts = token_counts[i:i + self.batch_size] if token_counts else [None] * len(batch)
             
             # Clean and truncate each text in batch
             valid_texts = []
@@ -482,17 +496,18 @@ class OpenAIEmbedder(Embedder):
             
             for j, text in enumerate(batch):
                 if text:
-                    truncated = self._truncate_text(text)
+                    truncated = self._truncate_text(text, batch_counts[j])
                     if truncated:
                         valid_texts.append(truncated)
                         valid_indices.append(j)
             
             if valid_texts:
                 try:
-                    response = self.client.embeddings.create(
-                        model=self.model_name,
-                        input=valid_texts
-                    )
+                    with span("embed.batch", batch_index=i // self.batch_size, size=len(valid_texts)):
+                        response = self.client.embeddings.create(
+                            model=self.model_name,
+                            input=valid_texts
+                        )
                     
                     # Place embeddings in correct positions
                     for idx, embedding_data in zip(valid_indices, response.data):
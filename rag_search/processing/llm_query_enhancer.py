@@ -1,10 +1,13 @@
-from typing import List
+from typing import List, Optional, Tuple, Union
 from dataclasses import dataclass
 from pydantic import BaseModel, Field
 import openai
 from datetime import datetime
+import asyncio
 import os
+import re
 
+from rag_search.utils.cache import TTLCache
 from rag_search.utils.logging import (
     log_operation_start, log_operation_end, log_info, 
     log_input, log_output, log_success
@@ -18,6 +21,9 @@ class SearchQueriesResponse(BaseModel):
 class EnhancedQueries:
     original_query: str
     enhanced_queries: List[str]
+    route: str = "llm"
+    cached: bool = False
+    fallback: bool = False
 
 class LLMQueryEnhancer:
     """
@@ -27,24 +33,30 @@ class LLMQueryEnhancer:
     
     def __init__(
         self,
-        openai_client: openai.OpenAI,
+        openai_client: Union[openai.AsyncOpenAI, openai.OpenAI],
         model: str = "gpt-3.5-turbo",
         max_queries: int = 3,
+        cache_size: int = 1024,
+        cache_ttl: Optional[float] = 3600.0,
         verbose: bool = False
     ):
         """
         Initialize LLM query enhancer.
         
         Args:
-            openai_client: OpenAI client instance
+            openai_client: OpenAI client instance; an AsyncOpenAI client is awaited
+                directly, a synchronous client is run in a worker thread
             model: Model to use for query enhancement
             max_queries: Maximum number of queries to generate
+            cache_size: Maximum number of enhanced queries to cache (0 disables caching)
+            cache_ttl: Seconds an enhanced query stays cached
             verbose: Whether to enable verbose logging
         """
         self.client = openai_client
         self.model = model
         self.max_queries = max_queries
         self.verbose = verbose
+        self.cache = TTLCache(max_size=cache_size, ttl=cache_ttl)
         
         if self.verbose:
             log_info("LLMQueryEnhancer ready!", "LLMQueryEnhancer")
@@ -91,10 +103,43 @@ Response:
 
 """
 
+    def _cache_key(self, query: str) -> Tuple[str, str, str]:
+        """Cache key of (model, normalized query, date); the prompt only varies by date."""
+        normalized_query = re.sub(r'\s+', ' ', query).strip().lower()
+        return (self.model, normalized_query, datetime.now().strftime("%Y-%m-%d"))
+
+    async def _complete(self, query: str):
+        """Send the enhancement request without blocking the event loop."""
+        messages = [
+            {"role": "system", "content": self._get_system_prompt()},
+            {"role": "user", "content": self._get_user_prompt(query)}
+        ]
+        if self.model == "nemotron":
+            request = lambda client: client.chat.completions.create(
+                model=self.model,
+                messages=messages,
+                temperature=0.1,
+                extra_body={"guided_json": SearchQueriesResponse.model_json_schema()},
+                max_tokens=1000
+            )
+        else:
+            request = lambda client: client.beta.chat.completions.parse(
+                model=self.model,
+                messages=messages,
+                response_format=SearchQueriesResponse,
+                max_tokens=1000
+            )
+        
+        if isinstance(self.client, openai.AsyncOpenAI):
+            return await request(self.client)
+        return await asyncio.to_thread(request, self.client)
+
     async def enhance(self, query: str) -> EnhancedQueries:
         """
         Enhance the given query by generating multiple optimized search queries using LLM.
         
+        Repeated queries on the same day are served from the cache without an LLM call.
+        
         Args:
             query: The original user query
             
@@ -105,28 +150,21 @@ Response:
             log_operation_start("ENHANCING QUERY WITH LLM", "LLMQueryEnhancer")
             log_input(query, "LLMQueryEnhancer")
         
+        cache_key = self._cache_key(query)
+        cached_queries = self.cache.get(cache_key)
+        if cached_queries is not None:
+            if self.verbose:
+                log_success("Enhanced queries served from cache", "LLMQueryEnhancer")
+                log_output(cached_queries, "LLMQueryEnhancer")
+                log_operation_end("ENHANCING QUERY WITH LLM", "LLMQueryEnhancer")
+            return EnhancedQueries(
+                original_query=query,
+                enhanced_queries=list(cached_queries),
+                cached=True
+            )
+        
         try:
-            if self.model == "nemotron":
-                response = self.client.chat.completions.create(
-                    model=self.model,
-                    messages=[
-                        {"role": "system", "content": self._get_system_prompt()},
-                        {"role": "user", "content": self._get_user_prompt(query)}
-                    ],
-                    temperature=0.1,
-                    extra_body={"guided_json": SearchQueriesResponse.model_json_schema()},
-                    max_tokens=1000
-                )
-            else:
-                response = self.client.beta.chat.completions.parse(
-                    model=self.model,
-                    messages=[
-                        {"role": "system", "content": self._get_system_prompt()},
-                        {"role": "user", "content": self._get_user_prompt(query)}
-                    ],
-                    response_format=SearchQueriesResponse,
-                    max_tokens=1000
-                )
+            response = await self._complete(query)
             # Parse the response
             content = response.choices[0].message.content
             queries_response = SearchQueriesResponse.model_validate_json(content)
@@ -135,6 +173,8 @@ Response:
                 original_query=query,
                 enhanced_queries=queries_response.queries
             )
+            # Only successful enhancements are cached, failures fall back below
+            self.cache.set(cache_key, tuple(result.enhanced_queries))
             
             if self.verbose:
                 log_success("Queries enhanced with LLM", "LLMQueryEnhancer")
@@ -149,7 +189,8 @@ Response:
             # Fallback to original query if enhancement fails
             return EnhancedQueries(
                 original_query=query,
-                enhanced_queries=[query]
+                enhanced_queries=[query],
+                fallback=True
             )
 
 if __name__ == "__main__":
@@ -158,7 +199,7 @@ if __name__ == "__main__":
     
     # Example usage
     load_dotenv()
-    client = openai.OpenAI(
+    client = openai.AsyncOpenAI(
         api_key=os.getenv("OPENAI_API_KEY")
     )
     
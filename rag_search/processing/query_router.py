@@ -0,0 +1,126 @@
+from typing import List, Optional
+import re
+
+from rag_search.processing.query_enhancer import QueryEnhancer
+from rag_search.processing.llm_query_enhancer import LLMQueryEnhancer, EnhancedQueries
+from rag_search.utils.logging import (
+    log_operation_start, log_operation_end, log_info,
+    log_input, log_output, log_success
+)
+
+# Query classes, cheapest first
+ROUTE_NAVIGATIONAL = "navigational"
+ROUTE_FACTUAL = "factual"
+ROUTE_COMPLEX = "complex"
+
+URL_PATTERN = re.compile(r"(https?://|www\.)\S+|\b[\w-]+\.(com|org|net|edu|gov|io|si|de|uk|eu)\b", re.IGNORECASE)
+NAVIGATIONAL_PATTERN = re.compile(r"\b(login|log in|sign in|homepage|home page|official site|official website|website|download)\b", re.IGNORECASE)
+COMPLEX_PATTERN = re.compile(
+    r"\b(compare|comparison|versus|vs\.?|difference between|differences|pros and cons|"
+    r"why|how does|how do|how did|explain|impact of|relationship between|step by step)\b",
+    re.IGNORECASE
+)
+CLAUSE_SPLIT_PATTERN = re.compile(r"[?;]|\b(?:and|or|but|then)\s+(?=(?:what|who|when|where|why|how|which)\b)", re.IGNORECASE)
+
+class QueryRouter:
+    """
+    Routes queries to the cheapest query enhancer that can handle them.
+    
+    Short factual and navigational queries go through the rule-based QueryEnhancer,
+    which runs in microseconds; only complex, multi-part queries pay for an
+    LLMQueryEnhancer round-trip. Exposes the same enhance() interface as
+    LLMQueryEnhancer so it can be passed to RAGSearchPipeline as query_enhancer.
+    """
+    
+    def __init__(
+        self,
+        llm_enhancer: LLMQueryEnhancer,
+        rule_enhancer: Optional[QueryEnhancer] = None,
+        max_simple_words: int = 12,
+        verbose: bool = False
+    ):
+        """
+        Initialize query router.
+        
+        Args:
+            llm_enhancer: LLM-based enhancer used for complex queries
+            rule_enhancer: Rule-based enhancer used for cheap queries
+            max_simple_words: Queries longer than this are treated as complex
+            verbose: Whether to enable verbose logging
+        """
+        self.llm_enhancer = llm_enhancer
+        self.rule_enhancer = rule_enhancer or QueryEnhancer()
+        self.max_simple_words = max_simple_words
+        self.verbose = verbose
+        
+        if self.verbose:
+            log_info("QueryRouter ready!", "QueryRouter")
+    
+    def classify(self, query: str) -> str:
+        """
+        Classify a query by how expensive it is to enhance.
+        
+        Args:
+            query: The original user query
+            
+        Returns:
+            One of "navigational", "factual" or "complex"
+        """
+        words = query.split()
+        
+        # Multi-part questions and explicit reasoning requests need the LLM
+        clauses = [c for c in CLAUSE_SPLIT_PATTERN.split(query) if c and c.strip(" ?;")]
+        if len(words) > self.max_simple_words or COMPLEX_PATTERN.search(query) or query.count("?") > 1 or len(clauses) > 1:
+            return ROUTE_COMPLEX
+        
+        if URL_PATTERN.search(query) or NAVIGATIONAL_PATTERN.search(query):
+            return ROUTE_NAVIGATIONAL
+        
+        return ROUTE_FACTUAL
+    
+    def _rule_based_queries(self, query: str, route: str) -> List[str]:
+        """Build search queries for the cheap routes with the rule-based enhancer."""
+        if route == ROUTE_NAVIGATIONAL:
+            # The user already told us where to go, rewriting only hurts
+            return [query]
+        
+        enhanced = self.rule_enhancer.enhance(query)
+        queries = [query]
+        keyword_query = " ".join(enhanced.search_keywords)
+        if keyword_query and keyword_query != query.lower():
+            queries.append(keyword_query)
+        return queries
+    
+    async def enhance(self, query: str) -> EnhancedQueries:
+        """
+        Enhance the query with the enhancer selected for its class.
+        
+        Args:
+            query: The original user query
+            
+        Returns:
+            EnhancedQueries whose route records which path was taken
+        """
+        route = self.classify(query)
+        
+        if self.verbose:
+            log_operation_start("ROUTING QUERY", "QueryRouter")
+            log_input(query, "QueryRouter")
+            log_info(f"Query classified as {route}", "QueryRouter")
+        
+        if route == ROUTE_COMPLEX:
+            result = await self.llm_enhancer.enhance(query)
+            result.route = f"llm:{route}"
+        else:
+            result = EnhancedQueries(
+                original_query=query,
+                enhanced_queries=self._rule_based_queries(query, route),
+                route=f"rule:{route}"
+            )
+        
+        if self.verbose:
+            log_success(f"Routed via {result.route}", "QueryRouter")
+            log_output(result.enhanced_queries, "QueryRouter")
+            log_operation_end("ROUTING QUERY", "QueryRouter")
+        
+        return result
@@ -1,15 +1,32 @@
-from typing import List, Dict, Any, Optional
+from typing import List, Dict, Any, Optional, Tuple
 from abc import ABC, abstractmethod
+import contextlib
+import hashlib
+import random
+import re
+import time
+import numpy as np
 import torch
 
 from rag_search.utils.logging import (
     log_operation_start, log_operation_end, log_info, 
     log_data, log_error, log_success, log_chunks, log_warning
 )
+from rag_search.reranker.client import ScoringClient
+from rag_search.reranker.cross_encoder import CrossEncoderReranker
+from rag_search.utils.batching import length_bucketed_batches
+from rag_search.utils.cache import TTLCache
+from rag_search.utils.tracing import span
+
+# Rough characters per token of the reranker tokenizers, for bucketing pairs by length
+_CHARS_PER_TOKEN = 4
 
 class Reranker(ABC):
     """Base class for content reranking."""
     
+    # Pipeline metrics, set by RAGSearchPipeline
+    metrics = None
+    
     @abstractmethod
     def rerank(
         self, 
@@ -27,10 +44,227 @@ class Reranker(ABC):
             Reranked list of content chunks
         """
         pass
+    
+    def rerank_batch(
+        self,
+        chunk_lists: List[List[Dict[str, Any]]],
+        queries: List[str]
+    ) -> List[List[Dict[str, Any]]]:
+        """
+        Rerank the chunks of several queries.
+        
+        Subclasses can override this to score all query-chunk pairs in one pass.
+        
+        Args:
+            chunk_lists: Content chunks per query
+            queries: Queries to rank against, aligned with chunk_lists
+            
+        Returns:
+            Reranked list of content chunks per query
+        """
+        return [self.rerank(chunks, query) for chunks, query in zip(chunk_lists, queries)]
+    
+    def rerank_with_stats(
+        self,
+        chunks: List[Dict[str, Any]],
+        query: str
+    ) -> Tuple[List[Dict[str, Any]], Dict[str, Any]]:
+        """
+        Rerank chunks and report per-stage statistics for the pipeline logs.
+        
+        Args:
+            chunks: List of content chunks
+            query: Query to rank against
+            
+        Returns:
+            Reranked list of content chunks and a dictionary of statistics
+            (empty for single-stage rerankers)
+        """
+        return self.rerank(chunks, query), {}
+
+class PairwiseReranker(Reranker):
+    """Reranker scoring every query-chunk pair independently.
+    
+    Subclasses only implement score_pairs; selection of the top_k chunks above the
+    score threshold and batching the pairs of several queries are shared.
+    """
+    
+    # Component name of the log messages
+    log_component = "Reranker"
+    
+    def __init__(self, top_k: int = 5, score_threshold: float = 0.0, verbose: bool = False):
+        """
+        Initialize the selection shared by pair-scoring rerankers.
+        
+        Args:
+            top_k: Number of top results to return
+            score_threshold: Minimum score to include a result
+            verbose: Whether to enable verbose logging
+        """
+        self.top_k = top_k
+        self.score_threshold = score_threshold
+        self.verbose = verbose
+    
+    @abstractmethod
+    def score_pairs(self, pairs: List[List[str]]) -> List[float]:
+        """
+        Relevance scores of [query, content] pairs.
+        
+        Args:
+            pairs: [query, content] pairs
+            
+        Returns:
+            One score per pair, higher is more relevant
+        """
+        pass
+    
+    def _select(self, chunks: List[Dict[str, Any]], scores: List[float]) -> List[Dict[str, Any]]:
+        """Attach scores to chunks and keep the top_k above the score threshold."""
+        chunks_with_scores = []
+        for chunk, score in zip(chunks, scores):
+            score = float(score)
+            if score >= self.score_threshold:
+                # Create a copy of the chunk with score
+                chunk_with_score = dict(chunk)
+                chunk_with_score['similarity'] = score
+                chunks_with_scores.append(chunk_with_score)
+        
+        # Sort by score (highest first)
+        sorted_chunks = sorted(
+            chunks_with_scores,
+            key=lambda x: x.get('similarity', 0.0),
+            reverse=True
+        )
+        
+        # Return top k results
+        return sorted_chunks[:self.top_k]
+    
+    def rerank_batch(
+        self,
+        chunk_lists: List[List[Dict[str, Any]]],
+        queries: List[str]
+    ) -> List[List[Dict[str, Any]]]:
+        """
+        Rerank the chunks of several queries, scoring all their pairs in one score_pairs call.
+        
+        Args:
+            chunk_lists: Content chunks per query
+            queries: Queries to rank against, aligned with chunk_lists
+            
+        Returns:
+            Reranked list of content chunks per query
+        """
+        if self.verbose:
+            log_operation_start("BATCH RERANKING", self.log_component)
+            log_data("Queries", len(queries), self.log_component)
+        
+        # Flatten all query-chunk pairs, remembering which query they belong to
+        pairs = []
+        owners = []
+        valid_chunk_lists = [[] for _ in queries]
+        for index, (chunks, query) in enumerate(zip(chunk_lists, queries)):
+            for chunk in chunks:
+                content = chunk.get('content', '')
+                if content:
+                    pairs.append([query, content])
+                    owners.append(index)
+                    valid_chunk_lists[index].append(chunk)
+        
+        if not pairs:
+            if self.verbose:
+                log_warning("No valid content to rerank", self.log_component)
+                log_operation_end("BATCH RERANKING", self.log_component)
+            return [[] for _ in queries]
+        
+        if self.verbose:
+            log_info(f"Scoring {len(pairs)} pairs", self.log_component)
+        
+        scores = self.score_pairs(pairs)
+        
+        # Split the scores back per query
+        score_lists = [[] for _ in queries]
+        for index, score in zip(owners, scores):
+            score_lists[index].append(score)
+        
+        results = [
+            self._select(chunks, query_scores)
+            for chunks, query_scores in zip(valid_chunk_lists, score_lists)
+        ]
+        
+        if self.verbose:
+            log_success(f"Reranked {len(pairs)} pairs for {len(queries)} queries", self.log_component)
+            log_operation_end("BATCH RERANKING", self.log_component)
+        
+        return results
+    
+    def rerank(
+        self, 
+        chunks: List[Dict[str, Any]], 
+        query: str
+    ) -> List[Dict[str, Any]]:
+        """
+        Rerank chunks by the scores of their query-chunk pairs.
+        
+        Args:
+            chunks: List of content chunks (no embeddings needed)
+            query: Query to rank against
+            
+        Returns:
+            Reranked list of content chunks
+        """
+        if self.verbose:
+            log_operation_start("RERANKING", self.log_component)
+            log_data("Chunks to rerank", len(chunks), self.log_component)
+            log_data("Query", query, self.log_component)
+            
+        if not chunks:
+            if self.verbose:
+                log_warning("No chunks to rerank", self.log_component)
+                log_operation_end("RERANKING", self.log_component)
+            return []
+            
+        # Prepare query-chunk pairs for scoring
+        pairs = []
+        valid_chunks = []
+        for chunk in chunks:
+            content = chunk.get('content', '')
+            if content:
+                pairs.append([query, content])
+                valid_chunks.append(chunk)
+        
+        if self.verbose:
+            log_data("Valid pairs created", len(pairs), self.log_component)
+                
+        if not pairs:
+            if self.verbose:
+                log_warning("No valid content to rerank", self.log_component)
+                log_operation_end("RERANKING", self.log_component)
+            return []
+            
+        # Score all pairs
+        if self.verbose:
+            log_info(f"Scoring {len(pairs)} pairs", self.log_component)
+            
+        scores = self.score_pairs(pairs)
+        
+        if self.verbose:
+            log_success(f"Scored {len(scores)} pairs", self.log_component)
+            
+        # Add scores to chunks and keep the top k
+        result = self._select(valid_chunks, scores)
+        
+        if self.verbose:
+            log_success(f"Returning top {len(result)} chunks", self.log_component)
+            log_chunks(result, self.log_component)
+            log_operation_end("RERANKING", self.log_component)
+            
+        return result
 
-class JinaAIReranker(Reranker):
+class JinaAIReranker(PairwiseReranker):
     """Reranker using Jina AI's multilingual reranker model."""
     
+    log_component = "JinaAI"
+    
     def __init__(
         self,
         model_name: str = "jinaai/jina-reranker-v2-base-multilingual",
@@ -38,6 +272,12 @@ class JinaAIReranker(Reranker):
         score_threshold: float = 0.0,
         batch_size: int = 16,
         max_length: int = 1024,
+        score_cache_size: int = 100000,
+        score_cache_ttl: Optional[float] = None,
+        max_batch_tokens: int = 16384,
+        bucket_by_length: bool = True,
+        backend: str = "torch",
+        onnx_file: str = "onnx/model.onnx",
         device: str = "cuda" if torch.cuda.is_available() else "mps" if torch.backends.mps.is_available() else "cpu",
         verbose: bool = False
     ):
@@ -50,10 +290,19 @@ class JinaAIReranker(Reranker):
             score_threshold: Minimum score to include a result
             batch_size: Batch size for scoring
             max_length: Maximum sequence length
+            score_cache_size: Maximum number of cached query-chunk scores (0 disables the cache)
+            score_cache_ttl: Seconds a cached score stays valid (None for no expiry)
+            max_batch_tokens: Padded tokens per batch when bucketing by length
+            bucket_by_length: Batch pairs of similar token length under max_batch_tokens
+                instead of batch_size pairs in incoming order
+            backend: Inference backend: "torch", "torch_int8" (dynamic int8 quantization
+                of the linear layers, CPU only) or "onnx" (ONNX Runtime, CPU)
+            onnx_file: ONNX export in the model repository used by the "onnx" backend,
+                e.g. "onnx/model_quantized.onnx" for the int8 export
             device: Device to run model on ('cuda', 'mps', or 'cpu')
             verbose: Whether to enable verbose logging
         """
-        self.verbose = verbose
+        super().__init__(top_k=top_k, score_threshold=score_threshold, verbose=verbose)
         
         if self.verbose:
             log_operation_start("INITIALIZE JINA AI RERANKER", "JinaAI")
@@ -63,22 +312,49 @@ class JinaAIReranker(Reranker):
             log_data("Batch size", batch_size, "JinaAI")
             log_data("Max length", max_length, "JinaAI")
             log_data("Device", device, "JinaAI")
+            log_data("Backend", backend, "JinaAI")
             
+        if backend not in ("torch", "torch_int8", "onnx"):
+            raise ValueError(f"Unknown reranker backend: {backend}")
+        if backend != "torch":
+            # Quantized kernels and ONNX Runtime's CPU provider only run on CPU
+            device = "cpu"
+        
         try:
-            from transformers import AutoModelForSequenceClassification
-            self.model = AutoModelForSequenceClassification.from_pretrained(
-                model_name,
-                torch_dtype="auto",
-                trust_remote_code=True
-            )
-            self.model.to(device)
-            self.model.eval()
+            if backend == "onnx":
+                import onnxruntime
+                from huggingface_hub import hf_hub_download
+                from transformers import AutoTokenizer
+                self.tokenizer = AutoTokenizer.from_pretrained(model_name)
+                self.session = onnxruntime.InferenceSession(
+                    hf_hub_download(model_name, onnx_file),
+                    providers=["CPUExecutionProvider"]
+                )
+                self.model = None
+            else:
+                from transformers import AutoModelForSequenceClassification
+                self.model = AutoModelForSequenceClassification.from_pretrained(
+                    model_name,
+                    # Dynamic quantization starts from float32 weights
+                    torch_dtype=torch.float32 if backend == "torch_int8" else "auto",
+                    trust_remote_code=True
+                )
+                self.model.to(device)
+                self.model.eval()
+                if backend == "torch_int8":
+                    self.model = torch.quantization.quantize_dynamic(self.model, {torch.nn.Linear}, dtype=torch.qint8)
             
-            self.top_k = top_k
-            self.score_threshold = score_threshold
+            self.backend = backend
             self.batch_size = batch_size
             self.max_length = max_length
             self.device = device
+            self.model_name = model_name
+            self.max_batch_tokens = max_batch_tokens
+            self.bucket_by_length = bucket_by_length
+            
+            # Scores of (model, normalized query, chunk hash), follow-ups and repeated
+            # queries mostly rerank the same chunks
+            self.score_cache = TTLCache(max_size=score_cache_size, ttl=score_cache_ttl)
             
             if self.verbose:
                 log_success("Jina AI model loaded successfully", "JinaAI")
@@ -88,112 +364,316 @@ class JinaAIReranker(Reranker):
             if self.verbose:
                 log_error("Failed to import required libraries", "JinaAI", e)
                 log_operation_end("INITIALIZE JINA AI RERANKER", "JinaAI")
+            if backend == "onnx":
+                raise ImportError("Please install onnxruntime for the onnx backend: pip install onnxruntime")
             raise ImportError("Please install transformers and einops: pip install transformers einops")
     
-    def rerank(
-        self, 
-        chunks: List[Dict[str, Any]], 
+    def _score_key(self, query: str, content: str) -> Tuple[str, str, int, str, bytes]:
+        """Cache key of (model, backend, max length, normalized query, chunk hash)."""
+        normalized_query = re.sub(r'\s+', ' ', query).strip().lower()
+        chunk_hash = hashlib.blake2b(content.encode("utf-8", "replace"), digest_size=16).digest()
+        return (self.model_name, self.backend, self.max_length, normalized_query, chunk_hash)
+    
+    def score_pairs(self, pairs: List[List[str]]) -> List[float]:
+        """Score query-chunk pairs, sending only pairs without a cached score to the model."""
+        keys = [self._score_key(query, content) for query, content in pairs]
+        scores = [self.score_cache.get(key) for key in keys]
+        missing = [i for i, score in enumerate(scores) if score is None]
+        
+        if self.metrics is not None:
+            if len(pairs) > len(missing):
+                self.metrics.cache_hits.inc(len(pairs) - len(missing), cache="rerank_scores")
+            if missing:
+                self.metrics.cache_misses.inc(len(missing), cache="rerank_scores")
+        if self.verbose:
+            log_info(f"{len(pairs) - len(missing)} of {len(pairs)} scores cached", "JinaAI")
+        
+        if missing:
+            with span("rerank.score", pairs=len(missing), cached=len(pairs) - len(missing)):
+                computed = self._compute_scores([pairs[i] for i in missing])
+            for i, score in zip(missing, computed):
+                scores[i] = float(score)
+                self.score_cache.set(keys[i], scores[i])
+        
+        return scores
+    
+    def _pair_lengths(self, pairs: List[List[str]]) -> List[int]:
+        """Estimated token lengths of query-chunk pairs, truncated to max_length.
+        
+        Estimated from the character count, the model tokenizes the pairs anyway and a
+        second tokenization pass only to sort them would cost more than the padding saved.
+        """
+        # <s> query </s></s> document </s>
+        return [
+            min((len(query) + len(content)) // _CHARS_PER_TOKEN + 4, self.max_length)
+            for query, content in pairs
+        ]
+    
+    def _run_model(self, pairs: List[List[str]], batch_size: int) -> List[float]:
+        """Score pairs with the configured backend, batch_size pairs per forward pass."""
+        if self.backend == "onnx":
+            input_names = {model_input.name for model_input in self.session.get_inputs()}
+            scores = []
+            for start in range(0, len(pairs), batch_size):
+                inputs = self.tokenizer(
+                    pairs[start:start + batch_size],
+                    padding=True,
+                    truncation=True,
+                    max_length=self.max_length,
+                    return_tensors="np"
+                )
+                logits = self.session.run(None, {name: value for name, value in inputs.items() if name in input_names})[0]
+                # Same sigmoid as compute_score of the PyTorch model
+                scores.extend((1 / (1 + np.exp(-logits.reshape(-1)))).tolist())
+            return scores
+        
+        with torch.no_grad():
+            scores = self.model.compute_score(pairs, max_length=self.max_length, batch_size=batch_size)
+        return [float(score) for score in (scores if len(pairs) > 1 else [scores])]
+    
+    def _compute_scores(self, pairs: List[List[str]]) -> List[float]:
+        """Run the model on pairs, bucketed by length so batches carry little padding."""
+        if not self.bucket_by_length:
+            return self._run_model(pairs, self.batch_size)
+        
+        scores = [0.0] * len(pairs)
+        for batch in length_bucketed_batches(self._pair_lengths(pairs), self.max_batch_tokens):
+            batch_scores = self._run_model([pairs[i] for i in batch], len(batch))
+            # Restore the incoming order
+            for i, score in zip(batch, batch_scores):
+                scores[i] = score
+        return scores
+
+
+class RemoteReranker(PairwiseReranker):
+    """Jina AI reranker whose model runs in the shared scoring service.
+    
+    Worker processes use this instead of loading their own copy of the model; the
+    service (python -m rag_search.reranker.server) micro-batches the pairs of all
+    workers and keeps one score cache for them.
+    """
+    
+    log_component = "RemoteReranker"
+    
+    def __init__(
+        self,
+        url: str = "unix:///tmp/rag_search_scoring.sock",
+        top_k: int = 5,
+        score_threshold: float = 0.0,
+        timeout: float = 30.0,
+        verbose: bool = False
+    ):
+        """
+        Initialize the remote reranker.
+        
+        Args:
+            url: Scoring service address, "unix:///path/to.sock" or "http://host:port"
+            top_k: Number of top results to return
+            score_threshold: Minimum score to include a result
+            timeout: Seconds to wait for the service
+            verbose: Whether to enable verbose logging
+        """
+        # Only scoring is remote, batching and the score cache live in the service
+        super().__init__(top_k=top_k, score_threshold=score_threshold, verbose=verbose)
+        self.client = ScoringClient(url, timeout=timeout)
+        self.url = url
+        
+        if self.verbose:
+            log_info(f"Using remote reranker at {url}", self.log_component)
+    
+    def score_pairs(self, pairs: List[List[str]]) -> List[float]:
+        """Score query-chunk pairs in the scoring service."""
+        with span("rerank.score", pairs=len(pairs), remote=True):
+            return self.client.score(pairs)
+
+class CascadeReranker(Reranker):
+    """Two-stage reranker: a small cross-encoder narrows the candidates for a larger one.
+    
+    The first stage scores every candidate, only its top first_stage_top_n go to the
+    second stage, whose top_k is the result. A sample of audit_rate of the requests
+    also runs the second stage on all candidates to measure the first stage's recall,
+    which is exported as the rag_rerank_first_stage_recall histogram.
+    """
+    
+    def __init__(
+        self,
+        first_stage: CrossEncoderReranker,
+        second_stage: Reranker,
+        first_stage_top_n: int = 20,
+        audit_rate: float = 0.01,
+        verbose: bool = False
+    ):
+        """
+        Initialize the cascade.
+        
+        Args:
+            first_stage: Lightweight cross-encoder scoring all candidates
+            second_stage: Reranker producing the final ranking
+            first_stage_top_n: Candidates passed from the first to the second stage
+            audit_rate: Fraction of requests whose second stage also scores all candidates
+                (0 disables the audit)
+            verbose: Whether to enable verbose logging
+        """
+        self.first_stage = first_stage
+        self.second_stage = second_stage
+        self.first_stage_top_n = first_stage_top_n
+        self.audit_rate = audit_rate
+        self.verbose = verbose
+        # Ranking all candidates with one model is the first stage's job
+        self.first_stage.top_k = first_stage_top_n
+    
+    @property
+    def metrics(self):
+        return self.second_stage.metrics
+    
+    @metrics.setter
+    def metrics(self, metrics):
+        # The second stage counts its score cache lookups in the same metrics
+        self.second_stage.metrics = metrics
+    
+    def _timed(self, name: str):
+        if self.metrics is not None:
+            return self.metrics.stage(name)
+        return contextlib.nullcontext()
+    
+    def rerank_with_stats(
+        self,
+        chunks: List[Dict[str, Any]],
         query: str
-    ) -> List[Dict[str, Any]]:
+    ) -> Tuple[List[Dict[str, Any]], Dict[str, Any]]:
         """
-        Rerank chunks using Jina AI model.
+        Rerank chunks through both stages.
         
         Args:
-            chunks: List of content chunks (no embeddings needed)
+            chunks: List of content chunks
             query: Query to rank against
             
         Returns:
-            Reranked list of content chunks
+            Reranked list of content chunks and per-stage candidates, survivors and
+            latencies, plus the first stage's recall when the request was audited
         """
-        if self.verbose:
-            log_operation_start("JINA AI RERANKING", "JinaAI")
-            log_data("Chunks to rerank", len(chunks), "JinaAI")
-            log_data("Query", query, "JinaAI")
-            
+        chunks = [chunk for chunk in chunks if chunk.get('content')]
         if not chunks:
-            if self.verbose:
-                log_warning("No chunks to rerank", "JinaAI")
-                log_operation_end("JINA AI RERANKING", "JinaAI")
-            return []
-            
-        # Prepare query-chunk pairs for scoring
-        pairs = []
-        valid_chunks = []
-        for chunk in chunks:
-            content = chunk.get('content', '')
-            if content:
-                pairs.append([query, content])
-                valid_chunks.append(chunk)
+            return [], {}
         
-        if self.verbose:
-            log_data("Valid pairs created", len(pairs), "JinaAI")
-                
-        if not pairs:
-            if self.verbose:
-                log_warning("No valid content to rerank", "JinaAI")
-                log_operation_end("JINA AI RERANKING", "JinaAI")
-            return []
-            
-        # Score all pairs with Jina AI model
-        if self.verbose:
-            log_info(f"Scoring pairs with Jina AI model in batches of {self.batch_size}", "JinaAI")
-            
-        with torch.no_grad():
-            scores = self.model.compute_score(
-                pairs,
-                max_length=self.max_length,
-                batch_size=self.batch_size
-            )
+        start = time.perf_counter()
+        with span("rerank.first_stage", candidates=len(chunks)), self._timed("rerank.first_stage"):
+            survivors = self.first_stage.rerank(query, chunks, include_scores=True)
+        first_stage_ms = (time.perf_counter() - start) * 1000
+        for survivor in survivors:
+            survivor['first_stage_score'] = survivor.pop('score')
         
-        if self.verbose:
-            log_success(f"Scored {len(scores)} pairs", "JinaAI")
-            
-        # Add scores to chunks
-        chunks_with_scores = []
-        for chunk, score in zip(valid_chunks, scores):
-            score = float(score)
-            if score >= self.score_threshold:
-                # Create a copy of the chunk with score
-                chunk_with_score = dict(chunk)
-                chunk_with_score['similarity'] = score
-                chunks_with_scores.append(chunk_with_score)
+        start = time.perf_counter()
+        with span("rerank.second_stage", candidates=len(survivors)), self._timed("rerank.second_stage"):
+            result = self.second_stage.rerank(survivors, query)
+        second_stage_ms = (time.perf_counter() - start) * 1000
         
-        # Sort by score (highest first)
-        sorted_chunks = sorted(
-            chunks_with_scores,
-            key=lambda x: x.get('similarity', 0.0),
-            reverse=True
-        )
+        stats = {
+            "stages": [
+                {"name": "first_stage", "candidates": len(chunks), "kept": len(survivors), "latency_ms": round(first_stage_ms, 1)},
+                {"name": "second_stage", "candidates": len(survivors), "kept": len(result), "latency_ms": round(second_stage_ms, 1)}
+            ]
+        }
         
-        # Return top k results
-        result = sorted_chunks[:self.top_k]
+        if self.audit_rate > 0 and len(chunks) > len(survivors) and random.random() < self.audit_rate:
+            # Recall@k of the cascade against the second stage ranking every candidate
+            with span("rerank.audit", candidates=len(chunks)):
+                reference = self.second_stage.rerank(chunks, query)
+            reference_contents = {chunk['content'] for chunk in reference}
+            if reference_contents:
+                found = sum(1 for chunk in result if chunk['content'] in reference_contents)
+                stats["first_stage_recall"] = found / len(reference_contents)
+                if self.metrics is not None:
+                    self.metrics.rerank_first_stage_recall.observe(stats["first_stage_recall"])
         
         if self.verbose:
-            log_data("Chunks with scores above threshold", len(chunks_with_scores), "JinaAI")
-            log_success(f"Returning top {len(result)} chunks", "JinaAI")
-            log_chunks(result, "JinaAI")
-            log_operation_end("JINA AI RERANKING", "JinaAI")
+            log_info(
+                "cascade kept %d of %d candidates (%.1f ms), returned %d (%.1f ms)", "CascadeReranker",
+                len(survivors), len(chunks), first_stage_ms, len(result), second_stage_ms
+            )
+        
+        return result, stats
+    
+    def rerank(
+        self,
+        chunks: List[Dict[str, Any]],
+        query: str
+    ) -> List[Dict[str, Any]]:
+        """
+        Rerank chunks through both stages.
+        
+        Args:
+            chunks: List of content chunks
+            query: Query to rank against
             
-        return result
+        Returns:
+            Reranked list of content chunks
+        """
+        return self.rerank_with_stats(chunks, query)[0]
 
 
 if __name__ == "__main__":
-    reranker = JinaAIReranker(verbose=True)
+    import argparse
+    
+    parser = argparse.ArgumentParser(description="Check accuracy and benchmark throughput of the Jina AI reranker backends")
+    parser.add_argument("--pairs", type=int, default=256, help="Number of query-chunk pairs in the throughput benchmark")
+    parser.add_argument("--device", default="cpu", help="Device to run the torch backend on")
+    parser.add_argument("--backends", nargs="+", default=["torch", "torch_int8", "onnx"], help="Backends to compare, the first is the reference")
+    parser.add_argument("--onnx-file", default="onnx/model.onnx", help="ONNX export used by the onnx backend")
+    args = parser.parse_args()
+    
+    # Fixed pairs for the accuracy check: relevant, partially relevant and unrelated, several languages
+    accuracy_pairs = [
+        ["What is the capital of France?", "Paris is the capital and most populous city of France."],
+        ["What is the capital of France?", "France is a country in Western Europe with a long history."],
+        ["What is the capital of France?", "The Eiffel Tower was completed in 1889 for the World's Fair."],
+        ["What is the capital of France?", "Berlin is the capital of Germany."],
+        ["How do vaccines work?", "Vaccines train the immune system to recognize a pathogen without causing the disease."],
+        ["How do vaccines work?", "The stock market closed higher on Friday after strong earnings reports."],
+        ["Wie hoch ist die Zugspitze?", "Die Zugspitze ist mit 2962 Metern der höchste Berg Deutschlands."],
+        ["Wie hoch ist die Zugspitze?", "München ist die Hauptstadt des Freistaates Bayern."],
+        ["¿Quién escribió Don Quijote?", "Miguel de Cervantes publicó Don Quijote de la Mancha en 1605."],
+        ["¿Quién escribió Don Quijote?", "La paella es un plato típico de Valencia."],
+        ["python sort list of dicts by key", "Use sorted(items, key=lambda d: d['name']) to sort a list of dictionaries."],
+        ["python sort list of dicts by key", "Lists in Python are mutable sequences."],
+    ]
+    
+    # Chunks of mixed lengths, like the output of the chunker on real pages
+    random.seed(0)
+    words = "the capital of france is paris and it is known for the eiffel tower museums and cafes".split()
     chunks = [
-        {"content": "This is a test chunk."},
-        {"content": "Another test chunk."},
-        {"content": "Yet another test chunk."},
-        {"content": "This is a test chunk."},
-        {"content": "Another test chunk."},
-        {"content": "Yet another test chunk."},
-        {"content": "This is a test chunk."},
-        {"content": "Another test chunk."},
-        {"content": "Yet another test chunk."},
-        {"content": "The capital of France is Paris."},
-        ]
+        {"content": " ".join(random.choices(words, k=random.choice([20, 40, 80, 160, 320])))}
+        for _ in range(args.pairs)
+    ]
     query = "What is the capital of France?"
-    result = reranker.rerank(chunks, query)
-    print(result)
-
-
-
+    
+    reference_scores = None
+    reference_top = None
+    for backend in args.backends:
+        reranker = JinaAIReranker(device=args.device, score_cache_size=0, top_k=10, backend=backend, onnx_file=args.onnx_file)
+        scores = reranker.score_pairs(accuracy_pairs)
+        reranker.rerank(chunks[:4], query)  # Warm up
+        
+        results = {}
+        for bucket_by_length in (False, True):
+            reranker.bucket_by_length = bucket_by_length
+            start = time.perf_counter()
+            results[bucket_by_length] = reranker.rerank(chunks, query)
+            elapsed = time.perf_counter() - start
+            name = "length-bucketed" if bucket_by_length else f"fixed batches of {reranker.batch_size}"
+            print(f"{backend}, {name}: {args.pairs / elapsed:.1f} pairs/s ({elapsed:.2f} s)")
+        
+        top = [c["content"] for c in results[True]]
+        same_order = [c["content"] for c in results[False]] == top
+        print(f"{backend}: bucketing keeps the ranking: {same_order}")
+        
+        if reference_scores is None:
+            reference_scores, reference_top = scores, top
+        else:
+            diffs = [abs(a - b) for a, b in zip(scores, reference_scores)]
+            overlap = len(set(top) & set(reference_top)) / max(len(reference_top), 1)
+            print(
+                f"{backend} vs {args.backends[0]}: max |score diff| {max(diffs):.4f}, "
+                f"mean {sum(diffs) / len(diffs):.4f}, top-10 overlap {overlap:.0%}"
+            )
+        del reranker
@@ -10,12 +10,16 @@ from rag_search.utils.logging import (
 
 class Retriever(ABC):
     """Base class for content retrieval."""
+
+    # Whether retrieve() needs the 'embedding' of every chunk
+    requires_embeddings = True
     
     @abstractmethod
     def retrieve(
         self, 
         embedded_chunks: List[Dict[str, Any]], 
-        query: str
+        query: str,
+        top_k: Optional[int] = None
     ) -> List[Dict[str, Any]]:
         """
         Retrieve content chunks based on relevance to query.
@@ -23,6 +27,7 @@ class Retriever(ABC):
         Args:
             embedded_chunks: List of content chunks with embeddings
             query: Query to retrieve against
+            top_k: Number of results, overriding the retriever's top_k
             
         Returns:
             Retrieved list of content chunks
@@ -65,7 +70,8 @@ class CosineRetriever(Retriever):
     def retrieve(
         self, 
         embedded_chunks: List[Dict[str, Any]], 
-        query: str
+        query: str,
+        top_k: Optional[int] = None
     ) -> List[Dict[str, Any]]:
         """
         Retrieve initial candidates using cosine similarity.
@@ -73,6 +79,7 @@ class CosineRetriever(Retriever):
         Args:
             embedded_chunks: List of content chunks with embeddings
             query: Query to retrieve against
+            top_k: Number of results, overriding the retriever's top_k
             
         Returns:
             Retrieved list of content chunks with highest similarity first
@@ -126,7 +133,7 @@ class CosineRetriever(Retriever):
         )
         
         # Return top k results
-        result = sorted_chunks[:self.top_k]
+        result = sorted_chunks[:top_k or self.top_k]
         
         if self.verbose:
             log_success(f"Returning top {len(result)} chunks", "Retriever")
@@ -0,0 +1,47 @@
+from typing import Any, Dict, List
+
+import httpx
+
+class ScoringClient:
+    """Client of the scoring service started with python -m rag_search.reranker.server."""
+
+    def __init__(self, url: str = "unix:///tmp/rag_search_scoring.sock", timeout: float = 30.0):
+        """
+        Initialize the client.
+
+        Args:
+            url: Service address, "unix:///path/to.sock" or "http://host:port"
+            timeout: Seconds to wait for a response
+        """
+        self.url = url
+        if url.startswith("unix://"):
+            transport = httpx.HTTPTransport(uds=url[len("unix://"):])
+            self._client = httpx.Client(transport=transport, base_url="http://scoring", timeout=timeout)
+        else:
+            self._client = httpx.Client(base_url=url.rstrip("/"), timeout=timeout)
+
+    def _post(self, path: str, payload: Dict[str, Any]) -> Dict[str, Any]:
+        response = self._client.post(path, json=payload)
+        response.raise_for_status()
+        return response.json()
+
+    def score(self, pairs: List[List[str]]) -> List[float]:
+        """Cross-encoder scores of [query, content] pairs."""
+        if not pairs:
+            return []
+        return self._post("/score", {"pairs": pairs})["scores"]
+
+    def quality(self, texts: List[str]) -> List[float]:
+        """Quality classifier scores (0 = low, 1 = medium, 2 = high) of texts."""
+        if not texts:
+            return []
+        return self._post("/quality", {"texts": texts})["scores"]
+
+    def health(self) -> Dict[str, Any]:
+        """Loaded models and batching statistics of the service."""
+        response = self._client.get("/health")
+        response.raise_for_status()
+        return response.json()
+
+    def close(self):
+        self._client.close()
@@ -0,0 +1,101 @@
+"""
+Shared scoring service for the reranker and the quality model.
+
+API workers and eval runs that enable scoring_service in their config use
+RemoteReranker / RemoteQualityImprover instead of loading the models themselves.
+Pairs and texts of concurrent requests are merged into micro-batches, so all
+workers share one copy of each model (and one score cache):
+
+    python -m rag_search.reranker.server --config config.yaml
+"""
+
+import argparse
+import os
+from typing import List, Optional
+
+from fastapi import FastAPI, HTTPException
+from pydantic import BaseModel
+import uvicorn
+
+from main import build_jina_reranker, load_config
+from rag_search.processing.reranker import JinaAIReranker
+from rag_search.scraping.quality_scorer import QualityImprover
+from rag_search.utils.async_utils import MicroBatcher
+
+class ScoreRequest(BaseModel):
+    pairs: List[List[str]]
+
+class QualityRequest(BaseModel):
+    texts: List[str]
+
+def create_app(
+    reranker: JinaAIReranker,
+    quality_improver: Optional[QualityImprover] = None,
+    max_batch_pairs: int = 256,
+    max_wait: float = 0.005
+) -> FastAPI:
+    """
+    Create the scoring service app.
+
+    Args:
+        reranker: Local reranker whose model scores all pairs
+        quality_improver: Local quality model, /quality is disabled without one
+        max_batch_pairs: Pairs (or texts) after which a micro-batch is flushed
+        max_wait: Seconds a micro-batch waits for requests of other workers
+
+    Returns:
+        FastAPI app
+    """
+    app = FastAPI(title="RAGSearch scoring service", version="1.0.0")
+    score_batcher = MicroBatcher(reranker.score_pairs, max_batch_pairs, max_wait)
+    quality_batcher = None
+    if quality_improver is not None:
+        quality_batcher = MicroBatcher(quality_improver.predict_quality_scores, max_batch_pairs, max_wait)
+
+    @app.post("/score")
+    async def score(request: ScoreRequest):
+        return {"scores": await score_batcher.submit(request.pairs)}
+
+    @app.post("/quality")
+    async def quality(request: QualityRequest):
+        if quality_batcher is None:
+            raise HTTPException(status_code=404, detail="Quality model is not served")
+        return {"scores": await quality_batcher.submit(request.texts)}
+
+    @app.get("/health")
+    async def health():
+        return {
+            "status": "ok",
+            "reranker": {
+                "model": reranker.model_name,
+                "cached_scores": len(reranker.score_cache),
+                **score_batcher.stats()
+            },
+            "quality": quality_batcher.stats() if quality_batcher is not None else None
+        }
+
+    return app
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Shared reranker and quality scoring service")
+    parser.add_argument("--config", type=str, default="config.yaml", help="Path to YAML configuration file")
+    args = parser.parse_args()
+
+    config = load_config(args.config)
+    service_config = config.get("scoring_service", {})
+    url = service_config.get("url", "unix:///tmp/rag_search_scoring.sock")
+
+    app = create_app(
+        build_jina_reranker(config),
+        QualityImprover(verbose=config["quality_improver"]["verbose"]) if service_config.get("serve_quality", True) else None,
+        max_batch_pairs=service_config.get("max_batch_pairs", 256),
+        max_wait=service_config.get("max_wait_ms", 5) / 1000
+    )
+    if url.startswith("unix://"):
+        uds = url[len("unix://"):]
+        if os.path.exists(uds):
+            os.remove(uds)
+        uvicorn.run(app, uds=uds)
+    else:
+        host, _, port = url.split("://", 1)[-1].rstrip("/").partition(":")
+        uvicorn.run(app, host=host, port=int(port or 8100))
@@ -7,6 +7,7 @@ import asyncio
 from typing import Dict, List, Optional
 import re  # Import the built-in re module
 import json
+import time
 
 from crawl4ai import AsyncWebCrawler, BrowserConfig, ChunkingStrategy, CrawlerRunConfig, CacheMode, RegexChunking
 from crawl4ai.content_filter_strategy import PruningContentFilter
@@ -17,6 +18,7 @@ from rag_search.scraping.extraction_result import ExtractionResult, print_extrac
 from rag_search.scraping.quality_scorer import QualityImprover
 from rag_search.scraping.strategy_factory import StrategyFactory
 from rag_search.utils.logging import log_error, log_info
+from rag_search.utils.tracing import span
 
 
 class MarkdownChunking(ChunkingStrategy):
@@ -105,6 +107,8 @@ class WebScraper:
         self.enable_quality_model = enable_quality_model
         self.quality_improver = quality_improver
         self.min_quality_score = min_quality_score
+        # PipelineMetrics set by the pipeline, records per-strategy latency and failures
+        self.metrics = None
         # Validate strategies
         valid_strategies = {'markdown_llm', 'html_llm', 'fit_markdown_llm', 'css', 'xpath', 'no_extraction', 'lukas'}
         invalid_strategies = set(self.strategies) - valid_strategies
@@ -146,11 +150,18 @@ class WebScraper:
         Args:
             url: Target URL to scrape
         """
+        with span("scrape.url", url=url):
+            return await self._scrape(url)
+    
+    async def _scrape(self, url: str) -> Dict[str, ExtractionResult]:
         # Handle Wikipedia URLs
         if 'wikipedia.org/wiki/' in url:
             from rag_search.scraping.utils import get_wikipedia_content
             try:
+                start = time.perf_counter()
                 content = get_wikipedia_content(url)
+                if self.metrics is not None:
+                    self.metrics.scrape_duration.observe(time.perf_counter() - start, strategy="wikipedia")
                 # Create same result for all strategies since we're using Wikipedia content
                 return {
                     strategy_name: ExtractionResult(
@@ -171,7 +182,14 @@ class WebScraper:
                 name=strategy_name,
                 strategy=self.strategy_map[strategy_name]()
             )
-            result = await self.extract(config, url)
+            start = time.perf_counter()
+            with span("scrape.extract", strategy=strategy_name) as extract_span:
+                result = await self.extract(config, url)
+                extract_span.set_attribute("success", bool(result.success and result.content))
+            if self.metrics is not None:
+                self.metrics.scrape_duration.observe(time.perf_counter() - start, strategy=strategy_name)
+                if not (result.success and result.content):
+                    self.metrics.scrape_failures.inc(strategy=strategy_name)
             results[strategy_name] = result
             
         return results
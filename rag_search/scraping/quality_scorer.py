@@ -5,6 +5,7 @@ from transformers import AutoModel, AutoTokenizer, AutoConfig
 from huggingface_hub import PyTorchModelHubMixin
 from typing import List, Tuple
 
+from rag_search.reranker.client import ScoringClient
 from rag_search.utils.logging import (
     log_operation_start, log_operation_end, log_info, 
     log_input, log_output, log_success
@@ -211,3 +212,32 @@ class QualityImprover:
             log_operation_end("PREDICTING EDUCATIONAL VALUE", "QualityImprover")
             
         return scores 
+
+
+class RemoteQualityImprover(QualityImprover):
+    """QualityImprover whose quality model runs in the shared scoring service."""
+
+    def __init__(self, url: str = "unix:///tmp/rag_search_scoring.sock", timeout: float = 30.0, verbose: bool = False):
+        # The text cleaning of QualityImprover is used as is, only the model is remote
+        self.client = ScoringClient(url, timeout=timeout)
+        self.verbose = verbose
+        self.score_dict = {
+            'Low': 0,
+            'Medium': 1,
+            'High': 2
+        }
+
+        if self.verbose:
+            log_info(f"QualityImprover using scoring service at {url}", "QualityImprover")
+
+    def predict_quality_scores(self, text_list: List[str]) -> List[float]:
+        """
+        Predict educational value scores with the scoring service's quality model.
+
+        Args:
+            text_list: List of text strings to evaluate
+
+        Returns:
+            List of quality scores (0 = low, 1 = medium, 2 = high)
+        """
+        return self.client.quality(text_list)
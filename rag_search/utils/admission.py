@@ -0,0 +1,205 @@
+import asyncio
+import heapq
+import itertools
+import math
+import time
+from contextlib import asynccontextmanager
+from enum import IntEnum
+from typing import Any, AsyncIterator, Dict, Optional
+
+class Priority(IntEnum):
+    """Scheduling priority of a request, lower values are admitted first."""
+    INTERACTIVE = 0
+    BATCH = 1
+
+    @classmethod
+    def from_name(cls, name: Optional[str]) -> "Priority":
+        """Parse a priority name such as "interactive" or "batch" (defaults to interactive)."""
+        if not name:
+            return cls.INTERACTIVE
+        try:
+            return cls[name.upper()]
+        except KeyError:
+            raise ValueError(f"Unknown priority '{name}', expected one of {[p.name.lower() for p in cls]}")
+
+class AdmissionRejected(Exception):
+    """Raised when a request cannot be admitted before its deadline."""
+
+    def __init__(self, stage: str, retry_after: float):
+        self.stage = stage
+        self.retry_after = retry_after
+        super().__init__(f"Stage '{stage}' is overloaded, retry after {retry_after:.1f}s")
+
+    @property
+    def retry_after_header(self) -> str:
+        """Retry-After value in whole seconds."""
+        return str(max(1, math.ceil(self.retry_after)))
+
+class StageLimiter:
+    """Concurrency limit for one pipeline stage with a priority queue of waiters."""
+
+    def __init__(self, name: str, max_concurrent: int, smoothing: float = 0.2):
+        """
+        Initialize the limiter.
+
+        Args:
+            name: Stage name, used in errors and stats
+            max_concurrent: Maximum number of requests executing the stage at once
+            smoothing: Weight of the newest sample in the moving averages
+        """
+        self.name = name
+        self.max_concurrent = max_concurrent
+        self.smoothing = smoothing
+        self.active = 0
+        self._waiters: list = []  # heap of (priority, sequence, future)
+        self._sequence = itertools.count()
+        self.avg_service_time: Optional[float] = None
+        self.avg_wait_time = 0.0
+        self.max_wait_time = 0.0
+        self.admitted = 0
+        self.rejected = 0
+
+    @property
+    def queued(self) -> int:
+        """Number of requests waiting for a slot."""
+        return sum(1 for _, _, future in self._waiters if not future.done())
+
+    def _average(self, current: Optional[float], sample: float) -> float:
+        if current is None:
+            return sample
+        return (1 - self.smoothing) * current + self.smoothing * sample
+
+    def estimate_wait(self, priority: Priority = Priority.INTERACTIVE) -> float:
+        """Estimate how long a request of the given priority would wait for a slot."""
+        if self.active < self.max_concurrent and self.queued == 0:
+            return 0.0
+        ahead = sum(1 for p, _, future in self._waiters if p <= priority and not future.done())
+        # Every max_concurrent requests ahead of us take about one service time
+        return (ahead // self.max_concurrent + 1) * (self.avg_service_time or 0.0)
+
+    async def acquire(self, priority: Priority = Priority.INTERACTIVE, deadline: Optional[float] = None):
+        """
+        Wait for a slot.
+
+        Args:
+            priority: Priority of the request
+            deadline: time.monotonic() value by which the request must be admitted (None waits forever)
+
+        Raises:
+            AdmissionRejected: If the estimated or actual wait exceeds the deadline
+        """
+        start = time.monotonic()
+        if self.active < self.max_concurrent and self.queued == 0:
+            self.active += 1
+            self._record_admission(0.0)
+            return
+
+        if deadline is not None:
+            estimate = self.estimate_wait(priority)
+            if start + estimate > deadline:
+                self.rejected += 1
+                raise AdmissionRejected(self.name, estimate)
+
+        future = asyncio.get_running_loop().create_future()
+        heapq.heappush(self._waiters, (priority, next(self._sequence), future))
+        timeout = None if deadline is None else max(0.0, deadline - time.monotonic())
+        try:
+            await asyncio.wait_for(future, timeout)
+        except BaseException as e:
+            if future.done() and not future.cancelled():
+                # The slot was handed over just as we gave up, pass it on
+                self.release()
+            else:
+                future.cancel()
+            if isinstance(e, asyncio.TimeoutError):
+                self.rejected += 1
+                raise AdmissionRejected(self.name, self.estimate_wait(priority)) from None
+            raise
+        self._record_admission(time.monotonic() - start)
+
+    def _record_admission(self, wait_time: float):
+        self.admitted += 1
+        self.avg_wait_time = self._average(self.avg_wait_time, wait_time)
+        self.max_wait_time = max(self.max_wait_time, wait_time)
+
+    def release(self, service_time: Optional[float] = None):
+        """Give the slot to the next waiter, or free it if nobody is waiting."""
+        if service_time is not None:
+            self.avg_service_time = self._average(self.avg_service_time, service_time)
+        while self._waiters:
+            _, _, future = heapq.heappop(self._waiters)
+            if not future.done():
+                # Hand the slot over directly so newcomers cannot overtake the queue
+                future.set_result(None)
+                return
+        self.active -= 1
+
+    def stats(self) -> Dict[str, Any]:
+        """Current queue depth, wait and service times of the stage."""
+        return {
+            "max_concurrent": self.max_concurrent,
+            "active": self.active,
+            "queued": self.queued,
+            "admitted": self.admitted,
+            "rejected": self.rejected,
+            "avg_wait_time": self.avg_wait_time,
+            "max_wait_time": self.max_wait_time,
+            "avg_service_time": self.avg_service_time
+        }
+
+class AdmissionController:
+    """Caps concurrent executions of expensive pipeline stages and queues the excess by priority."""
+
+    def __init__(self, limits: Dict[str, int]):
+        """
+        Initialize the controller.
+
+        Args:
+            limits: Maximum concurrent executions per stage name (e.g. scraping, reranking, llm);
+                stages without a limit are not restricted
+        """
+        self.limiters = {
+            stage: StageLimiter(stage, max_concurrent)
+            for stage, max_concurrent in limits.items()
+            if max_concurrent
+        }
+
+    @asynccontextmanager
+    async def slot(
+        self,
+        stage: str,
+        priority: Priority = Priority.INTERACTIVE,
+        deadline: Optional[float] = None
+    ) -> AsyncIterator[None]:
+        """Hold a slot of stage for the duration of the block."""
+        limiter = self.limiters.get(stage)
+        if limiter is None:
+            yield
+            return
+
+        await limiter.acquire(priority, deadline)
+        start = time.monotonic()
+        try:
+            yield
+        finally:
+            limiter.release(time.monotonic() - start)
+
+    def check(self, priority: Priority = Priority.INTERACTIVE, deadline: Optional[float] = None):
+        """
+        Reject a request upfront if queueing through all stages would exceed its deadline.
+
+        Raises:
+            AdmissionRejected: If the estimated total wait exceeds the deadline
+        """
+        if deadline is None:
+            return
+        waits = {stage: limiter.estimate_wait(priority) for stage, limiter in self.limiters.items()}
+        total_wait = sum(waits.values())
+        if time.monotonic() + total_wait > deadline:
+            bottleneck = max(waits, key=waits.get)
+            self.limiters[bottleneck].rejected += 1
+            raise AdmissionRejected(bottleneck, total_wait)
+
+    def stats(self) -> Dict[str, Dict[str, Any]]:
+        """Queue depth and wait times per stage."""
+        return {stage: limiter.stats() for stage, limiter in self.limiters.items()}
@@ -1,8 +1,77 @@
 import asyncio
-from typing import Any, Awaitable, List, TypeVar
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
+from typing import (
+    Any, AsyncIterator, Awaitable, Callable, Dict, Generic, Hashable,
+    List, Optional, Sequence, Tuple, TypeVar
+)
 
 T = TypeVar('T')
 
+def create_executor(kind: str = "thread", max_workers: Optional[int] = None) -> Optional[Executor]:
+    """
+    Create the executor of CPU-bound pipeline stages.
+    
+    Args:
+        kind: "thread" (keeps the event loop free, shares memory), "process" (runs
+            on several cores, arguments and results are pickled) or "none" (runs
+            on the calling thread)
+        max_workers: Number of workers, the executor's default if None
+        
+    Returns:
+        The executor, None for "none"
+    """
+    if kind == "none":
+        return None
+    if kind == "thread":
+        return ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="rag-cpu")
+    if kind == "process":
+        return ProcessPoolExecutor(max_workers=max_workers)
+    raise ValueError(f"Unknown executor kind: {kind}")
+
+async def run_in_executor(executor: Optional[Executor], fn: Callable[..., T], *args: Any) -> T:
+    """Run a blocking function in the executor, or directly if there is none."""
+    if executor is None:
+        return fn(*args)
+    return await asyncio.get_running_loop().run_in_executor(executor, fn, *args)
+
+async def map_as_completed(
+    executor: Optional[Executor],
+    fn: Callable[[Any], T],
+    items: Sequence[Any]
+) -> AsyncIterator[Tuple[int, T]]:
+    """
+    Apply a blocking function to every item in the executor.
+    
+    Args:
+        executor: Executor to run in, items are processed one by one on the
+            calling thread if None
+        fn: Blocking function of one item
+        items: Items to process
+        
+    Yields:
+        (index of the item, result) as soon as each item is done
+    """
+    if executor is None:
+        for index, item in enumerate(items):
+            yield index, fn(item)
+            # Let other requests run between items
+            await asyncio.sleep(0)
+        return
+    
+    loop = asyncio.get_running_loop()
+    
+    async def run(index: int, item: Any) -> Tuple[int, T]:
+        return index, await loop.run_in_executor(executor, fn, item)
+    
+    tasks = [asyncio.ensure_future(run(index, item)) for index, item in enumerate(items)]
+    try:
+        for next_done in asyncio.as_completed(tasks):
+            yield await next_done
+    finally:
+        # Items not started yet are dropped if the caller stops early
+        for task in tasks:
+            task.cancel()
+
 async def gather_with_concurrency(n: int, *tasks: Awaitable[T]) -> List[T]:
     """
     Run tasks with a concurrency limit.
@@ -55,3 +124,264 @@ class RateLimiter:
         
     async def __aexit__(self, exc_type, exc_val, exc_tb):
         pass
+
+
+class StreamCancelled(Exception):
+    """The source of a shared stream was cancelled before it was exhausted."""
+
+class BroadcastStream(Generic[T]):
+    """Consumes one async iterator and replays its items to any number of subscribers.
+    
+    Late subscribers first receive everything produced so far. When the last
+    subscriber leaves before the source is exhausted, the source is cancelled;
+    subscribers still attached at that point get StreamCancelled instead of a
+    silently truncated stream.
+    """
+    
+    def __init__(self, source: AsyncIterator[T], on_cancel: Optional[Callable[[], None]] = None):
+        """
+        Start consuming the source.
+        
+        Args:
+            source: Iterator whose items are broadcast
+            on_cancel: Called right before the source is cancelled, so no new
+                subscriber can attach to a stream that is going away
+        """
+        self._items: List[T] = []
+        self._done = False
+        self._error: Optional[BaseException] = None
+        self._subscribers = 0
+        self._on_cancel = on_cancel
+        self._condition = asyncio.Condition()
+        self._task = asyncio.ensure_future(self._pump(source))
+    
+    @property
+    def task(self) -> "asyncio.Future[None]":
+        return self._task
+    
+    async def _pump(self, source: AsyncIterator[T]):
+        try:
+            async for item in source:
+                async with self._condition:
+                    self._items.append(item)
+                    self._condition.notify_all()
+        except asyncio.CancelledError:
+            self._error = StreamCancelled("Shared stream was cancelled before it finished")
+            raise
+        except Exception as e:
+            self._error = e
+        finally:
+            # Close the source explicitly so cancellation reaches it right away
+            aclose = getattr(source, "aclose", None)
+            if aclose is not None:
+                await aclose()
+            async with self._condition:
+                self._done = True
+                self._condition.notify_all()
+    
+    def subscribe(self) -> "_Subscription[T]":
+        """
+        Iterator over all items of the source, from the first one.
+        
+        The subscriber is counted from this call on, not from its first iteration,
+        so the source stays alive for a subscriber that has not started reading yet.
+        The iterator must be exhausted or closed with aclose() to release it.
+        """
+        return _Subscription(self)
+    
+    def _release(self):
+        self._subscribers -= 1
+        if self._subscribers == 0 and not self._task.done():
+            if self._on_cancel is not None:
+                self._on_cancel()
+            self._task.cancel()
+    
+    async def _iterate(self) -> AsyncIterator[T]:
+        position = 0
+        while True:
+            async with self._condition:
+                await self._condition.wait_for(lambda: position < len(self._items) or self._done)
+                items = self._items[position:]
+                done = self._done
+            position += len(items)
+            for item in items:
+                yield item
+            if done and position >= len(self._items):
+                if self._error is not None:
+                    raise self._error
+                return
+
+class _Subscription(Generic[T]):
+    """Subscriber of a BroadcastStream, holding its slot from creation until it is closed."""
+    
+    def __init__(self, broadcast: BroadcastStream):
+        self._broadcast = broadcast
+        self._iterator: Optional[AsyncIterator[T]] = None
+        self._released = False
+        broadcast._subscribers += 1
+    
+    def __aiter__(self) -> "_Subscription[T]":
+        return self
+    
+    async def __anext__(self) -> T:
+        if self._released:
+            raise StopAsyncIteration
+        if self._iterator is None:
+            self._iterator = self._broadcast._iterate()
+        try:
+            return await self._iterator.__anext__()
+        except BaseException:
+            await self.aclose()
+            raise
+    
+    async def aclose(self):
+        """Stop receiving items, cancelling the source if this was the last subscriber."""
+        if self._released:
+            return
+        self._released = True
+        if self._iterator is not None:
+            await self._iterator.aclose()
+        self._broadcast._release()
+
+class SingleFlight:
+    """Coalesces concurrent calls that share a key into a single execution.
+    
+    The first caller starts the work, callers arriving while it is in flight
+    wait for the same result. The work runs in its own task, so a caller that
+    is cancelled does not cancel it for the others.
+    """
+    
+    def __init__(self):
+        self._calls: Dict[Hashable, "asyncio.Future[Any]"] = {}
+        self._streams: Dict[Hashable, BroadcastStream] = {}
+    
+    def _forget(self, registry: Dict[Hashable, Any], key: Hashable, value: Any):
+        if registry.get(key) is value:
+            del registry[key]
+    
+    async def do(self, key: Hashable, fn: Callable[[], Awaitable[T]]) -> Tuple[T, bool]:
+        """
+        Run fn once for all concurrent callers with the same key.
+        
+        Args:
+            key: Identifies identical requests
+            fn: Coroutine function doing the work
+            
+        Returns:
+            Tuple of (result, shared) where shared is True if the result came
+            from a call started by another caller
+        """
+        task = self._calls.get(key)
+        shared = task is not None
+        if task is None:
+            task = asyncio.ensure_future(fn())
+            self._calls[key] = task
+            task.add_done_callback(lambda t: self._forget(self._calls, key, t))
+        return await asyncio.shield(task), shared
+    
+    def stream(self, key: Hashable, factory: Callable[[], AsyncIterator[T]]) -> Tuple[AsyncIterator[T], bool]:
+        """
+        Share one async iterator between all concurrent callers with the same key.
+        
+        Args:
+            key: Identifies identical requests
+            factory: Creates the source iterator if no identical stream is in flight
+            
+        Returns:
+            Tuple of (iterator over all items, shared)
+        """
+        broadcast = self._streams.get(key)
+        shared = broadcast is not None
+        if broadcast is None:
+            broadcast = BroadcastStream(factory(), on_cancel=lambda: self._forget(self._streams, key, broadcast))
+            self._streams[key] = broadcast
+            broadcast.task.add_done_callback(lambda t: self._forget(self._streams, key, broadcast))
+        # Subscribed right away, the caller holds its slot before it starts iterating
+        return broadcast.subscribe(), shared
+    
+    def in_flight(self) -> int:
+        """Number of distinct calls and streams currently running."""
+        return len(self._calls) + len(self._streams)
+
+class MicroBatcher(Generic[T]):
+    """Merges items submitted by concurrent callers into batches for one blocking function.
+    
+    A batch is flushed when it holds max_batch_size items or max_wait seconds after its
+    first item arrived. Batches run one at a time in a worker thread, so a single model
+    serves all callers while the event loop stays responsive.
+    """
+    
+    def __init__(
+        self,
+        process: Callable[[List[Any]], List[T]],
+        max_batch_size: int = 256,
+        max_wait: float = 0.005
+    ):
+        """
+        Initialize the batcher.
+        
+        Args:
+            process: Blocking function mapping a list of items to a list of results
+            max_batch_size: Items after which a batch is flushed immediately
+            max_wait: Seconds a batch waits for more items after its first one
+        """
+        self.process = process
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait
+        self._queue: Optional[asyncio.Queue] = None
+        self._worker: Optional[asyncio.Task] = None
+        self.batches = 0
+        self.items = 0
+    
+    async def submit(self, items: List[Any]) -> List[T]:
+        """Process items as part of the next batch and return their results in order."""
+        if not items:
+            return []
+        if self._worker is None or self._worker.done():
+            self._queue = asyncio.Queue()
+            self._worker = asyncio.create_task(self._run())
+        future = asyncio.get_running_loop().create_future()
+        await self._queue.put((items, future))
+        return await future
+    
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            requests = [await self._queue.get()]
+            size = len(requests[0][0])
+            deadline = loop.time() + self.max_wait
+            while size < self.max_batch_size:
+                timeout = deadline - loop.time()
+                if timeout <= 0:
+                    break
+                try:
+                    request = await asyncio.wait_for(self._queue.get(), timeout)
+                except asyncio.TimeoutError:
+                    break
+                requests.append(request)
+                size += len(request[0])
+            
+            batch = [item for items, _ in requests for item in items]
+            try:
+                results = await asyncio.to_thread(self.process, batch)
+            except Exception as e:
+                for _, future in requests:
+                    if not future.done():
+                        future.set_exception(e)
+                continue
+            
+            self.batches += 1
+            self.items += len(batch)
+            offset = 0
+            for items, future in requests:
+                if not future.done():
+                    future.set_result(results[offset:offset + len(items)])
+                offset += len(items)
+    
+    def stats(self) -> Dict[str, Any]:
+        """Number of batches and items processed and the resulting mean batch size."""
+        return {
+            "batches": self.batches,
+            "items": self.items,
+            "mean_batch_size": self.items / self.batches if self.batches else 0.0
+        }
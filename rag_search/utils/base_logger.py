@@ -1,6 +1,8 @@
 from typing import Any, Dict, Optional
 from abc import ABC
 
+from rag_search.utils.pipeline_logger import current_logger
+
 class BaseLogger(ABC):
     """Base logger class for RAG components."""
     
@@ -8,11 +10,15 @@ class BaseLogger(ABC):
         """Initialize the base logger.
         
         Args:
-            pipeline_logger: Optional PipelineLogger instance to use
+            pipeline_logger: Optional PipelineLogger instance to use; without one entries go
+                to the logger of the current request (see pipeline_logger.logging_to)
             component_name: Name of the component for logging
         """
         self.pipeline_logger = pipeline_logger
         self.component_name = component_name or self.__class__.__name__
+    
+    def _logger(self):
+        return self.pipeline_logger or current_logger()
         
     def log(self, operation: str, data: Dict[str, Any], status: str = "info"):
         """Log an operation with the pipeline logger if available.
@@ -22,9 +28,10 @@ class BaseLogger(ABC):
             data: Data to log
             status: Status of the operation
         """
-        if self.pipeline_logger:
+        logger = self._logger()
+        if logger:
             stage = f"{self.component_name}.{operation}"
-            self.pipeline_logger.log(stage, data, status)
+            logger.log(stage, data, status)
             
     def log_error(self, operation: str, error: Exception, additional_data: Optional[Dict[str, Any]] = None):
         """Log an error with the pipeline logger if available.
@@ -34,6 +41,7 @@ class BaseLogger(ABC):
             error: The exception that was raised
             additional_data: Any additional context about the error
         """
-        if self.pipeline_logger:
+        logger = self._logger()
+        if logger:
             stage = f"{self.component_name}.{operation}"
-            self.pipeline_logger.log_error(stage, error, additional_data) 
\ No newline at end of file
+            logger.log_error(stage, error, additional_data) 
\ No newline at end of file
@@ -0,0 +1,39 @@
+from typing import List, Optional, Sequence
+
+def length_bucketed_batches(
+    lengths: Sequence[int],
+    max_batch_tokens: int,
+    max_batch_size: Optional[int] = None
+) -> List[List[int]]:
+    """
+    Group items of similar length into batches bounded by their padded token count.
+
+    Items are sorted by length (longest first, so memory peaks show up in the first
+    batch) and a batch grows while its size times its longest item stays within
+    max_batch_tokens. Callers scatter the results back by the returned indices.
+
+    Args:
+        lengths: Token length of every item, after truncation
+        max_batch_tokens: Maximum padded tokens (batch size * longest item) per batch
+        max_batch_size: Optional maximum number of items per batch
+
+    Returns:
+        Batches as lists of indices into lengths; every index appears exactly once
+    """
+    order = sorted(range(len(lengths)), key=lambda i: lengths[i], reverse=True)
+    batches: List[List[int]] = []
+    batch: List[int] = []
+    batch_max = 0
+    for index in order:
+        # Sorted descending, so the first item of a batch is its longest
+        longest = batch_max if batch else max(lengths[index], 1)
+        full = max_batch_size is not None and len(batch) >= max_batch_size
+        if batch and (full or (len(batch) + 1) * longest > max_batch_tokens):
+            batches.append(batch)
+            batch = []
+            longest = max(lengths[index], 1)
+        batch.append(index)
+        batch_max = longest
+    if batch:
+        batches.append(batch)
+    return batches
@@ -1,4 +1,4 @@
-from typing import Any, Dict, List, Optional
+from typing import Any, Callable, Dict, List, Optional, Union
 from termcolor import colored
 import sys
 import os
@@ -6,6 +6,7 @@ import os
 COMPONENT_COLORS = {
     "QueryEnhancer": "cyan",
     "LLMQueryEnhancer": "cyan",
+    "QueryRouter": "cyan",
     "SearXNGProvider": "yellow",
     "WebScraper": "magenta",
     "Chunker": "blue",
@@ -22,9 +23,57 @@ COMPONENT_COLORS = {
     "QualityImprover": "light_yellow"
 }
 
-#load env variables
-verbose = os.getenv("VERBOSE", "True")
-verbose = True if verbose == "True" else False
+# Console log levels; OFF silences a component entirely
+DEBUG = 10
+INFO = 20
+WARNING = 30
+ERROR = 40
+OFF = 100
+
+LEVEL_NAMES = {"debug": DEBUG, "info": INFO, "warning": WARNING, "error": ERROR, "off": OFF}
+
+# VERBOSE=True prints everything, otherwise (also when unset) nothing is printed until a level is set
+_default_level = DEBUG if os.getenv("VERBOSE", "False") == "True" else OFF
+_component_levels: Dict[str, int] = {}
+
+def _parse_level(level: Union[int, str]) -> int:
+    return LEVEL_NAMES[level.lower()] if isinstance(level, str) else level
+
+def set_level(level: Union[int, str], component: Optional[str] = None):
+    """Set the console log level of one component, or the default of all others.
+    
+    Args:
+        level: Level number or name ("debug", "info", "warning", "error", "off")
+        component: Component name such as "JinaAI", None for the default level
+    """
+    global _default_level
+    if component is None:
+        _default_level = _parse_level(level)
+    else:
+        _component_levels[component] = _parse_level(level)
+
+def reset_level(component: str):
+    """Make a component follow the default level again."""
+    _component_levels.pop(component, None)
+
+def configure_levels(levels: Dict[str, Union[int, str]]):
+    """Apply a mapping of component names to levels; the "default" key sets the default level."""
+    for component, level in levels.items():
+        set_level(level, None if component == "default" else component)
+
+def is_verbose() -> bool:
+    """Whether components print anything by default, i.e. the default level is not off."""
+    return _default_level < OFF
+
+def is_enabled(component: str, level: int = INFO) -> bool:
+    """Cheap check whether a component logs at level, guard expensive log arguments with it."""
+    return level >= _component_levels.get(component, _default_level)
+
+def _format(message: Union[str, Callable[[], str]], args: tuple) -> str:
+    """Build a message only once it is known to be printed."""
+    if callable(message):
+        return message()
+    return message % args if args else message
 
 def get_component_color(component: str) -> str:
     """Get color for a component, with fallback to white"""
@@ -32,115 +81,103 @@ def get_component_color(component: str) -> str:
 
 def log_operation_start(title: str, component: str):
     """Log the start of an operation with a colored banner."""
-    color = get_component_color(component)
-    if verbose:
-        print(colored(f"\n▶ {title} [{component}]", color, attrs=["bold"]))
+    if is_enabled(component, INFO):
+        print(colored(f"\n▶ {title} [{component}]", get_component_color(component), attrs=["bold"]))
 
 def log_operation_end(title: str, component: str):
     """Log the end of an operation with a colored banner."""
-    color = get_component_color(component)
-    if verbose:
-        print(colored(f"✓ {title} DONE [{component}]", color, attrs=["bold"]))
+    if is_enabled(component, INFO):
+        print(colored(f"✓ {title} DONE [{component}]", get_component_color(component), attrs=["bold"]))
 
-def log_info(message: str, component: str):
-    """Log general information."""
-    color = get_component_color(component)
-    if verbose:
-        print(colored(f"  [{component}] {message}", color))
+def log_info(message: Union[str, Callable[[], str]], component: str, *args: Any):
+    """Log general information.
+    
+    The message is formatted lazily: pass %-style args, or a callable returning the message.
+    """
+    if is_enabled(component, INFO):
+        print(colored(f"  [{component}] {_format(message, args)}", get_component_color(component)))
+
+def log_debug(message: Union[str, Callable[[], str]], component: str, *args: Any):
+    """Log detailed information that is only useful when debugging, formatted lazily like log_info."""
+    if is_enabled(component, DEBUG):
+        print(colored(f"  [{component}] {_format(message, args)}", get_component_color(component)))
 
 def log_data(key: str, value: Any, component: str):
     """Log a data key-value pair."""
-    color = get_component_color(component)
-    if isinstance(value, list):
-        value_str = str(value)
-    elif isinstance(value, dict):
-        value_str = str(value)
-    else:
-        value_str = str(value)
-    
-    print(colored(f"  [{component}] {key}: {value_str}", color))
+    if is_enabled(component, INFO):
+        print(colored(f"  [{component}] {key}: {value}", get_component_color(component)))
 
 def log_input(data: Any, component: str):
     """Log input data with a specific format."""
-    color = get_component_color(component)
-    if isinstance(data, str):
-        data_str = data
-    else:
-        data_str = str(data)
-    if verbose:
-        print(colored(f"  [{component}] INPUT: {data_str}", color, attrs=["bold"]))
+    if is_enabled(component, INFO):
+        print(colored(f"  [{component}] INPUT: {data}", get_component_color(component), attrs=["bold"]))
 
 def log_output(data: Any, component: str):
     """Log output data with a specific format."""
-    color = get_component_color(component)
-    if isinstance(data, str):
-        data_str = data
-    elif isinstance(data, list):
-        data_str = str(data)
-    else:
-        data_str = str(data)
-    if verbose:
-        print(colored(f"  [{component}] OUTPUT: {data_str}", color, attrs=["bold"]))
+    if is_enabled(component, INFO):
+        print(colored(f"  [{component}] OUTPUT: {data}", get_component_color(component), attrs=["bold"]))
 
 def log_error(message: str, component: str, error: Optional[Exception] = None):
     """Log error information."""
-    if verbose:
+    if is_enabled(component, ERROR):
         print(colored(f"\n❌ [{component}] ERROR: {message}", "red", attrs=["bold"]))
         if error:
             print(colored(f"  Details: {str(error)}", "red"))
 
 def log_success(message: str, component: str):
     """Log success information."""
-    color = get_component_color(component)
-    if verbose:
-        print(colored(f"  [{component}] ✓ {message}", color))
+    if is_enabled(component, INFO):
+        print(colored(f"  [{component}] ✓ {message}", get_component_color(component)))
 
 def log_warning(message: str, component: str):
     """Log warning information."""
-    if verbose:
+    if is_enabled(component, WARNING):
         print(colored(f"  [{component}] ⚠️ {message}", "yellow"))
 
 def log_search_results(results: Dict[str, Any], component: str):
     """Log search results in a structured way."""
+    if not is_enabled(component, INFO):
+        return
     color = get_component_color(component)
     organic_count = len(results.get("organic", []))
-    if verbose:
-        print(colored(f"  [{component}] FOUND: {organic_count} results", color, attrs=["bold"]))
+    print(colored(f"  [{component}] FOUND: {organic_count} results", color, attrs=["bold"]))
     
     # Display all results without truncation
-    for i, result in enumerate(results.get("organic", [])):
-        if verbose:
+    if is_enabled(component, DEBUG):
+        for i, result in enumerate(results.get("organic", [])):
             print(colored(f"  [{component}] #{i+1}: {result.get('title', 'No title')}", color))
             print(colored(f"        URL: {result.get('link', 'No link')}", "white"))
             print(colored(f"        Snippet: {result.get('snippet', 'No snippet')}", "white"))
 
 def log_embedding_operation(texts_count: int, component: str, dim: Optional[int] = None):
     """Log embedding operation."""
+    if not is_enabled(component, INFO):
+        return
     color = get_component_color(component)
     if dim:
-        if verbose:
-            print(colored(f"  [{component}] EMBEDDING: {texts_count} texts with dimension {dim}", color, attrs=["bold"]))
+        print(colored(f"  [{component}] EMBEDDING: {texts_count} texts with dimension {dim}", color, attrs=["bold"]))
     else:
-        if verbose:
-            print(colored(f"  [{component}] EMBEDDING: {texts_count} texts", color, attrs=["bold"]))
+        print(colored(f"  [{component}] EMBEDDING: {texts_count} texts", color, attrs=["bold"]))
 
 def log_chunks(chunks: List[Dict[str, Any]], component: str, max_display: int = None):
     """Log chunks in a structured way."""
+    if not is_enabled(component, INFO):
+        return
     color = get_component_color(component)
-    if verbose:
-        print(colored(f"  [{component}] CHUNKS: {len(chunks)} total", color, attrs=["bold"]))
+    print(colored(f"  [{component}] CHUNKS: {len(chunks)} total", color, attrs=["bold"]))
     
-    # Display all chunks without limiting to max_display
-    for i, chunk in enumerate(chunks):
+    # Chunk contents are large, only print them when debugging
+    if not is_enabled(component, DEBUG):
+        return
+    for i, chunk in enumerate(chunks[:max_display] if max_display else chunks):
         content = chunk.get("content", "")
         url = chunk.get("url", chunk.get("metadata", {}).get("url", "Unknown source"))
         similarity = chunk.get("similarity", None)
         
-        if verbose:
-            print(colored(f"  [{component}] Chunk #{i+1}: {content}", color))
-            print(colored(f"        Source: {url}", "white"))
-            if similarity is not None:
-                print(colored(f"        Relevance: {similarity:.4f}", "white"))
+        print(colored(f"  [{component}] Chunk #{i+1}: {content}", color))
+        print(colored(f"        Source: {url}", "white"))
+        if similarity is not None:
+            print(colored(f"        Relevance: {similarity:.4f}", "white"))
 
 def log_stream_chunk(chunk: str, component: str, is_first: bool = False, is_last: bool = False):
     """Log a streaming chunk with visual indicators for stream progress.
@@ -0,0 +1,197 @@
+import threading
+import time
+from contextlib import contextmanager
+from typing import Dict, Iterator, List, Optional, Sequence, Tuple
+
+# Latency buckets in seconds, from fast in-process stages up to slow scrapes and LLM calls
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+def _format_labels(labelnames: Sequence[str], labelvalues: Tuple[str, ...], extra: str = "") -> str:
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(labelnames, labelvalues)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+def _format_value(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if not float(value).is_integer() else str(int(value))
+
+class Counter:
+    """Monotonically increasing counter with optional labels."""
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._values: Dict[Tuple[str, ...], float] = {}
+        self._lock = threading.Lock()
+
+    def inc(self, amount: float = 1.0, **labels: str):
+        """Increase the counter of the given label values by amount."""
+        key = tuple(str(labels.get(name, "")) for name in self.labelnames)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+    def value(self, **labels: str) -> float:
+        """Current value for the given label values."""
+        key = tuple(str(labels.get(name, "")) for name in self.labelnames)
+        return self._values.get(key, 0.0)
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} counter"]
+        with self._lock:
+            for key, value in sorted(self._values.items()):
+                lines.append(f"{self.name}{_format_labels(self.labelnames, key)} {_format_value(value)}")
+        return lines
+
+class Histogram:
+    """Cumulative histogram with optional labels, as used for latencies."""
+
+    def __init__(
+        self,
+        name: str,
+        documentation: str,
+        labelnames: Sequence[str] = (),
+        buckets: Sequence[float] = DEFAULT_BUCKETS
+    ):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(sorted(buckets)) + (float("inf"),)
+        # Per label values: (bucket counts, sum, count)
+        self._values: Dict[Tuple[str, ...], Tuple[List[int], float, int]] = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value: float, **labels: str):
+        """Record one observation for the given label values."""
+        key = tuple(str(labels.get(name, "")) for name in self.labelnames)
+        with self._lock:
+            counts, total, count = self._values.get(key, ([0] * len(self.buckets), 0.0, 0))
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    counts[i] += 1
+                    break
+            self._values[key] = (counts, total + value, count + 1)
+
+    @contextmanager
+    def time(self, **labels: str) -> Iterator[None]:
+        """Observe the duration of the block in seconds."""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start, **labels)
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            for key, (counts, total, count) in sorted(self._values.items()):
+                cumulative = 0
+                for bound, bucket_count in zip(self.buckets, counts):
+                    cumulative += bucket_count
+                    labels = _format_labels(self.labelnames, key, f'le="{_format_value(bound)}"')
+                    lines.append(f"{self.name}_bucket{labels} {cumulative}")
+                labels = _format_labels(self.labelnames, key)
+                lines.append(f"{self.name}_sum{labels} {_format_value(total)}")
+                lines.append(f"{self.name}_count{labels} {count}")
+        return lines
+
+class MetricsRegistry:
+    """Collection of metrics rendered together in the Prometheus text format."""
+
+    def __init__(self):
+        self._metrics: List = []
+
+    def counter(self, name: str, documentation: str, labelnames: Sequence[str] = ()) -> Counter:
+        metric = Counter(name, documentation, labelnames)
+        self._metrics.append(metric)
+        return metric
+
+    def histogram(
+        self,
+        name: str,
+        documentation: str,
+        labelnames: Sequence[str] = (),
+        buckets: Sequence[float] = DEFAULT_BUCKETS
+    ) -> Histogram:
+        metric = Histogram(name, documentation, labelnames, buckets)
+        self._metrics.append(metric)
+        return metric
+
+    def render(self) -> str:
+        """All metrics in the Prometheus text exposition format."""
+        lines = []
+        for metric in self._metrics:
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+class PipelineMetrics:
+    """Latency histograms and counters fed by the hooks in RAGSearchPipeline."""
+
+    def __init__(self, registry: Optional[MetricsRegistry] = None):
+        """
+        Initialize the pipeline metrics.
+
+        Args:
+            registry: Registry to register the metrics in, a new one is created if not given
+        """
+        self.registry = registry or MetricsRegistry()
+        self.stage_duration = self.registry.histogram(
+            "rag_stage_duration_seconds",
+            "Duration of a pipeline stage",
+            ["stage"]
+        )
+        self.scrape_duration = self.registry.histogram(
+            "rag_scrape_duration_seconds",
+            "Duration of scraping one URL with one extraction strategy",
+            ["strategy"]
+        )
+        self.llm_time_to_first_token = self.registry.histogram(
+            "rag_llm_time_to_first_token_seconds",
+            "Time until the LLM streamed the first chunk of an answer"
+        )
+        self.llm_duration = self.registry.histogram(
+            "rag_llm_duration_seconds",
+            "Total duration of generating an answer"
+        )
+        self.cache_hits = self.registry.counter(
+            "rag_cache_hits_total",
+            "Lookups served from a cache",
+            ["cache"]
+        )
+        self.cache_misses = self.registry.counter(
+            "rag_cache_misses_total",
+            "Lookups not found in a cache",
+            ["cache"]
+        )
+        self.scrape_failures = self.registry.counter(
+            "rag_scrape_failures_total",
+            "Extractions that failed or returned no content",
+            ["strategy"]
+        )
+        self.degraded_responses = self.registry.counter(
+            "rag_degraded_responses_total",
+            "Answers produced on a fallback path",
+            ["reason"]
+        )
+        self.rerank_first_stage_recall = self.registry.histogram(
+            "rag_rerank_first_stage_recall",
+            "Recall of the cascade reranker's result against the second stage ranking all candidates, per audited request",
+            buckets=(0.5, 0.6, 0.7, 0.8, 0.9, 0.95, 1.0)
+        )
+
+    def stage(self, name: str):
+        """Context manager timing one pipeline stage."""
+        return self.stage_duration.time(stage=name)
+
+    def cache_lookup(self, cache: str, hit: bool):
+        """Count a cache hit or miss."""
+        (self.cache_hits if hit else self.cache_misses).inc(cache=cache)
+
+    def render(self) -> str:
+        """Metrics in the Prometheus text exposition format."""
+        return self.registry.render()
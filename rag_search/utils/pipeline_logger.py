@@ -1,51 +1,226 @@
+import atexit
+import contextvars
+import hashlib
 import json
+import queue
+import random
+import threading
+from collections import OrderedDict, deque
+from contextlib import contextmanager
 from datetime import datetime
-from typing import Any, Dict, List
+from typing import Any, Dict, Iterator, List, Optional, Tuple
 import os
 
+# Log levels, ordered like the standard logging module
+DEBUG = 10
+INFO = 20
+WARNING = 30
+ERROR = 40
+
+LEVELS = {"debug": DEBUG, "info": INFO, "warning": WARNING, "error": ERROR}
+
+class _LogWriter:
+    """Background thread appending log files, so saving never blocks a request."""
+
+    def __init__(self, max_pending: int = 10000, name: str = "pipeline-log-writer"):
+        self.name = name
+        self._queue: "queue.Queue[Optional[Tuple[str, List[Any]]]]" = queue.Queue(maxsize=max_pending)
+        self._thread: Optional[threading.Thread] = None
+        self._lock = threading.Lock()
+        self.dropped = 0
+
+    def _ensure_started(self):
+        with self._lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._run, name=self.name, daemon=True)
+                self._thread.start()
+
+    def submit(self, path: str, records: List[Any]):
+        """Queue records to be appended to path as JSON lines (dropped if the queue is full).
+
+        Records are dicts serialized by the writer, or strings already serialized by the caller.
+        """
+        self._ensure_started()
+        try:
+            self._queue.put_nowait((path, records))
+        except queue.Full:
+            self.dropped += len(records)
+
+    def _run(self):
+        while True:
+            item = self._queue.get()
+            try:
+                if item is None:
+                    continue
+                path, records = item
+                # Serialization happens here, off the request path
+                lines = "".join(
+                    (record if isinstance(record, str) else json.dumps(record, ensure_ascii=False, default=str)) + "\n"
+                    for record in records
+                )
+                with open(path, "a", encoding="utf-8") as f:
+                    f.write(lines)
+            except Exception:
+                # Losing log lines must never take the writer down
+                pass
+            finally:
+                self._queue.task_done()
+
+    def flush(self):
+        """Block until all queued records are written."""
+        if self._thread is not None:
+            self._queue.join()
+
+_writer = _LogWriter()
+atexit.register(_writer.flush)
+
 class PipelineLogger:
-    """Logger class for the RAG pipeline that stores logs in memory and optionally saves to file."""
-    
-    def __init__(self, log_dir: str = "logs"):
+    """Logger class for the RAG pipeline that stores logs in memory and optionally saves to file.
+
+    Entries are serialized when logged, so later changes to the logged objects do not leak
+    into them, and live in a bounded ring buffer written by a background thread. Large
+    payloads (chunk contents, contexts) are stored once under a content hash with ref()
+    and referenced from entries, the payloads go to a separate file next to the log. A
+    payload stays in memory while an entry that may reference it is still in the buffer.
+    """
+
+    # Defaults for new loggers, set once from the pipeline config with configure()
+    default_level = INFO
+    default_sample_rate = 1.0
+    default_max_entries = 1000
+    default_max_payloads = 500
+
+    def __init__(
+        self,
+        log_dir: str = "logs",
+        session_id: Optional[str] = None,
+        level: Optional[int] = None,
+        sample_rate: Optional[float] = None,
+        max_entries: Optional[int] = None
+    ):
         """Initialize the logger with a directory for log files.
-        
+
         Args:
             log_dir: Directory where log files will be stored
+            session_id: Optional session identifier, keeps log files of
+                sessions started in the same second apart
+            level: Minimum level of entries that are recorded (e.g. INFO)
+            sample_rate: Fraction of requests whose entries are recorded, errors are always kept
+            max_entries: Size of the in-memory ring buffer, the oldest entries are dropped first
         """
         self.log_dir = log_dir
         self._ensure_log_dir()
         self.current_session = datetime.now().strftime("%Y%m%d_%H%M%S")
+        if session_id:
+            self.current_session = f"{self.current_session}_{session_id}"
         self.log_file = os.path.join(log_dir, f"pipeline_log_{self.current_session}.jsonl")
-        
-        # In-memory storage for logs
-        self.logs: List[Dict[str, Any]] = []
-            
+        self.payload_file = os.path.join(log_dir, f"pipeline_payloads_{self.current_session}.jsonl")
+
+        self.level = level if level is not None else self.default_level
+        self.sample_rate = sample_rate if sample_rate is not None else self.default_sample_rate
+        self._sampled = self._sample()
+
+        # In-memory storage for logs, as serialized JSON lines
+        self.logs: deque = deque(maxlen=max_entries or self.default_max_entries)
+        self._num_logged = 0
+        self._num_saved = 0
+        # payload id -> (payload, number of the entry logged after its latest ref()), oldest first
+        self._payloads: "OrderedDict[str, Tuple[str, int]]" = OrderedDict()
+        self._unsaved_payloads: List[str] = []
+
+    @classmethod
+    def configure(
+        cls,
+        level: Optional[str] = None,
+        sample_rate: Optional[float] = None,
+        max_entries: Optional[int] = None
+    ):
+        """Set the defaults of loggers created afterwards.
+
+        Args:
+            level: Minimum level name ("debug", "info", "warning", "error")
+            sample_rate: Fraction of requests whose entries are recorded
+            max_entries: Size of the in-memory ring buffer per logger
+        """
+        if level is not None:
+            cls.default_level = LEVELS[level.lower()]
+        if sample_rate is not None:
+            cls.default_sample_rate = sample_rate
+        if max_entries is not None:
+            cls.default_max_entries = max_entries
+
     def _ensure_log_dir(self):
         """Create the log directory if it doesn't exist."""
-        if not os.path.exists(self.log_dir):
-            os.makedirs(self.log_dir)
-            
-    def log(self, stage: str, data: Dict[str, Any], status: str = "info"):
+        os.makedirs(self.log_dir, exist_ok=True)
+
+    def _sample(self) -> bool:
+        return self.sample_rate >= 1.0 or random.random() < self.sample_rate
+
+    def is_enabled_for(self, level: int) -> bool:
+        """Cheap check whether an entry of level would be recorded, to skip building its data."""
+        return level >= ERROR or (self._sampled and level >= self.level)
+
+    def log(self, stage: str, data: Dict[str, Any], status: str = "info", level: Optional[int] = None):
         """Log pipeline stage information to memory.
-        
+
         Args:
             stage: Name of the pipeline stage (e.g., "search", "scraping", etc.)
             data: Dictionary containing relevant data to log
             status: Status of the operation ("info", "error", "warning")
+            level: Level of the entry, derived from status if not given
         """
+        if level is None:
+            level = LEVELS.get(status, INFO)
+        if not self.is_enabled_for(level):
+            return
+
         log_entry = {
             "timestamp": datetime.now().isoformat(),
             "stage": stage,
             "status": status,
             "data": data
         }
-        
-        # Store in memory
-        self.logs.append(log_entry)
-            
+
+        # Store a snapshot in memory
+        self.logs.append(json.dumps(log_entry, ensure_ascii=False, default=str))
+        self._num_logged += 1
+        self._evict_payloads()
+
+    def ref(self, payload: str) -> str:
+        """Store a large payload once and return its id to put in log entries instead.
+
+        Args:
+            payload: Text such as a chunk content or a built context
+
+        Returns:
+            Content hash identifying the payload in the payload file
+        """
+        payload_id = hashlib.blake2b(payload.encode("utf-8", "replace"), digest_size=8).hexdigest()
+        if payload_id not in self._payloads:
+            self._unsaved_payloads.append(payload_id)
+        # The entry referencing the payload is logged next, keep it at least as long as that entry
+        self._payloads[payload_id] = (payload, self._num_logged)
+        self._payloads.move_to_end(payload_id)
+        self._evict_payloads()
+        return payload_id
+
+    def _evict_payloads(self):
+        """Drop the oldest payloads above the limit once no buffered entry can reference them."""
+        oldest_entry = self._num_logged - len(self.logs)
+        while len(self._payloads) > self.default_max_payloads:
+            payload_id, (_, first_entry) = next(iter(self._payloads.items()))
+            if first_entry >= oldest_entry:
+                break
+            del self._payloads[payload_id]
+
+    def get_payload(self, payload_id: str) -> Optional[str]:
+        """Return a payload stored with ref(), if it is still in memory."""
+        stored = self._payloads.get(payload_id)
+        return stored[0] if stored is not None else None
+
     def log_error(self, stage: str, error: Exception, additional_data: Dict[str, Any] = None):
         """Log an error that occurred during pipeline execution.
-        
+
         Args:
             stage: Name of the pipeline stage where error occurred
             error: The exception that was raised
@@ -57,21 +232,58 @@ class PipelineLogger:
             **(additional_data or {})
         }
         self.log(stage, error_data, status="error")
-        
+
     def get_logs(self) -> List[Dict[str, Any]]:
         """Get all logs stored in memory.
-        
+
         Returns:
             List of log entries
         """
-        return self.logs
-        
+        return [json.loads(line) for line in self.logs]
+
     def save_logs(self):
-        """Save all logs to file."""
-        with open(self.log_file, "w") as f:
-            for log_entry in self.logs:
-                f.write(json.dumps(log_entry) + "\n")
-                
+        """Hand the entries logged since the last save to the background writer."""
+        unsaved = min(self._num_logged - self._num_saved, len(self.logs))
+        if unsaved > 0:
+            _writer.submit(self.log_file, list(self.logs)[-unsaved:])
+        self._num_saved = self._num_logged
+
+        if self._unsaved_payloads:
+            payloads = [
+                {"id": payload_id, "content": self._payloads[payload_id][0]}
+                for payload_id in self._unsaved_payloads
+                if payload_id in self._payloads
+            ]
+            _writer.submit(self.payload_file, payloads)
+            self._unsaved_payloads = []
+
+    def flush(self):
+        """Block until everything saved so far has been written to disk."""
+        _writer.flush()
+
     def clear_logs(self):
-        """Clear all logs from memory."""
-        self.logs = [] 
\ No newline at end of file
+        """Clear all logs from memory; the next request is sampled anew."""
+        self.logs.clear()
+        self._num_logged = 0
+        self._num_saved = 0
+        self._payloads.clear()
+        self._unsaved_payloads = []
+        self._sampled = self._sample()
+
+# Logger of the session whose request is running, for components shared by all sessions
+_current_logger: contextvars.ContextVar[Optional[PipelineLogger]] = contextvars.ContextVar(
+    "rag_search_pipeline_logger", default=None
+)
+
+def current_logger() -> Optional[PipelineLogger]:
+    """The logger of the request running in this context, or None outside of one."""
+    return _current_logger.get()
+
+@contextmanager
+def logging_to(logger: PipelineLogger) -> Iterator[PipelineLogger]:
+    """Send component log entries made in this context (and threads started from it) to logger."""
+    token = _current_logger.set(logger)
+    try:
+        yield logger
+    finally:
+        _current_logger.reset(token)
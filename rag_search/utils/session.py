@@ -0,0 +1,93 @@
+import asyncio
+import uuid
+from typing import Any, Dict, List, Optional
+
+from rag_search.utils.admission import Priority
+from rag_search.utils.cache import TTLCache
+from rag_search.utils.pipeline_logger import PipelineLogger
+
+class PipelineSession:
+    """Per-conversation state of a RAGSearchPipeline run.
+    
+    The pipeline itself only holds shared, stateless components (models, clients),
+    everything that changes between requests of one conversation lives here.
+    """
+    
+    def __init__(self, session_id: Optional[str] = None, log_dir: str = "logs"):
+        """Initialize an empty session.
+        
+        Args:
+            session_id: Identifier of the session, generated if not given
+            log_dir: Directory where the session's pipeline logs are stored
+        """
+        self.session_id = session_id or str(uuid.uuid4())
+        self.logger = PipelineLogger(log_dir=log_dir, session_id=self.session_id)
+        self.conversation_history: List[Dict[str, Any]] = []
+        self.embedded_chunks: Optional[List[Dict[str, Any]]] = None
+        self.current_context: Optional[Dict[str, Any]] = None
+        # Chunks current_context was built from after packing, numbered like its sources
+        self.context_chunks: List[Dict[str, Any]] = []
+        # Serializes requests within one conversation, sessions run concurrently
+        self.lock = asyncio.Lock()
+        # Admission settings of the current request (deadline is a time.monotonic() value)
+        self.priority = Priority.INTERACTIVE
+        self.deadline: Optional[float] = None
+        # "bm25" retrieves with BM25 only and skips embedding, None uses the pipeline's retriever
+        self.retrieval_mode: Optional[str] = None
+    
+    @property
+    def is_followup(self) -> bool:
+        """Whether the next query continues an existing conversation."""
+        return len(self.conversation_history) > 0
+    
+    def copy_from(self, other: "PipelineSession"):
+        """Take over the conversation state of another session, e.g. one whose run was shared."""
+        self.conversation_history = list(other.conversation_history)
+        self.embedded_chunks = other.embedded_chunks
+        self.current_context = other.current_context
+        self.context_chunks = list(other.context_chunks)
+    
+    def clear(self):
+        """Forget the conversation history and cached content."""
+        self.conversation_history = []
+        self.embedded_chunks = None
+        self.current_context = None
+        self.context_chunks = []
+
+class SessionStore:
+    """Bounded store of pipeline sessions with LRU eviction and idle expiry."""
+    
+    def __init__(self, max_sessions: int = 1000, ttl: Optional[float] = 1800.0, log_dir: str = "logs"):
+        """Initialize the session store.
+        
+        Args:
+            max_sessions: Maximum number of sessions kept, least recently used are evicted
+            ttl: Seconds since last use after which a session expires
+            log_dir: Directory where new sessions store their pipeline logs
+        """
+        self.log_dir = log_dir
+        self._sessions = TTLCache(max_size=max_sessions, ttl=ttl)
+    
+    def get_or_create(self, session_id: Optional[str] = None) -> PipelineSession:
+        """Return the session with session_id, creating a new one if it is unknown or expired."""
+        if session_id:
+            session = self._sessions.get(session_id)
+            if session is not None:
+                # Refresh the expiry on every use
+                self._sessions.set(session_id, session)
+                return session
+        
+        session = PipelineSession(session_id=session_id, log_dir=self.log_dir)
+        self._sessions.set(session.session_id, session)
+        return session
+    
+    def get(self, session_id: str) -> Optional[PipelineSession]:
+        """Return the session with session_id, or None if it is unknown or expired."""
+        return self._sessions.get(session_id)
+    
+    def delete(self, session_id: str):
+        """Drop a session."""
+        self._sessions.pop(session_id)
+    
+    def __len__(self) -> int:
+        return len(self._sessions)
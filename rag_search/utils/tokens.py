@@ -0,0 +1,93 @@
+import functools
+import hashlib
+from typing import Callable, List, Tuple
+
+from rag_search.utils.cache import TTLCache
+
+# Hugging Face tokenizers of model names that do not name a repository themselves
+HF_TOKENIZERS = {
+    "nemotron": "nvidia/Llama-3.1-Nemotron-70B-Instruct-HF",
+}
+
+class TokenCounter:
+    """Token accounting for one model, caching results by content hash.
+
+    Counts are cached for many texts, token ids only for the most recent ones (they are
+    needed again when the same text is truncated right after being counted).
+    """
+
+    def __init__(self, model: str, count_cache_size: int = 100000, ids_cache_size: int = 512):
+        """
+        Initialize the counter.
+
+        Args:
+            model: Model name, selects the tokenizer (tiktoken for OpenAI models,
+                the Hugging Face tokenizer for repository ids and known aliases)
+            count_cache_size: Number of token counts kept
+            ids_cache_size: Number of token id sequences kept
+        """
+        self.model = model
+        self.name, self._encode, self._decode = self._load_tokenizer(model)
+        self._counts = TTLCache(max_size=count_cache_size, ttl=None)
+        self._ids = TTLCache(max_size=ids_cache_size, ttl=None)
+
+    @staticmethod
+    def _load_tokenizer(model: str) -> Tuple[str, Callable[[str], List[int]], Callable[[List[int]], str]]:
+        """Return (tokenizer name, encode, decode) for a model name."""
+        repo = next((repo for alias, repo in HF_TOKENIZERS.items() if alias in model.lower()), None)
+        if repo is None and "/" in model:
+            repo = model
+        if repo is not None:
+            from transformers import AutoTokenizer
+            tokenizer = AutoTokenizer.from_pretrained(repo)
+            return (
+                repo,
+                lambda text: tokenizer.encode(text, add_special_tokens=False),
+                lambda ids: tokenizer.decode(ids)
+            )
+
+        import tiktoken
+        try:
+            encoding = tiktoken.encoding_for_model(model)
+        except KeyError:
+            # Unknown names (local aliases, new models) use the GPT-4 encoding
+            encoding = tiktoken.get_encoding("cl100k_base")
+        return (
+            encoding.name,
+            lambda text: encoding.encode(text, disallowed_special=()),
+            encoding.decode
+        )
+
+    @staticmethod
+    def _key(text: str) -> bytes:
+        return hashlib.blake2b(text.encode("utf-8", "replace"), digest_size=16).digest()
+
+    def encode(self, text: str) -> List[int]:
+        """Token ids of text."""
+        key = self._key(text)
+        ids = self._ids.get(key)
+        if ids is None:
+            ids = self._encode(text)
+            self._ids.set(key, ids)
+            self._counts.set(key, len(ids))
+        return ids
+
+    def count(self, text: str) -> int:
+        """Number of tokens of text, each distinct text is tokenized only once."""
+        if not text:
+            return 0
+        count = self._counts.get(self._key(text))
+        if count is None:
+            count = len(self.encode(text))
+        return count
+
+    def truncate(self, text: str, max_tokens: int) -> str:
+        """Cut text to at most max_tokens tokens, returning it unchanged if it already fits."""
+        if self.count(text) <= max_tokens:
+            return text
+        return self._decode(self.encode(text)[:max_tokens])
+
+@functools.lru_cache(maxsize=None)
+def get_token_counter(model: str) -> TokenCounter:
+    """Shared TokenCounter of a model, so every stage reuses one tokenizer and cache."""
+    return TokenCounter(model)
@@ -0,0 +1,384 @@
+"""
+Lightweight span tracing for pipeline requests.
+
+A request opens a trace with Tracer.start_trace(); everything it calls, directly
+or in tasks and threads it spawns, can open nested spans with span() or the
+traced() decorator. Outside of a trace span() is a no-op, so components can be
+instrumented unconditionally. Finished traces are handed to an exporter
+(JSONL or OTLP/JSON file, appended by a background thread) and can be viewed with:
+
+    python -m rag_search.utils.tracing traces.jsonl                  # waterfall of the last trace
+    python -m rag_search.utils.tracing traces.jsonl --chrome out.json  # Perfetto/speedscope flamegraph
+"""
+
+import asyncio
+import atexit
+import contextvars
+import functools
+import inspect
+import json
+import os
+import time
+import uuid
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, Iterator, List, Optional
+
+from rag_search.utils.pipeline_logger import _LogWriter
+
+# Exports are serialized and written off the request path, like the pipeline logs
+_writer = _LogWriter(name="trace-writer")
+atexit.register(_writer.flush)
+
+class Span:
+    """One timed operation of a trace."""
+
+    __slots__ = (
+        "name", "trace_id", "span_id", "parent_id", "attributes",
+        "start_time", "end_time", "status", "error", "_trace_spans"
+    )
+
+    def __init__(self, name: str, trace_id: str, parent_id: Optional[str], attributes: Dict[str, Any]):
+        self.name = name
+        self.trace_id = trace_id
+        self.span_id = uuid.uuid4().hex[:16]
+        self.parent_id = parent_id
+        self.attributes = attributes
+        self.start_time = time.time_ns()
+        self.end_time: Optional[int] = None
+        self.status = "ok"
+        self.error: Optional[str] = None
+        # Shared list of all spans of the trace, exported when the root ends
+        self._trace_spans: List["Span"] = []
+
+    @property
+    def duration_ms(self) -> Optional[float]:
+        if self.end_time is None:
+            return None
+        return (self.end_time - self.start_time) / 1e6
+
+    def set_attribute(self, key: str, value: Any):
+        """Attach an attribute, e.g. a result size known only at the end of the operation."""
+        self.attributes[key] = value
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "name": self.name,
+            "trace_id": self.trace_id,
+            "span_id": self.span_id,
+            "parent_id": self.parent_id,
+            "start_time_ns": self.start_time,
+            "end_time_ns": self.end_time,
+            "duration_ms": self.duration_ms,
+            "attributes": dict(self.attributes),
+            "status": self.status,
+            "error": self.error
+        }
+
+class _NoopSpan:
+    """Stand-in yielded when no trace is active."""
+
+    def set_attribute(self, key: str, value: Any):
+        pass
+
+_NOOP_SPAN = _NoopSpan()
+_current_span: contextvars.ContextVar[Optional[Span]] = contextvars.ContextVar("rag_search_current_span", default=None)
+
+@contextmanager
+def _activate(span: Span) -> Iterator[Span]:
+    token = _current_span.set(span)
+    try:
+        yield span
+    except (GeneratorExit, asyncio.CancelledError):
+        # Closed streams and cancelled tasks are not failures
+        span.status = "cancelled"
+        raise
+    except BaseException as e:
+        span.status = "error"
+        span.error = f"{type(e).__name__}: {e}"
+        raise
+    finally:
+        span.end_time = time.time_ns()
+        try:
+            _current_span.reset(token)
+        except ValueError:
+            # Async generators can be finished from another context
+            _current_span.set(None)
+
+def current_span() -> Optional[Span]:
+    """The innermost active span, or None outside of a trace."""
+    return _current_span.get()
+
+@contextmanager
+def span(name: str, **attributes: Any) -> Iterator[Any]:
+    """
+    Time a sub-operation as a child of the current span.
+
+    Args:
+        name: Operation name, e.g. "scrape.url"
+        attributes: Attributes recorded with the span, e.g. url=...
+
+    Yields:
+        The span (or a no-op stand-in outside of a trace) to attach more attributes
+    """
+    parent = _current_span.get()
+    if parent is None:
+        yield _NOOP_SPAN
+        return
+
+    child = Span(name, parent.trace_id, parent.span_id, attributes)
+    child._trace_spans = parent._trace_spans
+    parent._trace_spans.append(child)
+    with _activate(child):
+        yield child
+
+def traced(name: Optional[str] = None) -> Callable:
+    """Decorator running a sync or async function inside a span named after it."""
+    def decorator(func: Callable) -> Callable:
+        span_name = name or func.__qualname__
+
+        if inspect.iscoroutinefunction(func):
+            @functools.wraps(func)
+            async def async_wrapper(*args, **kwargs):
+                with span(span_name):
+                    return await func(*args, **kwargs)
+            return async_wrapper
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            with span(span_name):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorator
+
+class JsonlSpanExporter:
+    """Appends every finished span as one JSON line."""
+
+    def __init__(self, path: str):
+        self.path = path
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+
+    def export(self, spans: List[Span]):
+        _writer.submit(self.path, [s.to_dict() for s in spans])
+
+    def flush(self):
+        """Block until all exported spans are written."""
+        _writer.flush()
+
+class OTLPFileExporter:
+    """Appends every finished trace as one OTLP/JSON ExportTraceServiceRequest line.
+
+    The format matches the OpenTelemetry Collector's file exporter, so the files can be
+    replayed into Jaeger, Tempo or any other OTLP backend.
+    """
+
+    def __init__(self, path: str, service_name: str = "rag_search"):
+        self.path = path
+        self.service_name = service_name
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+
+    @staticmethod
+    def _attribute(key: str, value: Any) -> Dict[str, Any]:
+        if isinstance(value, bool):
+            return {"key": key, "value": {"boolValue": value}}
+        if isinstance(value, int):
+            return {"key": key, "value": {"intValue": str(value)}}
+        if isinstance(value, float):
+            return {"key": key, "value": {"doubleValue": value}}
+        return {"key": key, "value": {"stringValue": str(value)}}
+
+    def _otlp_span(self, s: Span) -> Dict[str, Any]:
+        otlp_span = {
+            "traceId": s.trace_id,
+            "spanId": s.span_id,
+            "name": s.name,
+            "kind": 1,  # SPAN_KIND_INTERNAL
+            "startTimeUnixNano": str(s.start_time),
+            "endTimeUnixNano": str(s.end_time),
+            "attributes": [self._attribute(k, v) for k, v in s.attributes.items()],
+            "status": {"code": 2, "message": s.error} if s.status == "error" else {"code": 1}
+        }
+        if s.parent_id:
+            otlp_span["parentSpanId"] = s.parent_id
+        return otlp_span
+
+    def export(self, spans: List[Span]):
+        request = {
+            "resourceSpans": [{
+                "resource": {"attributes": [self._attribute("service.name", self.service_name)]},
+                "scopeSpans": [{
+                    "scope": {"name": "rag_search"},
+                    "spans": [self._otlp_span(s) for s in spans]
+                }]
+            }]
+        }
+        _writer.submit(self.path, [request])
+
+    def flush(self):
+        """Block until all exported traces are written."""
+        _writer.flush()
+
+class Tracer:
+    """Starts traces and hands their finished spans to an exporter."""
+
+    def __init__(self, exporter: Optional[Any] = None):
+        """
+        Initialize the tracer.
+
+        Args:
+            exporter: Object with an export(spans) method; without one tracing is disabled
+        """
+        self.exporter = exporter
+
+    @property
+    def enabled(self) -> bool:
+        return self.exporter is not None
+
+    @contextmanager
+    def start_trace(self, name: str, **attributes: Any) -> Iterator[Any]:
+        """
+        Open the root span of a request, or a child span if a trace is already active.
+
+        The trace is exported when its root span ends.
+        """
+        if _current_span.get() is not None:
+            with span(name, **attributes) as child:
+                yield child
+            return
+        if not self.enabled:
+            yield _NOOP_SPAN
+            return
+
+        root = Span(name, uuid.uuid4().hex, None, attributes)
+        root._trace_spans = [root]
+        try:
+            with _activate(root):
+                yield root
+        finally:
+            try:
+                self.exporter.export(root._trace_spans)
+            except Exception:
+                # Tracing must never fail a request
+                pass
+
+    @classmethod
+    def from_config(cls, config: Dict[str, Any]) -> "Tracer":
+        """Create a tracer from the tracing config section (enabled, format, path)."""
+        if not config.get("enabled", False):
+            return cls()
+        path = config.get("path", "logs/traces.jsonl")
+        if config.get("format", "jsonl") == "otlp":
+            return cls(OTLPFileExporter(path))
+        return cls(JsonlSpanExporter(path))
+
+def _from_otlp(request: Dict[str, Any]) -> List[Dict[str, Any]]:
+    """Convert an OTLP/JSON ExportTraceServiceRequest back to span dicts."""
+    spans = []
+    for resource_spans in request.get("resourceSpans", []):
+        for scope_spans in resource_spans.get("scopeSpans", []):
+            for s in scope_spans.get("spans", []):
+                start = int(s["startTimeUnixNano"])
+                end = int(s["endTimeUnixNano"]) if s.get("endTimeUnixNano") not in (None, "None") else None
+                status = s.get("status", {})
+                spans.append({
+                    "name": s["name"],
+                    "trace_id": s["traceId"],
+                    "span_id": s["spanId"],
+                    "parent_id": s.get("parentSpanId"),
+                    "start_time_ns": start,
+                    "end_time_ns": end,
+                    "duration_ms": (end - start) / 1e6 if end is not None else None,
+                    "attributes": {
+                        a["key"]: next(iter(a["value"].values()), None) for a in s.get("attributes", [])
+                    },
+                    "status": "error" if status.get("code") == 2 else "ok",
+                    "error": status.get("message")
+                })
+    return spans
+
+def load_spans(path: str, trace_id: Optional[str] = None) -> List[Dict[str, Any]]:
+    """Read the spans of one trace (the last one by default) from a JSONL or OTLP/JSON export."""
+    spans: List[Dict[str, Any]] = []
+    with open(path, "r", encoding="utf-8") as f:
+        for line in f:
+            if not line.strip():
+                continue
+            record = json.loads(line)
+            if "resourceSpans" in record:
+                spans.extend(_from_otlp(record))
+            else:
+                spans.append(record)
+    if not spans:
+        return []
+    trace_id = trace_id or spans[-1]["trace_id"]
+    return [s for s in spans if s["trace_id"] == trace_id]
+
+def render_waterfall(spans: List[Dict[str, Any]], width: int = 60) -> str:
+    """Render the spans of one trace as an indented text waterfall."""
+    if not spans:
+        return "No spans"
+    children: Dict[Optional[str], List[Dict[str, Any]]] = {}
+    for s in spans:
+        children.setdefault(s["parent_id"], []).append(s)
+    trace_start = min(s["start_time_ns"] for s in spans)
+    trace_end = max(s["end_time_ns"] or s["start_time_ns"] for s in spans)
+    total = max(trace_end - trace_start, 1)
+
+    lines = [f"Trace {spans[0]['trace_id']} ({total / 1e6:.1f} ms)"]
+
+    def walk(s: Dict[str, Any], depth: int):
+        offset = int((s["start_time_ns"] - trace_start) / total * width)
+        length = max(1, int(((s["end_time_ns"] or trace_end) - s["start_time_ns"]) / total * width))
+        bar = " " * offset + "█" * min(length, width - offset)
+        label = ("  " * depth + s["name"])[:40]
+        status = " !" if s.get("status") == "error" else ""
+        lines.append(f"{label:<40} |{bar:<{width}}| {s['duration_ms'] or 0:9.1f} ms{status}")
+        for child in sorted(children.get(s["span_id"], []), key=lambda c: c["start_time_ns"]):
+            walk(child, depth + 1)
+
+    span_ids = {s["span_id"] for s in spans}
+    roots = [s for s in spans if s["parent_id"] not in span_ids]
+    for root in sorted(roots, key=lambda r: r["start_time_ns"]):
+        walk(root, 0)
+    return "\n".join(lines)
+
+def to_chrome_trace(spans: List[Dict[str, Any]]) -> Dict[str, Any]:
+    """Convert spans to the Chrome trace event format (Perfetto, speedscope, chrome://tracing)."""
+    # Spans of concurrent tasks overlap, give every root-level branch its own track
+    span_by_id = {s["span_id"]: s for s in spans}
+
+    def track(s: Dict[str, Any]) -> str:
+        while s["parent_id"] in span_by_id and span_by_id[s["parent_id"]]["parent_id"] in span_by_id:
+            s = span_by_id[s["parent_id"]]
+        return s["span_id"]
+
+    return {
+        "traceEvents": [
+            {
+                "name": s["name"],
+                "ph": "X",
+                "ts": s["start_time_ns"] / 1000,
+                "dur": ((s["end_time_ns"] or s["start_time_ns"]) - s["start_time_ns"]) / 1000,
+                "pid": 1,
+                "tid": track(s),
+                "args": s["attributes"]
+            }
+            for s in spans
+        ]
+    }
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="View a trace exported by JsonlSpanExporter or OTLPFileExporter")
+    parser.add_argument("path", help="JSONL or OTLP/JSON trace file")
+    parser.add_argument("--trace-id", help="Trace to show (default: the last one)")
+    parser.add_argument("--chrome", help="Write the trace in Chrome trace event format to this file")
+    args = parser.parse_args()
+
+    trace_spans = load_spans(args.path, args.trace_id)
+    if args.chrome:
+        with open(args.chrome, "w", encoding="utf-8") as f:
+            json.dump(to_chrome_trace(trace_spans), f)
+        print(f"Wrote {len(trace_spans)} spans to {args.chrome}")
+    else:
+        print(render_waterfall(trace_spans))
@@ -0,0 +1,14 @@
+import pytest
+
+from rag_search.utils.tokens import TokenCounter
+
+class WordCounter(TokenCounter):
+    """TokenCounter counting whitespace-separated words, so tests need no tokenizer download."""
+
+    @staticmethod
+    def _load_tokenizer(model):
+        return ("words", lambda text: text.split(), lambda ids: " ".join(ids))
+
+@pytest.fixture
+def word_counter():
+    return WordCounter("words")
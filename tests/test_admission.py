@@ -0,0 +1,84 @@
+import asyncio
+import time
+
+import pytest
+
+from rag_search.utils.admission import AdmissionController, AdmissionRejected, Priority, StageLimiter
+
+def test_priority_from_name():
+    assert Priority.from_name(None) is Priority.INTERACTIVE
+    assert Priority.from_name("Batch") is Priority.BATCH
+    with pytest.raises(ValueError):
+        Priority.from_name("urgent")
+
+def test_waiters_are_admitted_by_priority_then_arrival():
+    async def run():
+        limiter = StageLimiter("llm", max_concurrent=1)
+        await limiter.acquire()
+        order = []
+
+        async def wait(name, priority):
+            await limiter.acquire(priority)
+            order.append(name)
+            limiter.release()
+
+        tasks = [
+            asyncio.create_task(wait("batch", Priority.BATCH)),
+            asyncio.create_task(wait("first", Priority.INTERACTIVE)),
+            asyncio.create_task(wait("second", Priority.INTERACTIVE)),
+        ]
+        await asyncio.sleep(0)
+        assert limiter.queued == 3
+        limiter.release()
+        await asyncio.gather(*tasks)
+        return order, limiter.active
+
+    order, active = asyncio.run(run())
+    assert order == ["first", "second", "batch"]
+    assert active == 0
+
+def test_request_is_rejected_when_the_estimated_wait_exceeds_its_deadline():
+    async def run():
+        limiter = StageLimiter("scraping", max_concurrent=1)
+        await limiter.acquire()
+        limiter.avg_service_time = 10.0
+        with pytest.raises(AdmissionRejected) as rejected:
+            await limiter.acquire(deadline=time.monotonic() + 1.0)
+        return limiter, rejected.value
+
+    limiter, rejected = asyncio.run(run())
+    assert rejected.stage == "scraping"
+    assert rejected.retry_after_header == "10"
+    assert limiter.rejected == 1
+    assert limiter.queued == 0
+
+def test_waiter_times_out_at_its_deadline():
+    async def run():
+        limiter = StageLimiter("reranking", max_concurrent=1)
+        await limiter.acquire()
+        with pytest.raises(AdmissionRejected):
+            await limiter.acquire(deadline=time.monotonic() + 0.01)
+        # The slot is still held by the first request and nobody is queued
+        return limiter.active, limiter.queued
+
+    assert asyncio.run(run()) == (1, 0)
+
+def test_controller_checks_the_total_wait_and_skips_unlimited_stages():
+    async def run():
+        controller = AdmissionController({"scraping": 1, "llm": 0})
+        assert "llm" not in controller.limiters
+        async with controller.slot("llm"):
+            pass
+
+        async with controller.slot("scraping"):
+            controller.limiters["scraping"].avg_service_time = 5.0
+            controller.check(deadline=time.monotonic() + 60)
+            with pytest.raises(AdmissionRejected) as rejected:
+                controller.check(deadline=time.monotonic() + 1)
+        return rejected.value, controller.stats()["scraping"]
+
+    rejected, stats = asyncio.run(run())
+    assert rejected.stage == "scraping"
+    assert stats["active"] == 0
+    assert stats["admitted"] == 1
+    assert stats["rejected"] == 1
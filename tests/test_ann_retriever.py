@@ -0,0 +1,86 @@
+import numpy as np
+
+from rag_search.processing.ann_retriever import ANNRetriever, IVFIndex
+
+class QueryEmbedder:
+    """Embeds every query as the same fixed vector."""
+
+    def __init__(self, vector):
+        self.vector = vector
+
+    def embed_text(self, text):
+        return self.vector
+
+def _chunk(url, content, embedding):
+    return {"url": url, "content": content, "embedding": embedding}
+
+def test_ivf_search_finds_the_exact_neighbours_with_all_lists_probed():
+    rng = np.random.default_rng(0)
+    vectors = rng.normal(size=(600, 16)).astype(np.float32)
+    index = IVFIndex(nlist=8, nprobe=8, train_size=256)
+    for batch in np.array_split(vectors, 6):
+        index.add(batch)
+    assert index.centroids is not None
+
+    query = rng.normal(size=16).astype(np.float32)
+    normalized = IVFIndex._normalize(vectors)
+    exact = np.argsort(-(normalized @ (query / np.linalg.norm(query))))[:10]
+    rows, scores = index.search(query, 10)
+
+    assert rows.tolist() == exact.tolist()
+    assert np.all(np.diff(scores) <= 0)
+
+def test_removed_vectors_are_not_found_and_compact_renumbers_rows():
+    index = IVFIndex()
+    index.add(np.eye(4, dtype=np.float32))
+    index.remove([1, 2])
+    rows, _ = index.search(np.array([0, 1, 0, 0], dtype=np.float32), 4)
+    assert sorted(rows.tolist()) == [0, 3]
+
+    mapping = index.compact()
+    assert mapping.tolist() == [0, -1, -1, 1]
+    assert len(index) == 2
+    rows, _ = index.search(np.array([0, 0, 0, 1], dtype=np.float32), 1)
+    assert rows.tolist() == [1]
+
+def test_search_can_be_restricted_to_given_rows():
+    index = IVFIndex()
+    index.add(np.eye(3, dtype=np.float32))
+    rows, _ = index.search(np.array([1, 0, 0], dtype=np.float32), 3, rows=[1, 2])
+    assert sorted(rows.tolist()) == [1, 2]
+
+def test_retrieve_only_ranks_the_requests_chunks_unless_the_corpus_is_searched():
+    retriever = ANNRetriever(embedder=QueryEmbedder([1.0, 0.0]), top_k=3)
+    other_session = [_chunk("a", "earlier page", [1.0, 0.0])]
+    request = [_chunk("b", "close", [0.9, 0.1]), _chunk("b", "far", [0.0, 1.0])]
+    retriever.retrieve(other_session, "query")
+
+    results = retriever.retrieve(request, "query")
+    assert [chunk["content"] for chunk in results] == ["close", "far"]
+    assert all("embedding" not in chunk for chunk in results)
+
+    retriever.search_corpus = True
+    results = retriever.retrieve(request, "query")
+    assert [chunk["content"] for chunk in results] == ["earlier page", "close", "far"]
+    assert len(retriever.retrieve(request, "query", top_k=1)) == 1
+
+def test_chunks_are_inserted_once_and_oldest_pages_evicted():
+    retriever = ANNRetriever(top_k=5, max_chunks=2)
+    assert retriever.add_chunks([_chunk("a", "one", [1.0, 0.0]), _chunk("a", "one", [1.0, 0.0])]) == 1
+    retriever.add_chunks([_chunk("b", "two", [0.0, 1.0])])
+    retriever.add_chunks([_chunk("c", "three", [1.0, 1.0])])
+
+    assert list(retriever.rows_by_url) == ["b", "c"]
+    assert len(retriever.index) == 2
+    assert retriever.delete_url("b") == 1
+    assert [chunk["content"] for chunk in retriever.chunks.values()] == ["three"]
+
+def test_corpus_survives_save_and_load(tmp_path):
+    retriever = ANNRetriever(embedder=QueryEmbedder([0.0, 1.0]), index_path=str(tmp_path), search_corpus=True)
+    retriever.add_chunks([_chunk("a", "one", [1.0, 0.0]), _chunk("b", "two", [0.0, 1.0])])
+    retriever.save()
+
+    restored = ANNRetriever(embedder=QueryEmbedder([0.0, 1.0]), index_path=str(tmp_path), search_corpus=True)
+    assert list(restored.rows_by_url) == ["a", "b"]
+    assert restored.add_chunks([_chunk("a", "one", [1.0, 0.0])]) == 0
+    assert restored.retrieve([_chunk("c", "three", [0.5, 0.5])], "query")[0]["content"] == "two"
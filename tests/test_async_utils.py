@@ -0,0 +1,53 @@
+import asyncio
+
+import pytest
+
+from rag_search.utils.async_utils import SingleFlight, StreamCancelled
+
+async def _numbers(count: int, delay: float = 0.01):
+    for number in range(count):
+        await asyncio.sleep(delay)
+        yield number
+
+def test_follower_keeps_stream_alive_when_leader_leaves_before_it_iterates():
+    async def run():
+        flight = SingleFlight()
+        leader, shared = flight.stream("key", lambda: _numbers(5))
+        assert not shared
+        follower, shared = flight.stream("key", lambda: _numbers(5))
+        assert shared
+
+        # The leader disconnects before the follower has read anything
+        assert await leader.__anext__() == 0
+        await leader.aclose()
+        await asyncio.sleep(0.02)
+
+        return [number async for number in follower]
+
+    assert asyncio.run(run()) == [0, 1, 2, 3, 4]
+
+def test_last_subscriber_leaving_cancels_the_source_and_forgets_the_key():
+    async def run():
+        flight = SingleFlight()
+        events, _ = flight.stream("key", lambda: _numbers(5))
+        assert await events.__anext__() == 0
+        await events.aclose()
+        # A new caller starts a fresh stream instead of joining the cancelled one
+        assert flight.in_flight() == 0
+        events, shared = flight.stream("key", lambda: _numbers(2))
+        assert not shared
+        return [number async for number in events]
+
+    assert asyncio.run(run()) == [0, 1]
+
+def test_cancelled_source_is_reported_to_remaining_subscribers():
+    async def run():
+        flight = SingleFlight()
+        events, _ = flight.stream("key", lambda: _numbers(5))
+        assert await events.__anext__() == 0
+        # Cancelled from outside, e.g. on server shutdown
+        flight._streams["key"].task.cancel()
+        return [number async for number in events]
+
+    with pytest.raises(StreamCancelled):
+        asyncio.run(run())
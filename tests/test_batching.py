@@ -0,0 +1,26 @@
+from rag_search.utils.batching import length_bucketed_batches
+
+def test_every_item_is_batched_once_within_the_padded_token_budget():
+    lengths = [10, 500, 30, 480, 20, 510, 15, 25]
+    batches = length_bucketed_batches(lengths, max_batch_tokens=1024)
+
+    assert sorted(i for batch in batches for i in batch) == list(range(len(lengths)))
+    for batch in batches:
+        assert len(batch) * max(lengths[i] for i in batch) <= 1024 or len(batch) == 1
+
+def test_longest_items_come_first_and_similar_lengths_share_a_batch():
+    lengths = [10, 500, 12, 490, 11]
+    batches = length_bucketed_batches(lengths, max_batch_tokens=1000)
+
+    assert batches == [[1, 3], [2, 4, 0]]
+
+def test_item_above_the_budget_gets_its_own_batch():
+    batches = length_bucketed_batches([2000, 10, 10], max_batch_tokens=100)
+    assert batches == [[0], [1, 2]]
+
+def test_max_batch_size_caps_the_number_of_items():
+    batches = length_bucketed_batches([1] * 10, max_batch_tokens=1000, max_batch_size=4)
+    assert [len(batch) for batch in batches] == [4, 4, 2]
+
+def test_no_items():
+    assert length_bucketed_batches([], max_batch_tokens=100) == []
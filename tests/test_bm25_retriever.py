@@ -0,0 +1,85 @@
+from rag_search.processing.bm25_retriever import BM25Retriever, HybridRetriever, tokenize
+from rag_search.processing.retriever import Retriever
+
+CHUNKS = [
+    {"url": "a", "content": "The RTX 4090 has 24 GB of memory"},
+    {"url": "b", "content": "Graphics cards differ in memory size and bandwidth"},
+    {"url": "c", "content": "Bananas are rich in potassium"},
+]
+
+class FixedDense(Retriever):
+    """Dense stand-in returning the chunks in a fixed order with fixed similarities."""
+
+    def __init__(self, order, similarities, top_k=5):
+        self.order = order
+        self.similarities = similarities
+        self.top_k = top_k
+        self.calls = []
+
+    def retrieve(self, embedded_chunks, query, top_k=None):
+        self.calls.append(top_k)
+        by_url = {chunk["url"]: chunk for chunk in embedded_chunks}
+        return [
+            dict(by_url[url], similarity=similarity)
+            for url, similarity in zip(self.order, self.similarities)
+        ][:top_k or self.top_k]
+
+def test_tokenize_keeps_numbers_and_codes():
+    assert tokenize("RTX-4090, 24GB!") == ["rtx", "4090", "24gb"]
+
+def test_exact_terms_rank_first_and_unmatched_chunks_are_left_out():
+    retriever = BM25Retriever(top_k=5)
+    results = retriever.retrieve(CHUNKS, "rtx 4090 memory")
+
+    assert [chunk["url"] for chunk in results] == ["a", "b"]
+    assert results[0]["bm25_score"] > results[1]["bm25_score"] > 0
+    assert retriever.retrieve(CHUNKS, "memory", top_k=1)[0]["url"] in ("a", "b")
+    assert len(retriever.retrieve(CHUNKS, "memory", top_k=1)) == 1
+
+def test_index_grows_incrementally_and_pages_can_be_deleted():
+    retriever = BM25Retriever()
+    assert retriever.add_chunks(CHUNKS) == 3
+    assert retriever.add_chunks(CHUNKS[:1]) == 0
+    assert retriever.delete_url("a") == 1
+
+    assert len(retriever) == 2
+    assert "4090" not in retriever.postings
+    assert retriever.total_length == sum(len(tokenize(chunk["content"])) for chunk in CHUNKS[1:])
+
+def test_oldest_pages_are_evicted_above_max_chunks():
+    retriever = BM25Retriever(max_chunks=2)
+    retriever.add_chunks(CHUNKS)
+    assert list(retriever.docs_by_url) == ["b", "c"]
+
+def test_retrieve_only_ranks_the_given_chunks():
+    retriever = BM25Retriever()
+    retriever.add_chunks(CHUNKS)
+    results = retriever.retrieve(CHUNKS[1:], "rtx 4090 memory")
+    assert [chunk["url"] for chunk in results] == ["b"]
+
+def test_hybrid_fuses_both_rankings_with_reciprocal_rank_fusion():
+    dense = FixedDense(["b", "c", "a"], [0.9, 0.8, 0.7])
+    hybrid = HybridRetriever(dense=dense, top_k=3, candidate_k=10)
+    results = hybrid.retrieve(CHUNKS, "rtx 4090 memory")
+
+    # BM25 ranks a, b: b is near the top of both rankings, c is only found by the dense one
+    assert [chunk["url"] for chunk in results] == ["b", "a", "c"]
+    assert results[0]["dense_score"] == 0.9
+    assert results[0]["bm25_score"] > 0
+    assert "bm25_score" not in results[2]
+
+def test_hybrid_asks_the_dense_retriever_for_candidates_without_changing_its_top_k():
+    dense = FixedDense(["a", "b", "c"], [0.9, 0.8, 0.7], top_k=2)
+    hybrid = HybridRetriever(dense=dense, top_k=1, candidate_k=3)
+    assert len(hybrid.retrieve(CHUNKS, "memory")) == 1
+
+    assert dense.calls == [3]
+    assert dense.top_k == 2
+
+def test_hybrid_falls_back_to_bm25_when_the_dense_similarities_are_zero():
+    dense = FixedDense(["c", "b", "a"], [0.0, 0.0, 0.0])
+    hybrid = HybridRetriever(dense=dense, top_k=3)
+    results = hybrid.retrieve(CHUNKS, "rtx 4090 memory")
+
+    assert [chunk["url"] for chunk in results] == ["a", "b"]
+    assert all("dense_score" not in chunk for chunk in results)
@@ -0,0 +1,42 @@
+from rag_search.utils import cache
+from rag_search.utils.cache import TTLCache
+
+def test_least_recently_used_entry_is_evicted_first():
+    entries = TTLCache(max_size=2, ttl=None)
+    entries.set("a", 1)
+    entries.set("b", 2)
+    assert entries.get("a") == 1
+    entries.set("c", 3)
+
+    assert "b" not in entries
+    assert entries.get("a") == 1
+    assert entries.get("c") == 3
+    assert len(entries) == 2
+
+def test_entries_expire_after_their_ttl(monkeypatch):
+    now = [100.0]
+    monkeypatch.setattr(cache.time, "monotonic", lambda: now[0])
+    entries = TTLCache(max_size=10, ttl=5.0)
+    entries.set("key", "value")
+
+    now[0] = 104.0
+    assert entries.get("key") == "value"
+    now[0] = 105.0
+    assert entries.get("key", "expired") == "expired"
+    assert "key" not in entries
+    assert (entries.hits, entries.misses) == (1, 1)
+
+def test_size_zero_disables_the_cache():
+    entries = TTLCache(max_size=0)
+    entries.set("key", "value")
+    assert entries.get("key") is None
+    assert len(entries) == 0
+
+def test_pop_and_clear():
+    entries = TTLCache(max_size=10, ttl=None)
+    entries.set("a", 1)
+    entries.set("b", 2)
+    assert entries.pop("a") == 1
+    assert entries.pop("a", "gone") == "gone"
+    entries.clear()
+    assert len(entries) == 0
@@ -0,0 +1,44 @@
+import pytest
+
+pytest.importorskip("langchain_text_splitters")
+
+from rag_search.processing.chunker import MarkdownChunker
+
+DOCUMENT = "\n\n".join(
+    [f"# Section {s}\n\n" + " ".join(f"word{s}_{w}." for w in range(40)) for s in range(4)]
+)
+
+def test_spans_are_offsets_into_the_text_within_chunk_size(word_counter):
+    chunker = MarkdownChunker(chunk_size=30, chunk_overlap=0, token_counter=word_counter)
+    spans = chunker.split_spans(DOCUMENT)
+
+    assert len(spans) > 4
+    for start, end, tokens in spans:
+        piece = DOCUMENT[start:end]
+        assert piece == piece.strip()
+        assert tokens == word_counter.count(piece)
+        assert tokens <= 30
+    # Without overlap the chunks cover every word exactly once, in order
+    assert " ".join(DOCUMENT[start:end] for start, end, _ in spans).split() == DOCUMENT.split()
+
+def test_chunks_start_at_headings(word_counter):
+    text = "# First\n\nshort intro\n\n# Second\n\nmore text"
+    chunker = MarkdownChunker(chunk_size=4, chunk_overlap=0, token_counter=word_counter)
+    chunks = chunker.split_text(text)
+
+    assert chunks[0].startswith("# First")
+    assert any(chunk.startswith("# Second") for chunk in chunks)
+
+def test_consecutive_chunks_overlap_by_at_most_chunk_overlap(word_counter):
+    text = " ".join(f"Sentence number {i} ends here." for i in range(30))
+    chunker = MarkdownChunker(chunk_size=20, chunk_overlap=10, token_counter=word_counter)
+    spans = chunker.split_spans(text)
+
+    assert len(spans) > 2
+    for (start, end, _), (next_start, next_end, _) in zip(spans, spans[1:]):
+        assert start < next_start < end < next_end
+        assert word_counter.count(text[next_start:end]) <= 10
+
+def test_words_are_merged_up_to_chunk_size(word_counter):
+    chunker = MarkdownChunker(chunk_size=2, chunk_overlap=0, token_counter=word_counter)
+    assert chunker.split_text("one two three four five") == ["one two", "three four", "five"]
@@ -0,0 +1,44 @@
+from rag_search.processing.dedup import NearDuplicateFilter
+
+ARTICLE = (
+    "The city council approved the new budget on Tuesday after a long debate about "
+    "public transport, school funding and the renovation of the central library, "
+    "which is expected to reopen next spring with extended opening hours"
+)
+
+def test_near_duplicates_collapse_into_the_first_chunk_with_all_their_urls():
+    chunks = [
+        {"url": "https://news.example/a", "content": ARTICLE},
+        {"url": "https://mirror.example/a", "content": ARTICLE + "."},
+        {"url": "https://news.example/a", "content": ARTICLE},
+        {"url": "https://other.example", "content": "Bananas are rich in potassium and grow in tropical climates"},
+    ]
+    kept = NearDuplicateFilter(threshold=0.8).deduplicate(chunks)
+
+    assert [chunk["url"] for chunk in kept] == ["https://news.example/a", "https://other.example"]
+    assert kept[0]["source_urls"] == ["https://news.example/a", "https://mirror.example/a"]
+    assert kept[0]["duplicates"] == 2
+    assert kept[1]["source_urls"] == ["https://other.example"]
+    assert kept[1]["duplicates"] == 0
+
+def test_different_texts_are_kept_and_input_is_not_modified():
+    chunks = [
+        {"url": "a", "content": ARTICLE},
+        {"url": "b", "content": "A completely different text about the weather in the mountains this weekend"},
+        {"url": "c", "content": ""},
+    ]
+    kept = NearDuplicateFilter().deduplicate(chunks)
+
+    assert [chunk["url"] for chunk in kept] == ["a", "b", "c"]
+    assert "source_urls" not in chunks[0]
+
+def test_signature_estimates_jaccard_similarity():
+    dedup = NearDuplicateFilter(num_perm=128)
+    words = ARTICLE.split()
+    half = " ".join(words[:len(words) // 2])
+    same = (dedup.signature(ARTICLE) == dedup.signature(ARTICLE)).mean()
+    partial = (dedup.signature(ARTICLE) == dedup.signature(half)).mean()
+
+    assert same == 1.0
+    assert 0.2 < partial < 0.8
+    assert dedup.signature("!!!") is None
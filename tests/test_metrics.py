@@ -0,0 +1,46 @@
+from rag_search.utils.metrics import MetricsRegistry, PipelineMetrics
+
+def test_counter_renders_per_label_values():
+    registry = MetricsRegistry()
+    hits = registry.counter("hits_total", "Cache hits", ["cache"])
+    hits.inc(cache="scores")
+    hits.inc(2, cache="scores")
+    hits.inc(cache='say "hi"')
+
+    assert hits.value(cache="scores") == 3
+    assert registry.render().splitlines() == [
+        "# HELP hits_total Cache hits",
+        "# TYPE hits_total counter",
+        'hits_total{cache="say \\"hi\\""} 1',
+        'hits_total{cache="scores"} 3',
+    ]
+
+def test_histogram_renders_cumulative_buckets_sum_and_count():
+    registry = MetricsRegistry()
+    latency = registry.histogram("latency_seconds", "Latency", buckets=(0.1, 1.0))
+    for value in (0.05, 0.5, 0.5, 5.0):
+        latency.observe(value)
+
+    assert registry.render().splitlines() == [
+        "# HELP latency_seconds Latency",
+        "# TYPE latency_seconds histogram",
+        'latency_seconds_bucket{le="0.1"} 1',
+        'latency_seconds_bucket{le="1"} 3',
+        'latency_seconds_bucket{le="+Inf"} 4',
+        "latency_seconds_sum 6.05",
+        "latency_seconds_count 4",
+    ]
+
+def test_pipeline_metrics_time_stages_and_count_cache_lookups():
+    metrics = PipelineMetrics()
+    with metrics.stage("rerank"):
+        pass
+    metrics.cache_lookup("rerank_scores", hit=True)
+    metrics.cache_lookup("rerank_scores", hit=False)
+    metrics.rerank_first_stage_recall.observe(0.8)
+
+    text = metrics.render()
+    assert 'rag_stage_duration_seconds_count{stage="rerank"} 1' in text
+    assert 'rag_cache_hits_total{cache="rerank_scores"} 1' in text
+    assert 'rag_cache_misses_total{cache="rerank_scores"} 1' in text
+    assert 'rag_rerank_first_stage_recall_bucket{le="0.8"} 1' in text
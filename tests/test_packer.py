@@ -0,0 +1,57 @@
+from rag_search.context.packer import ContextPacker
+
+def _words(prefix: str, count: int) -> str:
+    return " ".join(f"{prefix}{i}" for i in range(count))
+
+def test_chunks_are_packed_by_relevance_per_token_within_the_budget(word_counter):
+    chunks = [
+        {"content": _words("long", 60), "url": "a", "chunk_index": 0, "similarity": 0.9},
+        {"content": _words("short", 20), "url": "b", "chunk_index": 0, "similarity": 0.8},
+        {"content": _words("mid", 30), "url": "c", "chunk_index": 0, "similarity": 0.7},
+    ]
+    packed = ContextPacker(max_tokens=50, min_chunk_tokens=100).pack(chunks, token_counter=word_counter)
+
+    # The long chunk has the lowest score per token and no longer fits
+    assert [chunk["url"] for chunk in packed] == ["b", "c"]
+    assert sum(chunk["token_count"] for chunk in packed) <= 50
+    assert all(chunk["tokenizer"] == "words" for chunk in packed)
+
+def test_densest_chunk_that_does_not_fit_is_trimmed_into_the_rest(word_counter):
+    chunks = [
+        {"content": _words("a", 30), "url": "a", "chunk_index": 0, "similarity": 0.9},
+        {"content": _words("b", 40), "url": "b", "chunk_index": 0, "similarity": 0.9},
+    ]
+    packed = ContextPacker(max_tokens=50, min_chunk_tokens=10).pack(chunks, token_counter=word_counter)
+
+    assert [chunk["token_count"] for chunk in packed] == [30, 20]
+    assert packed[1]["content"] == _words("b", 20)
+
+def test_near_duplicates_are_dropped(word_counter):
+    text = _words("same", 40)
+    chunks = [
+        {"content": text, "url": "a", "chunk_index": 0, "similarity": 0.9},
+        {"content": text + " extra", "url": "mirror", "chunk_index": 0, "similarity": 0.8},
+    ]
+    packed = ContextPacker(max_tokens=1000).pack(chunks, token_counter=word_counter)
+
+    assert [chunk["url"] for chunk in packed] == ["a"]
+
+def test_overlap_with_the_adjacent_chunk_of_the_same_page_is_cut(word_counter):
+    shared = _words("shared", 10)
+    chunks = [
+        {"content": _words("first", 30) + " " + shared, "url": "a", "chunk_index": 0, "similarity": 0.9},
+        {"content": shared + " " + _words("second", 30), "url": "a", "chunk_index": 1, "similarity": 0.8},
+    ]
+    packed = ContextPacker(max_tokens=1000, duplicate_threshold=1.1).pack(chunks, token_counter=word_counter)
+
+    assert len(packed) == 2
+    assert packed[0]["content"].endswith(shared)
+    assert "shared" not in packed[1]["content"]
+    assert packed[1]["token_count"] == 30
+
+def test_token_count_of_the_chunker_is_reused_for_the_same_tokenizer(word_counter):
+    chunk = {"content": _words("w", 10), "url": "a", "similarity": 0.5, "token_count": 7, "tokenizer": "words"}
+    other = dict(chunk, url="b", content=_words("v", 10), tokenizer="cl100k_base")
+    packed = ContextPacker(max_tokens=1000).pack([chunk, other], token_counter=word_counter)
+
+    assert [c["token_count"] for c in packed] == [7, 10]
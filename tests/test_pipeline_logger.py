@@ -0,0 +1,67 @@
+from rag_search.utils.base_logger import BaseLogger
+from rag_search.utils.pipeline_logger import PipelineLogger, current_logger, logging_to
+
+def test_entries_are_snapshots_of_the_logged_data(tmp_path):
+    logger = PipelineLogger(log_dir=str(tmp_path))
+    data = {"urls": ["https://example.com"]}
+    logger.log("search", data)
+    data["urls"].append("https://example.org")
+
+    (entry,) = logger.get_logs()
+    assert entry["stage"] == "search"
+    assert entry["data"] == {"urls": ["https://example.com"]}
+
+def test_entries_below_the_level_are_dropped_but_errors_kept(tmp_path):
+    logger = PipelineLogger(log_dir=str(tmp_path), level=30, sample_rate=0.0)
+    logger.log("scraping", {"n": 1})
+    logger.log_error("scraping", ValueError("timeout"), {"url": "https://example.com"})
+
+    (entry,) = logger.get_logs()
+    assert entry["status"] == "error"
+    assert entry["data"] == {"error_type": "ValueError", "error_message": "timeout", "url": "https://example.com"}
+
+def test_payloads_referenced_by_buffered_entries_are_never_evicted(tmp_path, monkeypatch):
+    monkeypatch.setattr(PipelineLogger, "default_max_payloads", 2)
+    logger = PipelineLogger(log_dir=str(tmp_path), max_entries=3)
+    for i in range(10):
+        logger.log("context", {"refs": [logger.ref(f"payload {i}.{j}") for j in range(3)]})
+        for entry in logger.get_logs():
+            assert all(logger.get_payload(ref) is not None for ref in entry["data"]["refs"])
+
+    # Payloads of entries that left the buffer are gone
+    assert len(logger._payloads) == 9
+    assert logger.get_payload(logger.ref("payload 0.0")) == "payload 0.0"
+
+def test_saved_logs_and_payloads_are_written_once(tmp_path):
+    logger = PipelineLogger(log_dir=str(tmp_path))
+    payload_id = logger.ref("chunk content")
+    logger.log("retrieval", {"chunk": payload_id})
+    logger.save_logs()
+    logger.save_logs()
+    logger.log("rerank", {"chunk": logger.ref("chunk content")})
+    logger.save_logs()
+    logger.flush()
+
+    with open(logger.log_file, encoding="utf-8") as f:
+        assert len(f.readlines()) == 2
+    with open(logger.payload_file, encoding="utf-8") as f:
+        assert f.read().count(payload_id) == 1
+
+class Component(BaseLogger):
+    pass
+
+def test_components_log_to_the_logger_of_the_current_context(tmp_path):
+    first = PipelineLogger(log_dir=str(tmp_path), session_id="first")
+    second = PipelineLogger(log_dir=str(tmp_path), session_id="second")
+    component = Component()
+
+    component.log("outside", {})
+    with logging_to(first):
+        component.log("step", {"n": 1})
+        with logging_to(second):
+            component.log("step", {"n": 2})
+        assert current_logger() is first
+    assert current_logger() is None
+
+    assert [entry["data"] for entry in first.get_logs()] == [{"n": 1}]
+    assert [entry["stage"] for entry in second.get_logs()] == ["Component.step"]
@@ -0,0 +1,115 @@
+import pytest
+
+pytest.importorskip("torch")
+pytest.importorskip("transformers")
+
+from rag_search.processing.reranker import CascadeReranker, JinaAIReranker, PairwiseReranker
+from rag_search.utils.cache import TTLCache
+from rag_search.utils.metrics import PipelineMetrics
+
+class LengthReranker(PairwiseReranker):
+    """Scores a pair by the length of its content, counting the pairs it scored."""
+
+    def __init__(self, **kwargs):
+        super().__init__(**kwargs)
+        self.scored = []
+
+    def score_pairs(self, pairs):
+        self.scored.extend(pairs)
+        return [len(content) / 10 for _, content in pairs]
+
+class ReversedFirstStage:
+    """First stage ranking shorter contents higher, the opposite of LengthReranker."""
+
+    top_k = None
+
+    def rerank(self, query, chunks, include_scores=False):
+        ranked = sorted(chunks, key=lambda chunk: len(chunk["content"]))[:self.top_k]
+        return [{**chunk, "score": -len(chunk["content"])} for chunk in ranked]
+
+def _chunks(*contents):
+    return [{"url": f"https://example.com/{i}", "content": content} for i, content in enumerate(contents)]
+
+def test_pairwise_reranker_must_implement_score_pairs():
+    with pytest.raises(TypeError):
+        PairwiseReranker()
+
+def test_rerank_keeps_the_top_k_above_the_threshold_and_skips_empty_chunks():
+    reranker = LengthReranker(top_k=2, score_threshold=0.2)
+    chunks = _chunks("a", "abc", "", "abcdefg", "abcde")
+    result = reranker.rerank(chunks, "query")
+
+    assert [chunk["content"] for chunk in result] == ["abcdefg", "abcde"]
+    assert result[0]["similarity"] == pytest.approx(0.7)
+    assert "similarity" not in chunks[3]
+    assert len(reranker.scored) == 4
+
+def test_rerank_batch_scores_all_queries_in_one_call():
+    reranker = LengthReranker(top_k=1)
+    results = reranker.rerank_batch([_chunks("ab", "abcd"), _chunks(""), _chunks("abc")], ["q1", "q2", "q3"])
+
+    assert [[chunk["content"] for chunk in result] for result in results] == [["abcd"], [], ["abc"]]
+    assert reranker.scored == [["q1", "ab"], ["q1", "abcd"], ["q3", "abc"]]
+
+def test_cascade_passes_the_first_stage_survivors_to_the_second_stage():
+    second = LengthReranker(top_k=2)
+    cascade = CascadeReranker(ReversedFirstStage(), second, first_stage_top_n=3, audit_rate=0.0)
+    result, stats = cascade.rerank_with_stats(_chunks("a", "abcdef", "ab", "abcd", "abc", ""), "query")
+
+    assert [chunk["content"] for chunk in result] == ["abc", "ab"]
+    assert result[0]["first_stage_score"] == -3
+    assert [stage["kept"] for stage in stats["stages"]] == [3, 2]
+    assert [stage["candidates"] for stage in stats["stages"]] == [5, 3]
+    assert "first_stage_recall" not in stats
+
+def test_audited_cascade_reports_first_stage_recall():
+    metrics = PipelineMetrics()
+    cascade = CascadeReranker(ReversedFirstStage(), LengthReranker(top_k=2), first_stage_top_n=3, audit_rate=1.0)
+    cascade.metrics = metrics
+    _, stats = cascade.rerank_with_stats(_chunks("a", "abcdef", "ab", "abcd", "abc"), "query")
+
+    # The second stage alone would return "abcdef" and "abcd", the cascade found neither
+    assert stats["first_stage_recall"] == 0.0
+    assert "rag_rerank_first_stage_recall_count 1" in metrics.render()
+    assert 'rag_stage_duration_seconds_count{stage="rerank.first_stage"} 1' in metrics.render()
+
+def _jina(**attrs):
+    """JinaAIReranker without a model, scoring pairs by content length."""
+    reranker = JinaAIReranker.__new__(JinaAIReranker)
+    PairwiseReranker.__init__(reranker, top_k=5)
+    reranker.model_name = "test-model"
+    reranker.backend = "torch"
+    reranker.max_length = 64
+    reranker.batch_size = 2
+    reranker.max_batch_tokens = 64
+    reranker.bucket_by_length = True
+    reranker.score_cache = TTLCache(max_size=100)
+    reranker.batches = []
+    reranker.__dict__.update(attrs)
+
+    def run_model(pairs, batch_size):
+        reranker.batches.append(pairs)
+        return [float(len(content)) for _, content in pairs]
+
+    reranker._run_model = run_model
+    return reranker
+
+def test_score_cache_skips_pairs_scored_before_under_the_normalized_query():
+    reranker = _jina()
+    reranker.metrics = PipelineMetrics()
+    assert reranker.score_pairs([["What is X?", "short"], ["What is X?", "longer text"]]) == [5.0, 11.0]
+    assert reranker.score_pairs([["  what is   x? ", "short"], ["what is x?", "new"]]) == [5.0, 3.0]
+
+    assert sorted(content for batch in reranker.batches for _, content in batch) == ["longer text", "new", "short"]
+    assert reranker.metrics.cache_hits.value(cache="rerank_scores") == 1
+    assert reranker.metrics.cache_misses.value(cache="rerank_scores") == 3
+
+def test_pairs_are_bucketed_by_estimated_length_and_scores_keep_their_order():
+    reranker = _jina(max_batch_tokens=40)
+    pairs = [["q", "x" * 100], ["q", "y" * 8], ["q", "z" * 96], ["q", "w" * 12]]
+
+    assert reranker._pair_lengths(pairs) == [29, 6, 28, 7]
+    assert reranker._pair_lengths([["q", "x" * 1000]]) == [64]
+    assert reranker.score_pairs(pairs) == [100.0, 8.0, 96.0, 12.0]
+    # Short pairs share a batch, the long ones do not fit together under 40 tokens
+    assert sorted(len(batch) for batch in reranker.batches) == [1, 1, 2]
@@ -0,0 +1,92 @@
+import asyncio
+
+import pytest
+
+from rag_search.utils.tracing import (
+    JsonlSpanExporter, OTLPFileExporter, Tracer, current_span, load_spans,
+    render_waterfall, span, to_chrome_trace, traced
+)
+
+class ListExporter:
+    def __init__(self):
+        self.traces = []
+
+    def export(self, spans):
+        self.traces.append([s.to_dict() for s in spans])
+
+@traced("helper")
+async def _helper():
+    with span("helper.inner", size=3) as inner:
+        inner.set_attribute("done", True)
+    await asyncio.sleep(0)
+
+def test_spans_nest_under_the_trace_and_are_exported_when_the_root_ends():
+    exporter = ListExporter()
+    tracer = Tracer(exporter)
+
+    async def run():
+        with tracer.start_trace("request", query="q"):
+            await asyncio.gather(_helper(), _helper())
+
+    asyncio.run(run())
+    (spans,) = exporter.traces
+    by_name = {}
+    for s in spans:
+        by_name.setdefault(s["name"], []).append(s)
+
+    root = by_name["request"][0]
+    assert root["parent_id"] is None
+    assert len(by_name["helper"]) == 2
+    assert all(s["parent_id"] == root["span_id"] for s in by_name["helper"])
+    helper_ids = {s["span_id"] for s in by_name["helper"]}
+    assert all(s["parent_id"] in helper_ids for s in by_name["helper.inner"])
+    assert by_name["helper.inner"][0]["attributes"] == {"size": 3, "done": True}
+    assert all(s["trace_id"] == root["trace_id"] and s["end_time_ns"] for s in spans)
+
+def test_spans_outside_a_trace_are_no_ops():
+    with span("orphan") as s:
+        s.set_attribute("ignored", 1)
+    assert current_span() is None
+
+    exporter = ListExporter()
+    with Tracer().start_trace("disabled"):
+        with span("child"):
+            pass
+    assert exporter.traces == []
+
+def test_failed_spans_record_the_error():
+    exporter = ListExporter()
+    with pytest.raises(ValueError):
+        with Tracer(exporter).start_trace("request"):
+            with span("fails"):
+                raise ValueError("boom")
+
+    failed = next(s for s in exporter.traces[0] if s["name"] == "fails")
+    assert failed["status"] == "error"
+    assert failed["error"] == "ValueError: boom"
+
+@pytest.mark.parametrize("exporter_class", [JsonlSpanExporter, OTLPFileExporter])
+def test_exported_files_are_read_back_by_the_viewer(tmp_path, exporter_class):
+    path = str(tmp_path / "traces.jsonl")
+    exporter = exporter_class(path)
+    tracer = Tracer(exporter)
+    for query in ("first", "second"):
+        with tracer.start_trace("request", query=query):
+            with span("stage"):
+                pass
+    exporter.flush()
+
+    spans = load_spans(path)
+    assert sorted(s["name"] for s in spans) == ["request", "stage"]
+    root = next(s for s in spans if s["name"] == "request")
+    assert root["attributes"]["query"] == "second"
+    assert next(s for s in spans if s["name"] == "stage")["parent_id"] == root["span_id"]
+
+    waterfall = render_waterfall(spans).splitlines()
+    assert waterfall[0].startswith(f"Trace {root['trace_id']}")
+    assert waterfall[1].startswith("request")
+    assert waterfall[2].startswith("  stage")
+
+    events = to_chrome_trace(spans)["traceEvents"]
+    assert {event["name"] for event in events} == {"request", "stage"}
+    assert all(event["ph"] == "X" and event["dur"] >= 0 for event in events)